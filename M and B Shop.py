@@ -1,91 +1,331 @@
 import tkinter as tk
-from tkinter import messagebox
-import sqlite3
-from datetime import datetime
-import urllib.parse
-import webbrowser
+from tkinter import messagebox, filedialog
+import io
+import os
+from bisect import bisect_left, insort
+from datetime import date
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+import shop_db
+import perf
+import analytics
+import alerts
+import barcodes
+import sync
+import consolidate
+import group_commit
+import pool
+import maintenance
+import progress
+import charts
+import costing
+import prices
+import views
+import reports
+import stocktake
+import purge
+import outbox
+import closing
+import receipts
 
 # =================== Database Setup ===================
-conn = sqlite3.connect('grocery_shop.db')
-c = conn.cursor()
-
-# Create tables
-c.execute('''CREATE TABLE IF NOT EXISTS commodities (
-    id INTEGER PRIMARY KEY,
-    name TEXT UNIQUE,
-    quantity INTEGER
-)''')
-
-c.execute('''CREATE TABLE IF NOT EXISTS sales (
-    id INTEGER PRIMARY KEY,
-    name TEXT,
-    quantity_sold INTEGER,
-    price_per_unit REAL,
-    total_price REAL,
-    date TEXT
-)''')
-
-conn.commit()
+# Handlers borrow a connection from the pool for each piece of work: the
+# writer for changes, a reader for reports.
+pool.start(shop_db.DB_PATH, factory=perf.ProfiledConnection)
+
+# Set MB_PERF=1 to record timings from startup; Ctrl+Shift+P opens the panel.
+if os.environ.get("MB_PERF") == "1":
+    perf.enable()
+
+# Set MB_GROUP_COMMIT=1 to hand sales to a writer thread instead of
+# committing each one on the Tk thread: the till is free at once, sales
+# queued within a few ms share one commit, and each is confirmed in the
+# status bar once it is on disk.
+SALE_POLL_MS = 5
+if os.environ.get("MB_GROUP_COMMIT") == "1":
+    group_commit.start(max_delay=0.005)
+
+# Reports leave through the outbox; its worker delivers them in the background.
+outbox.start()
+
+# Receipts print on their own thread. Set MB_PRINTER to the receipt printer's
+# device file; otherwise they are spooled into the receipts folder.
+receipts.DEVICE = os.environ.get("MB_PRINTER") or None
+receipts.start()
+
+# Lines waiting for checkout: (name, qty, price_cents)
+basket = []
+
+# The price text fill_sale_price last put in the sale form, or None. Only
+# other text in the price field is the cashier's own override.
+filled_price = None
+
+# Scanned items without a catalogue price, name -> units, waiting to be
+# priced through Price Scans. A scan never stops to ask.
+unpriced_scans = {}
+
+# Dates shown in the progress report, oldest first.
+progress_shown = []
 
 # =================== Helper Functions ===================
+@perf.timed
 def add_commodity():
     name = entry_name_in.get()
     qty = entry_qty_in.get()
     price = entry_price_in.get()
+    reorder_level = entry_reorder_in.get()
+    sku = entry_sku_in.get().strip()
+    sell_price = entry_sell_in.get().strip()
 
     if not name or not qty.isdigit():
         messagebox.showerror("Error", "Enter valid commodity and quantity.")
         return
 
+    if reorder_level and not reorder_level.isdigit():
+        messagebox.showerror("Error", "Reorder level must be a whole number.")
+        return
+
+    if sell_price and not sell_price.replace('.', '', 1).isdigit():
+        messagebox.showerror("Error", "Selling price must be a number.")
+        return
+
     qty = int(qty)
 
     if price and price.replace('.', '', 1).isdigit():
-        price = float(price)
-        c.execute("INSERT INTO sales (name, quantity_sold, price_per_unit, total_price, date) VALUES (?, ?, ?, ?, ?)",
-                  (name, 0, price, 0, datetime.now().strftime("%Y-%m-%d")))
-
-    c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
-    row = c.fetchone()
-    if row:
-        c.execute("UPDATE commodities SET quantity = quantity + ? WHERE name=?", (qty, name))
+        price = shop_db.to_cents(price)
     else:
-        c.execute("INSERT INTO commodities (name, quantity) VALUES (?, ?)", (name, qty))
-    conn.commit()
-    messagebox.showinfo("Success", f"Added {qty} of {name}")
-    refresh_unsold()
+        price = None
 
-def sell_commodity():
+    with pool.writer() as conn:
+        shop_db.add_stock(conn, name, qty, price)
+        if reorder_level:
+            shop_db.set_reorder_level(conn, name, int(reorder_level))
+        if sell_price:
+            prices.set_price(conn, name, shop_db.to_cents(sell_price))
+        assigned = not sku or barcodes.assign(conn, name, sku)
+        alerts.check(conn, name)
+    if not assigned:
+        messagebox.showerror("Error", f"Barcode {sku} already belongs to {barcodes.lookup(sku)}.")
+    notify(f"Added {qty} of {name}")
+    views.mark("alerts", "unsold")
+
+# A typed price overrides the catalogue; a blank or filled-in one takes the
+# item's price.
+def read_sale_entry():
     name = entry_name_out.get()
     qty = entry_qty_out.get()
-    price = entry_price_out.get()
-    if not name or not qty.isdigit() or not price.replace('.', '', 1).isdigit():
+    typed = entry_price_out.get().strip()
+    if typed == filled_price:
+        typed = ""
+    if typed.replace('.', '', 1).isdigit():
+        price = shop_db.to_cents(typed)
+    else:
+        price = None if typed else prices.lookup(name)
+    if not name or not qty.isdigit() or price is None:
         messagebox.showerror("Error", "Enter valid sale details.")
+        return None
+    return name, int(qty), price
+
+# Fills the price in as soon as the name matches a priced item, and takes
+# it out again once the name stops matching ("Rice" on the way to "Rice
+# Flour"). A price the cashier typed is left alone.
+@perf.timed
+def fill_sale_price(event=None):
+    global filled_price
+    shown = entry_price_out.get().strip()
+    if shown and shown != filled_price:
         return
+    price = prices.lookup(entry_name_out.get())
+    entry_price_out.delete(0, tk.END)
+    filled_price = None
+    if price is not None:
+        filled_price = shop_db.format_cents(price)
+        entry_price_out.insert(0, filled_price)
 
-    qty = int(qty)
-    price = float(price)
-    total = qty * price
-    today = datetime.now().strftime("%Y-%m-%d")
+@perf.timed
+def sell_commodity():
+    line = read_sale_entry()
+    if not line:
+        return
+    name, qty, price = line
+
+    if group_commit.running():
+        clear_sale_entry()
+        notify(f"Selling {qty} of {name}...")
+        await_sale(group_commit.submit([line]), [line], f"{qty} of {name}")
+        return
 
-    c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
-    row = c.fetchone()
-    if not row or row[0] < qty:
+    with pool.writer() as conn:
+        total = shop_db.sell_stock(conn, name, qty, price)
+        receipt_number = shop_db.last_change_seq(conn)
+    if total is None:
         messagebox.showerror("Error", "Not enough stock or item not found.")
         return
 
-    c.execute("UPDATE commodities SET quantity = quantity - ? WHERE name=?", (qty, name))
-    c.execute("INSERT INTO sales (name, quantity_sold, price_per_unit, total_price, date) VALUES (?, ?, ?, ?, ?)",
-              (name, qty, price, total, today))
-    conn.commit()
-    messagebox.showinfo("Success", f"Sold {qty} of {name} for {total}")
-    refresh_unsold()
+    sale_done([line], total, receipt_number, f"{qty} of {name}")
+    clear_sale_entry()
+
+# Receipt, stock alerts and status bar for a sale that has committed.
+def sale_done(lines, total, number, what):
+    printing = print_receipt(lines, total, number)
+    with pool.reader() as conn:
+        for name in {line[0] for line in lines}:
+            alerts.check(conn, name)
+    notify(f"Sold {what} for {shop_db.format_cents(total)}{printing}")
+    views.mark("alerts", "unsold", "progress")
+
+# Polls a group-committed sale until its batch has committed. A refused
+# basket goes back into the basket to be put right.
+def await_sale(future, lines, what, basket_lines=False):
+    if not future.done():
+        root.after(SALE_POLL_MS, await_sale, future, lines, what, basket_lines)
+        return
+    try:
+        total, short, number = future.result()
+    except Exception as error:
+        short, failure = None, f"The sale of {what} was not saved: {error}"
+    else:
+        failure = f"Not enough stock or item not found: {', '.join(short)}" if short else None
+    if failure:
+        if basket_lines:
+            basket[:0] = lines
+            refresh_basket()
+        messagebox.showerror("Error", failure)
+        return
+    sale_done(lines, total, number, what)
+
+# Queues the receipt for a committed sale; never waits for the printer. Its
+# number is the sale's journal seq, read under the writer lock right after
+# the commit, so it is unique and survives a restart. Returns a note for the
+# status bar when the receipt could not be queued.
+def print_receipt(lines, total, number):
+    if receipts.submit(lines, total, number, entry_location.get().strip() or None):
+        return ""
+    return " (printer backed up: no receipt)"
+
+# Ready for the next sale without deleting the last one by hand.
+def clear_sale_entry():
+    global filled_price
+    filled_price = None
+    entry_name_out.delete(0, tk.END)
+    entry_qty_out.delete(0, tk.END)
+    entry_price_out.delete(0, tk.END)
+    entry_name_out.focus_set()
+
+@perf.timed
+def add_to_basket(event=None):
+    line = read_sale_entry()
+    if not line:
+        return
+    # A priced line takes the place of that item's unpriced scans.
+    unpriced_scans.pop(line[0], None)
+    basket.append(line)
+    clear_sale_entry()
+    refresh_basket()
+
+# Puts the first unpriced scan into the sale form, units and all, ready for
+# its price; Enter then adds it to the basket.
+@perf.timed
+def price_scans():
+    global filled_price
+    if not unpriced_scans:
+        notify("No scans are waiting for a price.")
+        return
+    name, qty = next(iter(unpriced_scans.items()))
+    entry_name_out.delete(0, tk.END)
+    entry_name_out.insert(0, name)
+    entry_qty_out.delete(0, tk.END)
+    entry_qty_out.insert(0, str(qty))
+    entry_price_out.delete(0, tk.END)
+    filled_price = None
+    entry_price_out.focus_set()
+
+# The whole basket is checked and committed at once, then the views are
+# refreshed a single time.
+@perf.timed
+def checkout_basket():
+    if unpriced_scans:
+        messagebox.showerror("Error", f"Price these scans first: {', '.join(unpriced_scans)}")
+        return
+    if not basket:
+        messagebox.showerror("Error", "The basket is empty.")
+        return
+
+    lines = list(basket)
+    if group_commit.running():
+        basket.clear()
+        refresh_basket()
+        notify(f"Selling {len(lines)} items...")
+        await_sale(group_commit.submit(lines), lines, f"{len(lines)} items", basket_lines=True)
+        return
+
+    with pool.writer() as conn:
+        total, short = shop_db.sell_basket(conn, lines)
+        receipt_number = shop_db.last_change_seq(conn)
+    if short:
+        messagebox.showerror("Error", f"Not enough stock or item not found: {', '.join(short)}")
+        return
+
+    basket.clear()
+    refresh_basket()
+    sale_done(lines, total, receipt_number, f"{len(lines)} items")
 
+# Keyboard-wedge scanners type the code and press Enter. Each scan is resolved
+# from the in-memory code map and added to the basket without touching the
+# database or redrawing the reports, so back-to-back scans keep up. Focus
+# stays here and problems only ring the bell and show in the status bar, so
+# no dialog or other field catches the next scan's keystrokes.
+@perf.timed
+def scan_barcode(event=None):
+    code = entry_scan.get().strip()
+    entry_scan.delete(0, tk.END)
+    if not code:
+        return
+    name = barcodes.lookup(code)
+    if name is None:
+        root.bell()
+        notify(f"Unknown barcode {code}: nothing added.")
+        return
+
+    # Repeat scans of an item already in the basket add one at its price.
+    for i, (line_name, qty, price) in enumerate(basket):
+        if line_name == name:
+            basket[i] = (name, qty + 1, price)
+            refresh_basket()
+            return
+
+    price = prices.lookup(name)
+    if price is None:
+        unpriced_scans[name] = unpriced_scans.get(name, 0) + 1
+        root.bell()
+        notify(f"{name} has no price yet: use Price Scans before checkout.")
+        refresh_basket()
+        return
+    basket.append((name, 1, price))
+    refresh_basket()
+
+@perf.timed
+def clear_basket():
+    basket.clear()
+    unpriced_scans.clear()
+    refresh_basket()
+
+@perf.timed
+def refresh_basket():
+    text_basket.delete(1.0, tk.END)
+    total = 0
+    for name, qty, price in basket:
+        total += qty * price
+        text_basket.insert(tk.END, f"{name}\t{qty}\t{shop_db.format_cents(qty * price)}\n")
+    for name, qty in unpriced_scans.items():
+        text_basket.insert(tk.END, f"{name}\t{qty}\tneeds a price\n")
+    text_basket.insert(tk.END, f"Basket Total: {shop_db.format_cents(total)}\n")
+
+@perf.timed
 def refresh_unsold():
     text_unsold.delete(1.0, tk.END)
-    c.execute("SELECT * FROM commodities")
-    items = c.fetchall()
+    with pool.reader() as conn:
+        items = shop_db.stock_rows(conn)
     if not items:
         text_unsold.insert(tk.END, "No commodities in stock.\n")
     else:
@@ -93,40 +333,61 @@ def refresh_unsold():
         for item in items:
             text_unsold.insert(tk.END, f"{item[1]}\t{item[2]}\n")
 
+# Redraws from the in-memory alert list; no query is run here.
+@perf.timed
+def refresh_alerts():
+    text_alerts.delete(1.0, tk.END)
+    rows = alerts.alert_rows()
+    if not rows:
+        text_alerts.insert(tk.END, "No items below their reorder level.\n")
+    else:
+        text_alerts.insert(tk.END, "Name\tQuantity\tReorder At\n")
+        for name, quantity, level in rows:
+            text_alerts.insert(tk.END, f"{name}\t{quantity}\t{level}\n")
+
+# Each day's block sits under a text tag named after its date. Only the days
+# progress.refresh reports as changed are re-rendered; the rest stay as drawn.
+@perf.timed
 def show_progress():
-    text_progress.delete(1.0, tk.END)
-    c.execute("SELECT date FROM sales GROUP BY date ORDER BY date DESC")
-    dates = c.fetchall()
+    with pool.reader() as conn:
+        changed = progress.refresh(conn)
 
-    if not dates:
-        text_progress.insert(tk.END, "No sales data available.\n")
+    if not progress.blocks:
+        text_progress.delete(1.0, tk.END)
+        progress_shown.clear()
+        text_progress.insert(tk.END, "No sales data available.\n", "no_sales")
         return
+    if text_progress.tag_ranges("no_sales"):
+        text_progress.delete(1.0, tk.END)
 
-    for date_row in dates:
-        sale_date = date_row[0]
-        text_progress.insert(tk.END, f"\nProgress for {sale_date}\n")
-        text_progress.insert(tk.END, "Item\tSold\tTotal\n")
-        c.execute(
-            "SELECT name, SUM(quantity_sold), SUM(total_price) FROM sales WHERE date=? AND quantity_sold > 0 GROUP BY name",
-            (sale_date,))
-        rows = c.fetchall()
-        for row in rows:
-            text_progress.insert(tk.END, f"{row[0]}\t{row[1]}\t{row[2]:.2f}\n")
+    for sale_date in sorted(changed):
+        tag = f"day_{sale_date}"
+        ranges = text_progress.tag_ranges(tag)
+        if ranges:
+            text_progress.delete(ranges[0], ranges[1])
+            progress_shown.remove(sale_date)
+        rows = progress.blocks.get(sale_date)
+        if rows is None:
+            continue
+        # Newest first: a day goes just above the latest day older than it.
+        older = bisect_left(progress_shown, sale_date)
+        index = text_progress.tag_ranges(f"day_{progress_shown[older - 1]}")[0] if older else tk.END
+        lines = [f"\nProgress for {sale_date}\n", "Item\tSold\tTotal\n"]
+        lines += [f"{row[0]}\t{row[1]}\t{shop_db.format_cents(row[2])}\n" for row in rows]
+        text_progress.insert(index, "".join(lines), tag)
+        insort(progress_shown, sale_date)
 
+@perf.timed
 def search_commodity(name):
     if not name:
         messagebox.showerror("Error", "Enter a commodity name to search.")
         return
 
-    c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
-    stock_result = c.fetchone()
-
-    c.execute("SELECT SUM(quantity_sold) FROM sales WHERE name=? AND quantity_sold > 0", (name,))
-    sold_result = c.fetchone()
+    with pool.reader() as conn:
+        result = shop_db.search_totals(conn, name)
 
-    if stock_result:
-        stock_qty = stock_result[0]
-        sold_qty = sold_result[0] if sold_result[0] else 0
+    if result:
+        stock_qty, sold_qty = result
         messagebox.showinfo("Search Result",
                             f"Commodity: {name}\n"
                             f"Quantity in Stock: {stock_qty}\n"
@@ -134,15 +395,130 @@ def search_commodity(name):
     else:
         messagebox.showinfo("Not Found", f"{name} not found in inventory.")
 
+# Renders the report once, as text and a printable page, into the outbox
+# for delivery over `channels`.
+@perf.timed
+def queue_report(channels, subject="M & B Shop Report"):
+    text, page = io.StringIO(), io.StringIO()
+    with pool.reader() as conn:
+        reports.write_report(conn, [reports.TextSink(text), reports.HtmlSink(page)], notes=report_notes(conn))
+    return outbox.enqueue(subject, {"txt": text.getvalue(), "html": page.getvalue()}, channels)
+
+@perf.timed
 def send_report_whatsapp():
-    unsold_text = text_unsold.get(1.0, tk.END).strip()
-    progress_text = text_progress.get(1.0, tk.END).strip()
-    combined_report = f"📋 M & B Shop Report\n\nUnsold Commodities:\n{unsold_text}\n\nDaily Sales Progress:\n{progress_text}"
-    encoded_message = urllib.parse.quote(combined_report)
-    whatsapp_url = f"https://wa.me/?text={encoded_message}"
-    webbrowser.open(whatsapp_url)
+    queue_report(["whatsapp"])
+    notify("Report queued for WhatsApp; see Report Outbox for its progress.")
+
+# Every spooled report and how each of its deliveries is going.
+@perf.timed
+def show_outbox():
+    def fill():
+        if not popup.winfo_exists():
+            return
+        text_outbox.delete(1.0, tk.END)
+        rows = outbox.status_rows()
+        if not rows:
+            text_outbox.insert(tk.END, "The outbox is empty.\n")
+        else:
+            text_outbox.insert(tk.END, "Created\tReport\tChannel\tStatus\tAttempts\tError\n")
+            for report_id, created, subject, channel, status, attempts, error in rows:
+                text_outbox.insert(tk.END, f"{created}\t{subject}\t{channel}\t{status}\t{attempts}\t{error or ''}\n")
+        popup.after(2000, fill)
+
+    @perf.timed
+    def retry():
+        outbox.retry_failed()
+        notify("Failed reports queued again.")
+
+    popup = ttk.Toplevel(root)
+    popup.title("Report Outbox")
+    text_outbox = tk.Text(popup, height=20, width=110, font=("Helvetica", 12))
+    text_outbox.pack(padx=10, pady=10, fill="both", expand=True)
+    ttk.Button(popup, text="Retry Failed", command=retry, style="primary.TButton").pack(pady=5)
+    fill()
+
+# Writes today's stock snapshot and totals; closing again later in the day
+# brings them up to date.
+@perf.timed
+def close_day():
+    with pool.writer() as conn:
+        rows = closing.close_day(conn)
+    notify(f"Day closed: {rows} stock snapshot rows written.")
 
+# Stock on a past date from the day closes, and the stock-take shrinkage and
+# day totals between two dates.
+@perf.timed
+def show_stock_history():
+    @perf.timed
+    def stock():
+        day, name = entry_history_date.get().strip(), entry_history_item.get().strip()
+        try:
+            date.fromisoformat(day)
+        except ValueError:
+            messagebox.showerror("Error", "Enter the date as YYYY-MM-DD.", parent=popup)
+            return
+        text_history.delete(1.0, tk.END)
+        with pool.reader() as conn:
+            rows = [(name, closing.stock_on(conn, day, name))] if name else closing.stock_on(conn, day)
+        text_history.insert(tk.END, f"Stock at close of {day}\n")
+        for item, quantity in rows:
+            text_history.insert(tk.END, f"{item}\t{'not recorded' if quantity is None else quantity}\n")
+
+    @perf.timed
+    def between():
+        since, until = entry_history_date.get().strip(), entry_history_to.get().strip()
+        try:
+            date.fromisoformat(since)
+            date.fromisoformat(until)
+        except ValueError:
+            messagebox.showerror("Error", "Enter both dates as YYYY-MM-DD.", parent=popup)
+            return
+        text_history.delete(1.0, tk.END)
+        with pool.reader() as conn:
+            lost = closing.shrinkage(conn, since, until)
+            days = closing.closes(conn, since, until)
+        text_history.insert(tk.END, f"Shrinkage from {since} to {until}\n")
+        for item, units in lost:
+            text_history.insert(tk.END, f"{item}\t{units}\n")
+        text_history.insert(tk.END, "\nDate\tItems Moved\tStock\tSold\tRevenue\tDelivered\tAdjusted\n")
+        for day, items, stock_units, sold, cents, delivered, adjusted in days:
+            text_history.insert(tk.END, f"{day}\t{items}\t{stock_units}\t{sold}\t{shop_db.format_cents(cents)}"
+                                        f"\t{delivered}\t{adjusted}\n")
+
+    popup = ttk.Toplevel(root)
+    popup.title("Stock History")
+    for row, label in enumerate(("Date / From (YYYY-MM-DD):", "To (YYYY-MM-DD):", "Item (optional):")):
+        ttk.Label(popup, text=label, style="TLabel").grid(row=row, column=0, padx=10, pady=2, sticky="e")
+    entry_history_date = ttk.Entry(popup, style="TEntry")
+    entry_history_date.grid(row=0, column=1, padx=10, pady=2, sticky="ew")
+    entry_history_to = ttk.Entry(popup, style="TEntry")
+    entry_history_to.grid(row=1, column=1, padx=10, pady=2, sticky="ew")
+    entry_history_item = ttk.Entry(popup, style="TEntry")
+    entry_history_item.grid(row=2, column=1, padx=10, pady=2, sticky="ew")
+    ttk.Button(popup, text="Stock on Date", command=stock, style="primary.TButton").grid(row=3, column=0, padx=10, pady=5, sticky="ew")
+    ttk.Button(popup, text="Shrinkage and Closes", command=between, style="primary.TButton").grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+    text_history = tk.Text(popup, height=20, width=90, font=("Helvetica", 12))
+    text_history.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+
+def report_notes(conn):
+    location = shop_db.shop_location(conn)
+    return [f"Shop Location: {location}"] if location else []
+
+# Text, CSV, JSON and a printable HTML page, all from one pass over the rows.
+@perf.timed
+def export_report():
+    path = filedialog.asksaveasfilename(title="Export Report", defaultextension=".html",
+                                        initialfile=f"report_{shop_db.today()}.html",
+                                        filetypes=[("Report files", "*.html")])
+    if not path:
+        return
+    with pool.reader() as conn:
+        count, paths = reports.export(conn, os.path.splitext(path)[0], report_notes(conn))
+    notify(f"Exported {count} report rows to {len(paths)} files.")
+
+@perf.timed
 def clear_recent_report():
+    @perf.timed
     def perform_clear():
         password = entry_password.get()
         correct_password = "1234"  # Change this password as needed
@@ -152,17 +528,15 @@ def clear_recent_report():
             popup.destroy()
             return
 
-        c.execute("SELECT MAX(date) FROM sales")
-        recent_date = c.fetchone()[0]
+        with pool.writer() as conn:
+            recent_date = shop_db.clear_recent(conn)
 
         if recent_date:
-            c.execute("DELETE FROM sales WHERE date=?", (recent_date,))
-            conn.commit()
-            messagebox.showinfo("Success", f"Cleared sales report for {recent_date}.")
-            refresh_unsold()
-            show_progress()
+            progress.invalidate(recent_date)
+            notify(f"Cleared sales report for {recent_date}.")
+            views.mark("unsold", "progress")
         else:
-            messagebox.showinfo("No Data", "No reports found to clear.")
+            notify("No reports found to clear.")
 
         popup.destroy()
 
@@ -173,6 +547,448 @@ def clear_recent_report():
     entry_password.pack(padx=20, pady=10)
     ttk.Button(popup, text="Confirm", command=perform_clear, style="primary.TButton").pack(pady=10)
 
+# Deletes sales between two dates, for every item or a comma-separated few,
+# in small chunks on a background thread; the till keeps selling meanwhile.
+@perf.timed
+def show_purge():
+    @perf.timed
+    def start():
+        if purge.running():
+            notify("A purge is already running.")
+            return
+        if entry_purge_password.get() != "1234":  # Same password as Clear Recent Report
+            messagebox.showerror("Access Denied", "Incorrect password. Cannot purge sales.", parent=popup)
+            return
+        since, until = entry_purge_from.get().strip(), entry_purge_to.get().strip()
+        try:
+            date.fromisoformat(since)
+            date.fromisoformat(until)
+        except ValueError:
+            messagebox.showerror("Error", "Enter both dates as YYYY-MM-DD.", parent=popup)
+            return
+        names = [name.strip() for name in entry_purge_items.get().split(",") if name.strip()]
+        with pool.reader() as conn:
+            rows = shop_db.purge_count(conn, since, until, names)
+        if not rows:
+            notify("No sales in that range.")
+            return
+        items = ", ".join(names) if names else "all items"
+        if not messagebox.askyesno("Purge Sales", f"Delete {rows} sales rows from {since} to {until} for {items}?",
+                                   parent=popup):
+            return
+        purge.start(since, until, names)
+        button_purge.configure(state="disabled")
+        button_cancel.configure(state="normal")
+        poll()
+
+    def poll():
+        dates = purge.take_dates()
+        for sale_date in dates:
+            progress.invalidate(sale_date)
+        if dates:
+            views.mark("progress")
+        bar_purge.configure(value=purge.deleted * 100 / max(purge.total, 1))
+        label_purge.configure(text=f"{purge.deleted} of {purge.total} rows deleted")
+        if purge.running():
+            popup.after(200, poll)
+            return
+        button_purge.configure(state="normal")
+        button_cancel.configure(state="disabled")
+        notify(f"Purge {purge.status}: {purge.deleted} sales rows deleted.")
+
+    # The window polls the purge, so it stays open until the purge ends.
+    def close():
+        if purge.running():
+            notify("Cancel the purge or wait for it to finish first.")
+        else:
+            popup.destroy()
+
+    popup = ttk.Toplevel(root)
+    popup.title("Purge Sales")
+    popup.protocol("WM_DELETE_WINDOW", close)
+    for row, label in enumerate(("From (YYYY-MM-DD):", "To (YYYY-MM-DD):", "Items (optional, comma-separated):", "Password:")):
+        ttk.Label(popup, text=label, style="TLabel").grid(row=row, column=0, padx=10, pady=2, sticky="e")
+    entry_purge_from = ttk.Entry(popup, style="TEntry")
+    entry_purge_from.grid(row=0, column=1, padx=10, pady=2, sticky="ew")
+    entry_purge_to = ttk.Entry(popup, style="TEntry")
+    entry_purge_to.grid(row=1, column=1, padx=10, pady=2, sticky="ew")
+    entry_purge_items = ttk.Entry(popup, style="TEntry")
+    entry_purge_items.grid(row=2, column=1, padx=10, pady=2, sticky="ew")
+    entry_purge_password = ttk.Entry(popup, show="*", style="TEntry")
+    entry_purge_password.grid(row=3, column=1, padx=10, pady=2, sticky="ew")
+    bar_purge = ttk.Progressbar(popup, maximum=100)
+    bar_purge.grid(row=4, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+    label_purge = ttk.Label(popup, text="", style="TLabel")
+    label_purge.grid(row=5, column=0, columnspan=2, padx=10, sticky="w")
+    button_purge = ttk.Button(popup, text="Purge", command=start, style="danger.TButton")
+    button_purge.grid(row=6, column=0, padx=10, pady=10, sticky="ew")
+    button_cancel = ttk.Button(popup, text="Cancel Purge", command=purge.cancel, style="primary.TButton", state="disabled")
+    button_cancel.grid(row=6, column=1, padx=10, pady=10, sticky="ew")
+
+@perf.timed
+def export_reorder_list():
+    path = filedialog.asksaveasfilename(title="Export Reorder List", defaultextension=".csv",
+                                        initialfile="reorder_list.csv", filetypes=[("CSV files", "*.csv")])
+    if not path:
+        return
+    with pool.reader() as conn:
+        count = alerts.export_reorder_list(conn, path)
+    notify(f"Exported {count} items to reorder.")
+
+# Branches swap segment files (USB stick or shared folder); importing the same
+# file twice, or files in any order, is safe.
+@perf.timed
+def export_changes():
+    with pool.reader() as conn:
+        branch = shop_db.branch_id(conn)
+    path = filedialog.asksaveasfilename(title="Export Changes", defaultextension=".seg",
+                                        initialfile=f"{branch}_{shop_db.today()}.seg",
+                                        filetypes=[("Change segments", "*.seg")])
+    if not path:
+        return
+    with pool.reader() as conn:
+        count, last = sync.export_segment(conn, path)
+    notify(f"Exported {count} changes.")
+
+@perf.timed
+def import_changes():
+    paths = filedialog.askopenfilenames(title="Import Changes", filetypes=[("Change segments", "*.seg")])
+    if not paths:
+        return
+    applied = 0
+    with pool.writer() as conn:
+        for path in paths:
+            try:
+                applied += sync.import_segment(conn, path)
+            except Exception as error:
+                messagebox.showerror("Error", f"Could not import {path}:\n{error}")
+                return
+        # Merged deliveries and sales can land anywhere in the FIFO order.
+        if applied:
+            costing.rebuild(conn)
+        alerts.load(conn)
+        barcodes.load(conn)
+        prices.load(conn)
+    notify(f"Imported {applied} new changes.")
+    views.mark("alerts", "unsold", "progress")
+
+# Sales and deliveries are stamped with this from now on.
+@perf.timed
+def save_location(event=None):
+    location = entry_location.get().strip()
+    with pool.writer() as conn:
+        if not location or location == shop_db.shop_location(conn):
+            return
+        shop_db.set_shop_location(conn, location)
+    notify(f"Shop location set to {location}.")
+
+# Combines this shop with the other shops' database files picked here.
+@perf.timed
+def show_consolidated_report():
+    paths = filedialog.askopenfilenames(title="Other Shop Databases", filetypes=[("Shop databases", "*.db")])
+    if not paths:
+        return
+    paths = [shop_db.DB_PATH] + [path for path in paths if os.path.abspath(path) != os.path.abspath(shop_db.DB_PATH)]
+    try:
+        sales = consolidate.consolidated_sales(paths)
+        stock = consolidate.consolidated_stock(paths)
+    except Exception as error:
+        messagebox.showerror("Error", f"Could not build the consolidated report:\n{error}")
+        return
+
+    popup = ttk.Toplevel(root)
+    popup.title("Consolidated Report")
+    text_consolidated = tk.Text(popup, height=30, width=120, font=("Helvetica", 12), wrap="none")
+    text_consolidated.pack(padx=10, pady=10, fill="both", expand=True)
+    for location in consolidate.labels(paths)[1]:
+        text_consolidated.insert(tk.END, f"Warning: {location} is the location of more than one database; "
+                                         "their figures are added together.\n")
+    text_consolidated.insert(tk.END, "Sales (units / total)\n")
+    text_consolidated.insert(tk.END, consolidate.format_sales(*sales) + "\n\n")
+    text_consolidated.insert(tk.END, "Stock\n")
+    text_consolidated.insert(tk.END, consolidate.format_stock(*stock) + "\n")
+
+@perf.timed
+def show_analytics():
+    with pool.reader() as conn:
+        result = analytics.analyze(conn)
+
+    popup = ttk.Toplevel(root)
+    popup.title("Sales Analytics")
+    text_analytics = tk.Text(popup, height=30, width=90, font=("Helvetica", 12))
+    text_analytics.pack(padx=10, pady=10, fill="both", expand=True)
+
+    text_analytics.insert(tk.END, "Top Sellers\n")
+    text_analytics.insert(tk.END, "Item\tSold\tTotal\n")
+    for name, sold, total in result["top_sellers"]:
+        text_analytics.insert(tk.END, f"{name}\t{sold}\t{shop_db.format_cents(total)}\n")
+
+    text_analytics.insert(tk.END, "\nStock-out Forecast\n")
+    text_analytics.insert(tk.END, "Item\tStock\tPer Day (7d)\tPer Day (28d)\tDays Left\n")
+    for name, stock, short_velocity, velocity, days_left in result["items"]:
+        days = f"{days_left:.1f}" if days_left is not None else "-"
+        text_analytics.insert(tk.END, f"{name}\t{stock}\t{short_velocity:.2f}\t{velocity:.2f}\t{days}\n")
+
+# =================== Status Bar ===================
+# Success messages go here instead of a modal popup, so the till never waits
+# for an OK click. Each message holds, then fades into the background; a new
+# message replaces the current one straight away. Errors stay modal.
+STATUS_HOLD_MS = 3000
+STATUS_FADE_MS = 80
+STATUS_FADE = ["#212529", "#4d5154", "#7a7d80", "#a6a8aa", "#d3d4d5", "#ffffff"]
+status_job = None
+
+def notify(message):
+    global status_job
+    if status_job:
+        root.after_cancel(status_job)
+    label_status.configure(text=message, foreground=STATUS_FADE[0])
+    status_job = root.after(STATUS_HOLD_MS, fade_status, 1)
+
+def fade_status(step):
+    global status_job
+    if step < len(STATUS_FADE):
+        label_status.configure(foreground=STATUS_FADE[step])
+        status_job = root.after(STATUS_FADE_MS, fade_status, step + 1)
+    else:
+        label_status.configure(text="")
+        status_job = None
+
+def show_perf_panel(event=None):
+    def fill():
+        text_perf.delete(1.0, tk.END)
+        state = "on" if perf.enabled else "off"
+        text_perf.insert(tk.END, f"Recording: {state}\tMain-thread stalls (>{perf.STALL_MS} ms): {perf.stalls}\t"
+                                 f"Redraws: {views.requested} asked, {views.redrawn} done, {views.saved()} saved\n\n")
+        text_perf.insert(tk.END, "Kind\tCalls\tTotal ms\tMax ms\tName\n")
+        for kind, name, calls, total_ms, max_ms in perf.summary(200):
+            text_perf.insert(tk.END, f"{kind}\t{calls}\t{total_ms:.1f}\t{max_ms:.1f}\t{name}\n")
+
+    def toggle():
+        if perf.enabled:
+            perf.disable()
+        else:
+            perf.enable()
+        fill()
+
+    def reset():
+        perf.reset()
+        fill()
+
+    popup = ttk.Toplevel(root)
+    popup.title("Performance")
+    text_perf = tk.Text(popup, height=25, width=120, font=("Courier", 10), wrap="none")
+    text_perf.pack(padx=10, pady=10, fill="both", expand=True)
+    frame_perf = ttk.Frame(popup)
+    frame_perf.pack(pady=5)
+    ttk.Button(frame_perf, text="Start/Stop Recording", command=toggle, style="primary.TButton").grid(row=0, column=0, padx=5)
+    ttk.Button(frame_perf, text="Refresh", command=fill, style="primary.TButton").grid(row=0, column=1, padx=5)
+    ttk.Button(frame_perf, text="Reset", command=reset, style="danger.TButton").grid(row=0, column=2, padx=5)
+    fill()
+
+# Revenue, cost of goods sold and margin over the last costing.WINDOW_DAYS
+# days, by day and by item, read from the costs stored on each sale.
+@perf.timed
+def show_margin_report():
+    def fill():
+        text_margin.delete(1.0, tk.END)
+        with pool.reader() as conn:
+            by_day = costing.margin_by_day(conn)
+            by_item = costing.margin_by_item(conn)
+        for title, rows in (("Day", by_day), ("Item", by_item)):
+            text_margin.insert(tk.END, f"{title}\tSold\tRevenue\tCost\tMargin\tNo Cost\n")
+            for key, units, revenue, cost, margin, uncosted in rows:
+                text_margin.insert(tk.END, f"{key}\t{units}\t{shop_db.format_cents(revenue)}\t"
+                                           f"{shop_db.format_cents(cost or 0)}\t{shop_db.format_cents(margin or 0)}\t{uncosted}\n")
+            text_margin.insert(tk.END, "\n")
+
+    @perf.timed
+    def rebuild():
+        with pool.writer() as conn:
+            costed, layers = costing.rebuild(conn)
+        notify(f"Recosted {costed} sales from {layers} deliveries.")
+        fill()
+
+    popup = ttk.Toplevel(root)
+    popup.title(f"Margin, Last {costing.WINDOW_DAYS} Days")
+    text_margin = tk.Text(popup, height=30, width=100, font=("Helvetica", 12))
+    text_margin.pack(padx=10, pady=10, fill="both", expand=True)
+    ttk.Button(popup, text="Rebuild Costs", command=rebuild, style="danger.TButton").pack(pady=5)
+    fill()
+
+# Month-end stock-take: counts are typed in or loaded from a CSV file of item
+# and count, checked against the books, then applied together as one
+# journalled adjustment. Items not counted keep their quantity.
+@perf.timed
+def show_stock_take():
+    counts = {}
+
+    def fill():
+        text_take.delete(1.0, tk.END)
+        if not counts:
+            text_take.insert(tk.END, "No counts yet. Type them in or load a file.\n")
+            return
+        with pool.reader() as conn:
+            off = stocktake.differences(conn, counts.items())
+        text_take.insert(tk.END, f"{len(counts)} items counted, {len(off)} differ from the books.\n\n")
+        text_take.insert(tk.END, "Name\tOn Record\tCounted\tDifference\n")
+        for name, on_record, counted, difference in off:
+            text_take.insert(tk.END, f"{name}\t{on_record}\t{counted}\t{difference:+d}\n")
+
+    @perf.timed
+    def add_count(event=None):
+        name = entry_take_name.get().strip()
+        try:
+            counted = int(entry_take_count.get())
+        except ValueError:
+            messagebox.showerror("Error", "Enter a whole number count.")
+            return
+        if not name or counted < 0:
+            messagebox.showerror("Error", "Enter an item name and a count of zero or more.")
+            return
+        counts[name] = counted
+        entry_take_name.delete(0, tk.END)
+        entry_take_count.delete(0, tk.END)
+        entry_take_name.focus_set()
+        fill()
+
+    @perf.timed
+    def load_file():
+        path = filedialog.askopenfilename(title="Load Stock Count", filetypes=[("CSV files", "*.csv")])
+        if not path:
+            return
+        try:
+            loaded = list(stocktake.read_counts(path))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Could not read {os.path.basename(path)}: {e}")
+            return
+        # A file counts a whole area; its counts add to each other's.
+        file_counts = {}
+        for name, counted in loaded:
+            file_counts[name] = file_counts.get(name, 0) + counted
+        counts.update(file_counts)
+        notify(f"Loaded {len(loaded)} counts.")
+        fill()
+
+    @perf.timed
+    def apply_counts():
+        if not counts:
+            return
+        if not messagebox.askyesno("Stock Take", f"Set {len(counts)} counted items to their counts?", parent=popup):
+            return
+        with pool.writer() as conn:
+            take, adjusted, units = stocktake.apply(conn, counts.items(), "stock take")
+            alerts.load(conn)
+        counts.clear()
+        notify(f"Stock take {take}: adjusted {adjusted} items, net {units:+d} units.")
+        views.mark("alerts", "unsold")
+        fill()
+
+    popup = ttk.Toplevel(root)
+    popup.title("Stock Take")
+    frame_take = ttk.Frame(popup)
+    frame_take.pack(padx=10, pady=5, fill="x")
+    ttk.Label(frame_take, text="Item:", style="TLabel").grid(row=0, column=0, sticky="e")
+    entry_take_name = ttk.Entry(frame_take, style="TEntry")
+    entry_take_name.grid(row=0, column=1, padx=5)
+    ttk.Label(frame_take, text="Counted:", style="TLabel").grid(row=0, column=2, sticky="e")
+    entry_take_count = ttk.Entry(frame_take, width=8, style="TEntry")
+    entry_take_count.grid(row=0, column=3, padx=5)
+    entry_take_count.bind("<Return>", add_count)
+    ttk.Button(frame_take, text="Add Count", command=add_count, style="primary.TButton").grid(row=0, column=4, padx=5)
+    ttk.Button(frame_take, text="Load File", command=load_file, style="primary.TButton").grid(row=0, column=5, padx=5)
+    text_take = tk.Text(popup, height=25, width=70, font=("Helvetica", 12))
+    text_take.pack(padx=10, pady=5, fill="both", expand=True)
+    ttk.Button(popup, text="Apply Stock Take", command=apply_counts, style="danger.TButton").pack(pady=5)
+    fill()
+
+# Revenue or units per day for all items or one. The mouse wheel zooms around
+# the pointer and dragging pans; each view re-queries only the days in sight.
+@perf.timed
+def show_sales_chart():
+    with pool.reader() as conn:
+        first_date, last_date = shop_db.sales_date_range(conn)
+    if not first_date:
+        messagebox.showinfo("Sales Chart", "No sales data available.")
+        return
+    full_first = date.fromisoformat(first_date).toordinal()
+    full_last = date.fromisoformat(last_date).toordinal()
+    view = {"first": full_first, "last": full_last, "drag": None}
+
+    @perf.timed
+    def redraw(event=None):
+        width = max(canvas.winfo_width() - charts.MARGIN_LEFT - charts.MARGIN_RIGHT, 3)
+        name = entry_chart_item.get().strip() or None
+        with pool.reader() as conn:
+            points, days = charts.series(conn, view["first"], view["last"], metric.get(), name, width)
+        charts.draw(canvas, points, view["first"], view["last"], metric.get())
+        label_chart.config(text=f"{days} days with sales, {len(points)} points drawn")
+
+    # Keeps at least a week in view and never runs past the sales history.
+    def set_view(first, last):
+        span = min(max(last - first, 7), full_last - full_first)
+        first = min(max(first, full_first), full_last - span)
+        view["first"], view["last"] = round(first), round(first + span)
+        redraw()
+
+    def zoom(event):
+        ratio = 0.8 if event.num == 4 or event.delta > 0 else 1.25
+        centre = charts.day_at(canvas, event.x, view["first"], view["last"])
+        set_view(centre - (centre - view["first"]) * ratio, centre + (view["last"] - centre) * ratio)
+
+    def start_pan(event):
+        view["drag"] = (event.x, view["first"], view["last"])
+
+    def pan(event):
+        x, first, last = view["drag"]
+        shift = (x - event.x) * (last - first) / max(canvas.winfo_width() - charts.MARGIN_LEFT - charts.MARGIN_RIGHT, 1)
+        set_view(first + shift, last + shift)
+
+    def show_all():
+        set_view(full_first, full_last)
+
+    popup = ttk.Toplevel(root)
+    popup.title("Sales Chart")
+    frame_chart = ttk.Frame(popup)
+    frame_chart.pack(padx=10, pady=5, fill="x")
+    metric = tk.StringVar(value="Revenue")
+    ttk.Combobox(frame_chart, textvariable=metric, values=list(charts.METRICS), state="readonly", width=10).grid(row=0, column=0, padx=5)
+    ttk.Label(frame_chart, text="Item (blank for all):", style="TLabel").grid(row=0, column=1, padx=5)
+    entry_chart_item = ttk.Entry(frame_chart, style="TEntry")
+    entry_chart_item.grid(row=0, column=2, padx=5)
+    ttk.Button(frame_chart, text="Show", command=redraw, style="primary.TButton").grid(row=0, column=3, padx=5)
+    ttk.Button(frame_chart, text="Full Range", command=show_all, style="primary.TButton").grid(row=0, column=4, padx=5)
+    label_chart = ttk.Label(frame_chart, text="", style="TLabel")
+    label_chart.grid(row=0, column=5, padx=10)
+
+    canvas = tk.Canvas(popup, width=900, height=400, background="white")
+    canvas.pack(padx=10, pady=10, fill="both", expand=True)
+    metric.trace_add("write", lambda *args: redraw())
+    entry_chart_item.bind("<Return>", redraw)
+    canvas.bind("<Configure>", redraw)
+    canvas.bind("<MouseWheel>", zoom)
+    canvas.bind("<Button-4>", zoom)
+    canvas.bind("<Button-5>", zoom)
+    canvas.bind("<ButtonPress-1>", start_pan)
+    canvas.bind("<B1-Motion>", pan)
+
+# Idle-time housekeeping so far this session, and how much of the file is free.
+@perf.timed
+def show_maintenance_report():
+    popup = ttk.Toplevel(root)
+    popup.title("Maintenance")
+    text_maintenance = tk.Text(popup, height=20, width=90, font=("Courier", 10), wrap="none")
+    text_maintenance.pack(padx=10, pady=10, fill="both", expand=True)
+
+    with pool.reader() as conn:
+        page_size, page_count, free = maintenance.page_stats(conn)
+    text_maintenance.insert(tk.END, f"Database: {page_count * page_size // 1024} KB, "
+                                    f"{free * page_size // 1024} KB free to reclaim\n")
+    text_maintenance.insert(tk.END, f"Integrity: {maintenance.integrity or 'not checked yet'}\n\n")
+    text_maintenance.insert(tk.END, "Action\tRuns\tTotal ms\tMax ms\tReclaimed KB\n")
+    for action, runs, total_ms, max_ms, reclaimed in maintenance.summary():
+        text_maintenance.insert(tk.END, f"{action}\t{runs}\t{total_ms:.1f}\t{max_ms:.1f}\t{reclaimed // 1024}\n")
+
 # =================== GUI Setup ===================
 # Initialize ttkbootstrap with the 'flatly' theme
 root = ttk.Window(themename="flatly")
@@ -204,7 +1020,19 @@ ttk.Label(frame_in, text="Order Price (Optional):", style="TLabel").grid(row=2,
 entry_price_in = ttk.Entry(frame_in, style="TEntry")
 entry_price_in.grid(row=2, column=1, pady=2, sticky="ew")
 
-ttk.Button(frame_in, text="Add Commodity", command=add_commodity, style="primary.TButton").grid(row=3, column=0, columnspan=2, pady=5, sticky="nsew")
+ttk.Label(frame_in, text="Reorder Level (Optional):", style="TLabel").grid(row=3, column=0, pady=2, sticky="w")
+entry_reorder_in = ttk.Entry(frame_in, style="TEntry")
+entry_reorder_in.grid(row=3, column=1, pady=2, sticky="ew")
+
+ttk.Label(frame_in, text="Barcode / SKU (Optional):", style="TLabel").grid(row=4, column=0, pady=2, sticky="w")
+entry_sku_in = ttk.Entry(frame_in, style="TEntry")
+entry_sku_in.grid(row=4, column=1, pady=2, sticky="ew")
+
+ttk.Label(frame_in, text="Selling Price (Optional):", style="TLabel").grid(row=5, column=0, pady=2, sticky="w")
+entry_sell_in = ttk.Entry(frame_in, style="TEntry")
+entry_sell_in.grid(row=5, column=1, pady=2, sticky="ew")
+
+ttk.Button(frame_in, text="Add Commodity", command=add_commodity, style="primary.TButton").grid(row=6, column=0, columnspan=2, pady=5, sticky="nsew")
 
 # Outgoing Section
 frame_out = ttk.LabelFrame(root, text="Outgoing Commodities (Sales)", padding=10, style="warning.TLabelframe")
@@ -225,6 +1053,23 @@ entry_price_out.grid(row=2, column=1, pady=2, sticky="ew")
 
 ttk.Button(frame_out, text="Sell Commodity", command=sell_commodity, style="primary.TButton").grid(row=3, column=0, columnspan=2, pady=5, sticky="nsew")
 
+# Basket (cart) mode: Enter in the price field adds the line to the basket
+ttk.Button(frame_out, text="Add to Basket", command=add_to_basket, style="primary.TButton").grid(row=4, column=0, padx=2, pady=5, sticky="nsew")
+ttk.Button(frame_out, text="Checkout Basket", command=checkout_basket, style="success.TButton").grid(row=4, column=1, padx=2, pady=5, sticky="nsew")
+text_basket = tk.Text(frame_out, height=6, width=30, font=("Helvetica", 12))
+text_basket.grid(row=5, column=0, columnspan=2, pady=2, sticky="nsew")
+ttk.Button(frame_out, text="Price Scans", command=price_scans, style="primary.TButton").grid(row=6, column=0, padx=2, pady=5, sticky="nsew")
+ttk.Button(frame_out, text="Clear Basket", command=clear_basket, style="danger.TButton").grid(row=6, column=1, padx=2, pady=5, sticky="nsew")
+entry_price_out.bind("<Return>", add_to_basket)
+# Name and quantity are enough: the price fills itself in from the catalogue.
+entry_name_out.bind("<KeyRelease>", fill_sale_price)
+entry_qty_out.bind("<Return>", add_to_basket)
+
+ttk.Label(frame_out, text="Scan Barcode:", style="TLabel").grid(row=7, column=0, pady=2, sticky="w")
+entry_scan = ttk.Entry(frame_out, style="TEntry")
+entry_scan.grid(row=7, column=1, pady=2, sticky="ew")
+entry_scan.bind("<Return>", scan_barcode)
+
 # Reports Section
 frame_report = ttk.LabelFrame(root, text="Reports", padding=10)
 frame_report.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
@@ -237,11 +1082,15 @@ ttk.Label(frame_report, text="Daily Progress:", style="TLabel").grid(row=0, colu
 text_progress = tk.Text(frame_report, height=10, width=30, font=("Helvetica", 12))
 text_progress.grid(row=1, column=1, padx=5, pady=2, sticky="nsew")
 
+ttk.Label(frame_report, text="Low Stock Alerts:", style="TLabel").grid(row=0, column=2, pady=2, sticky="w")
+text_alerts = tk.Text(frame_report, height=10, width=30, font=("Helvetica", 12))
+text_alerts.grid(row=1, column=2, padx=5, pady=2, sticky="nsew")
+
 # Buttons Section
 frame_buttons = ttk.Frame(root)
 frame_buttons.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
 
-ttk.Button(frame_buttons, text="Refresh Report", command=lambda: [refresh_unsold(), show_progress()], style="primary.TButton").grid(row=0, column=0, padx=5, pady=5)
+ttk.Button(frame_buttons, text="Refresh Report", command=lambda: views.mark("unsold", "progress"), style="primary.TButton").grid(row=0, column=0, padx=5, pady=5)
 ttk.Button(frame_buttons, text="Send Report via WhatsApp", command=send_report_whatsapp, style="success.TButton").grid(row=0, column=1, padx=5, pady=5)
 
 ttk.Label(frame_buttons, text="Enter Name to Search:", style="TLabel").grid(row=1, column=0, pady=2, sticky="e")
@@ -252,6 +1101,36 @@ ttk.Button(frame_buttons, text="Search Commodity", command=lambda: search_commod
 
 ttk.Button(frame_buttons, text="Clear Recent Report", command=clear_recent_report, style="danger.TButton").grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
 
+ttk.Button(frame_buttons, text="Sales Analytics", command=show_analytics, style="primary.TButton").grid(row=4, column=0, columnspan=2, pady=5, sticky="ew")
+
+ttk.Button(frame_buttons, text="Export Reorder List", command=export_reorder_list, style="primary.TButton").grid(row=5, column=0, columnspan=2, pady=5, sticky="ew")
+
+ttk.Button(frame_buttons, text="Export Changes", command=export_changes, style="primary.TButton").grid(row=6, column=0, padx=5, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Import Changes", command=import_changes, style="primary.TButton").grid(row=6, column=1, padx=5, pady=5, sticky="ew")
+
+ttk.Label(frame_buttons, text="Shop Location:", style="TLabel").grid(row=7, column=0, pady=2, sticky="e")
+entry_location = ttk.Entry(frame_buttons, style="TEntry")
+entry_location.grid(row=7, column=1, pady=2, sticky="w")
+with pool.reader() as conn:
+    entry_location.insert(0, shop_db.shop_location(conn) or "")
+entry_location.bind("<Return>", save_location)
+entry_location.bind("<FocusOut>", save_location)
+
+ttk.Button(frame_buttons, text="Consolidated Report", command=show_consolidated_report, style="primary.TButton").grid(row=8, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Maintenance Report", command=show_maintenance_report, style="primary.TButton").grid(row=9, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Sales Chart", command=show_sales_chart, style="primary.TButton").grid(row=10, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Margin Report", command=show_margin_report, style="primary.TButton").grid(row=11, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Export Report", command=export_report, style="primary.TButton").grid(row=12, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Stock Take", command=show_stock_take, style="primary.TButton").grid(row=13, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Purge Sales", command=show_purge, style="danger.TButton").grid(row=14, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Report Outbox", command=show_outbox, style="primary.TButton").grid(row=15, column=0, columnspan=2, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Close Day", command=close_day, style="primary.TButton").grid(row=16, column=0, padx=5, pady=5, sticky="ew")
+ttk.Button(frame_buttons, text="Stock History", command=show_stock_history, style="primary.TButton").grid(row=16, column=1, padx=5, pady=5, sticky="ew")
+
+# Status Bar
+label_status = ttk.Label(root, text="", style="TLabel", anchor="w")
+label_status.grid(row=3, column=0, columnspan=2, padx=10, pady=2, sticky="ew")
+
 # Grid Configuration
 root.grid_rowconfigure(0, weight=1)
 root.grid_rowconfigure(1, weight=2)
@@ -262,12 +1141,52 @@ root.grid_columnconfigure(1, weight=1)
 frame_report.grid_rowconfigure(1, weight=1)
 frame_report.grid_columnconfigure(0, weight=1)
 frame_report.grid_columnconfigure(1, weight=1)
+frame_report.grid_columnconfigure(2, weight=1)
 
 frame_buttons.grid_columnconfigure(0, weight=1)
 frame_buttons.grid_columnconfigure(1, weight=1)
 
+# Hidden performance panel
+root.bind("<Control-Shift-P>", show_perf_panel)
+perf.watch_stalls(root)
+perf.watch_input(root)
+maintenance.schedule(root)
+
+# Set MB_EOD_REPORT=HH:MM to close the day and send its report at that time
+# each day, over the comma-separated MB_EOD_CHANNELS (default: file).
+if os.environ.get("MB_EOD_REPORT"):
+    eod_channels = os.environ.get("MB_EOD_CHANNELS", "file").split(",")
+
+    def end_of_day():
+        close_day()
+        queue_report(eod_channels, f"End of Day Report {shop_db.today()}")
+
+    try:
+        outbox.schedule(root, os.environ["MB_EOD_REPORT"], end_of_day)
+    except ValueError:
+        messagebox.showerror("Error", f"MB_EOD_REPORT must be a time such as 21:30, not "
+                                      f"{os.environ['MB_EOD_REPORT']!r}: no end-of-day report is scheduled.")
+
 # Initial Display
-refresh_unsold()
-show_progress()
+with pool.writer() as conn:
+    costing.ensure_built(conn)
+with pool.reader() as conn:
+    barcodes.load(conn)
+    prices.load(conn)
+    alerts.load(conn)
+views.attach(root)
+views.register("alerts", refresh_alerts)
+views.register("unsold", refresh_unsold)
+views.register("progress", show_progress)
+refresh_basket()
+views.mark("alerts", "unsold", "progress")
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+purge.cancel()
+purge.wait()
+outbox.stop()
+group_commit.stop()
+receipts.stop()
+with pool.writer() as conn:
+    maintenance.shutdown(conn)
+pool.stop()
\ No newline at end of file
@@ -0,0 +1,39 @@
+import csv
+import shop_db
+
+# name -> (quantity, reorder_level) for every item at or below its level.
+# Loaded once at startup, then kept current one item at a time.
+low_stock = {}
+
+
+def load(conn):
+    low_stock.clear()
+    for name, quantity, level in shop_db.reorder_rows(conn):
+        low_stock[name] = (quantity, level)
+
+
+# Re-checks only the item that was just sold, delivered or re-levelled.
+# Returns True when the item is (still) low.
+def check(conn, name):
+    row = shop_db.stock_level(conn, name)
+    if row and row[1] > 0 and row[0] <= row[1]:
+        low_stock[name] = row
+        return True
+    low_stock.pop(name, None)
+    return False
+
+
+# Shortest first, same order as the reorder list export.
+def alert_rows():
+    return sorted(((name, quantity, level) for name, (quantity, level) in low_stock.items()),
+                  key=lambda row: row[1] - row[2])
+
+
+def export_reorder_list(conn, path):
+    rows = shop_db.reorder_rows(conn)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Item", "In Stock", "Reorder Level", "Shortfall"])
+        for name, quantity, level in rows:
+            writer.writerow([name, quantity, level, level - quantity])
+    return len(rows)
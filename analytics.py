@@ -0,0 +1,89 @@
+from array import array
+from datetime import date
+
+# Results are reused until the database changes. PRAGMA data_version moves
+# when another connection commits; total_changes covers our own writes.
+_cache = {}
+
+
+def _version(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+# =================== Loading ===================
+# Sales history as parallel column arrays, one entry per (day, item) rather
+# than one Python object per sale. The GROUP BY reads only idx_sales_day_item.
+def load_history(conn):
+    names = []
+    item_ids = {}
+    day = array('l')
+    item = array('l')
+    qty = array('q')
+    cents = array('q')
+
+    last_date = last_day = None
+    for sale_date, name, sold, total in conn.execute(
+            "SELECT date, name, SUM(quantity_sold), SUM(total_cents) FROM sales "
+            "WHERE quantity_sold > 0 GROUP BY date, name"):
+        if sale_date != last_date:
+            last_date, last_day = sale_date, date.fromisoformat(sale_date).toordinal()
+        item_id = item_ids.get(name)
+        if item_id is None:
+            item_id = item_ids[name] = len(names)
+            names.append(name)
+        day.append(last_day)
+        item.append(item_id)
+        qty.append(sold)
+        cents.append(total)
+
+    return {"names": names, "item_ids": item_ids, "day": day, "item": item, "qty": qty, "cents": cents}
+
+
+# =================== Analysis ===================
+# Returns {"top_sellers": [(name, units, cents)], "items": [(name, stock,
+# units/day over `short` days, units/day over `window` days, days left)]}.
+# Items are ordered by how soon they run out; days left is None when the
+# item has not sold in the window.
+def analyze(conn, window=28, short=7, top=10, today=None, refresh=False):
+    key = (_version(conn), window, short, top, today)
+    cached = _cache.get(id(conn))
+    if not refresh and cached and cached[0] is conn and cached[1] == key:
+        return cached[2]
+
+    history = load_history(conn)
+    names, item_ids = history["names"], history["item_ids"]
+    day, item, qty, cents = history["day"], history["item"], history["qty"], history["cents"]
+    count = len(names)
+    total_qty = array('q', [0]) * count
+    total_cents = array('q', [0]) * count
+    window_qty = array('q', [0]) * count
+    short_qty = array('q', [0]) * count
+
+    end = (today or date.today()).toordinal()
+    window_start = end - window + 1
+    short_start = end - short + 1
+    for i in range(len(day)):
+        item_id = item[i]
+        sold = qty[i]
+        total_qty[item_id] += sold
+        total_cents[item_id] += cents[i]
+        if day[i] >= window_start:
+            window_qty[item_id] += sold
+            if day[i] >= short_start:
+                short_qty[item_id] += sold
+
+    best = sorted(range(count), key=total_qty.__getitem__, reverse=True)[:top]
+    top_sellers = [(names[i], total_qty[i], total_cents[i]) for i in best]
+
+    items = []
+    for name, stock in conn.execute("SELECT name, quantity FROM commodities"):
+        item_id = item_ids.get(name)
+        short_velocity = short_qty[item_id] / short if item_id is not None else 0.0
+        velocity = window_qty[item_id] / window if item_id is not None else 0.0
+        days_left = stock / velocity if velocity else None
+        items.append((name, stock, short_velocity, velocity, days_left))
+    items.sort(key=lambda row: (row[4] is None, row[4] or 0))
+
+    result = {"top_sellers": top_sellers, "items": items}
+    _cache[id(conn)] = (conn, key, result)
+    return result
@@ -0,0 +1,26 @@
+import shop_db
+
+# sku -> name for every coded item. Scans are resolved here, never in the
+# database; the map is loaded once and updated whenever a code is assigned.
+codes = {}
+
+
+def load(conn):
+    codes.clear()
+    codes.update(shop_db.sku_rows(conn))
+
+
+def lookup(code):
+    return codes.get(code.strip())
+
+
+# Returns False when the code already belongs to another item.
+def assign(conn, name, sku):
+    sku = sku.strip()
+    if not shop_db.set_sku(conn, name, sku):
+        return False
+    for code, coded_name in list(codes.items()):
+        if coded_name == name:
+            del codes[code]
+    codes[sku] = name
+    return True
@@ -0,0 +1,1216 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+import analytics
+import charts
+import closing
+import costing
+import group_commit
+import maintenance
+import outbox
+import pool
+import progress
+import purge
+import receipts
+import reports
+import snapshot
+import stocktake
+import views
+import shop_db
+import sync
+import synth_data
+
+SIZES = [10_000, 100_000, 1_000_000]
+BASELINE = 'bench_baseline.json'
+REGRESSION_RATIO = 1.25
+BASKET_ITEMS = 15
+
+
+# =================== Timing ===================
+# Runs fn until `budget` seconds have been spent or `max_runs` is reached.
+def timed(fn, max_runs=200, budget=1.0):
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        if time.perf_counter() - started > budget:
+            break
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "runs": len(samples),
+    }
+
+
+# =================== Hot Paths ===================
+def build_db(workdir, rows):
+    path = os.path.join(workdir, f"shop_{rows}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    synth_data.generate(conn, commodities=max(50, rows // 1000), sales=rows)
+    return conn
+
+
+def bench_size(workdir, rows, budget):
+    t0 = time.perf_counter()
+    conn = build_db(workdir, rows)
+    print(f"  generated {rows} sales in {time.perf_counter() - t0:.1f}s")
+    rng = random.Random(rows)
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    # Plenty of stock, so no sale is rejected part way through a run.
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+
+    def basket():
+        return [(rng.choice(names), 1, 250) for _ in range(BASKET_ITEMS)]
+
+    first, last = (datetime.fromisoformat(day).toordinal() for day in shop_db.sales_date_range(conn))
+
+    cases = {
+        "sell_commodity": lambda: shop_db.sell_stock(conn, rng.choice(names), 1, 250),
+        "add_commodity": lambda: shop_db.add_stock(conn, rng.choice(names), 5, 125),
+        "basket_checkout": lambda: shop_db.sell_basket(conn, basket()),
+        "basket_as_single_sales": lambda: [shop_db.sell_stock(conn, *line) for line in basket()],
+        "refresh_unsold": lambda: shop_db.stock_rows(conn),
+        "show_progress": lambda: shop_db.progress_rows(conn),
+        "search_commodity": lambda: shop_db.search_totals(conn, rng.choice(names)),
+        "price_on_date": lambda: shop_db.price_on(conn, rng.choice(names), shop_db.today()),
+        "analytics": lambda: analytics.analyze(conn, refresh=True),
+        "sales_chart": lambda: charts.series(conn, first, last, "Revenue", None, 800),
+        "sales_chart_item": lambda: charts.series(conn, first, last, "Units", rng.choice(names), 800),
+        # Each run removes one more day, which is what repeated clicks do.
+        "clear_recent_report": lambda: shop_db.clear_recent(conn),
+    }
+    results = {}
+    for name, fn in cases.items():
+        results[name] = timed(fn, budget=budget)
+        print(f"  {name:<22}{results[name]['median_ms']:>12.3f} ms  ({results[name]['runs']} runs)")
+    for name in ("basket_checkout", "basket_as_single_sales"):
+        results[name]["per_minute"] = 60_000 / results[name]["median_ms"]
+        print(f"  {name}: {results[name]['per_minute']:.0f} baskets/minute of {BASKET_ITEMS} items")
+    conn.close()
+    return results
+
+
+# =================== Money Exactness ===================
+# Writes `rows` sales of awkward amounts (0.10, 0.30, 19.99 ...) the old way,
+# as REAL units, migrates them to integer cents and checks the SUM is exact.
+def money_check(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""CREATE TABLE sales (id INTEGER PRIMARY KEY, name TEXT, quantity_sold INTEGER,
+                    price_per_unit REAL, total_price REAL, date TEXT)""")
+    rng = random.Random(rows)
+    expected = 0
+
+    def old_rows():
+        nonlocal expected
+        for i in range(rows):
+            qty = rng.randint(1, 3)
+            cents = rng.choice((10, 20, 30, 70, 110, 1999))
+            expected += qty * cents
+            price = cents / 100
+            yield f"Item {i % 100}", qty, price, qty * price, "2026-01-01"
+
+    conn.executemany("INSERT INTO sales (name, quantity_sold, price_per_unit, total_price, date) VALUES (?, ?, ?, ?, ?)",
+                     old_rows())
+    conn.commit()
+    real_total = conn.execute("SELECT SUM(total_price) FROM sales").fetchone()[0]
+
+    t0 = time.perf_counter()
+    shop_db.init_db(conn)
+    migrate_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    total = conn.execute("SELECT SUM(total_cents) FROM sales").fetchone()[0]
+    sum_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"{rows} sales: expected {shop_db.format_cents(expected)}")
+    print(f"  REAL SUM     {real_total!r}  (drift {real_total - expected / 100:+.3e})")
+    print(f"  cents SUM    {shop_db.format_cents(total)}  in {sum_ms:.1f} ms, migrated in {migrate_s:.1f}s")
+    return total == expected
+
+
+# =================== Branch Sync ===================
+# Branch A journals `changes` sales and deliveries over 30 days, then clears
+# its latest day. A's journal is exported as two segments and merged into an
+# empty branch C newest segment first, and into branch B (which has sales of
+# its own) twice. C must end up identical to A, and B's second import must
+# apply nothing.
+def sync_check(changes, workdir):
+    paths = [os.path.join(workdir, f"branch_{branch}.db") for branch in "abc"]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    a, b, c = (shop_db.connect(path) for path in paths)
+    rng = random.Random(changes)
+    names = [f"Item {i:05d}" for i in range(200)]
+    for name in names:
+        shop_db.add_stock(a, name, 10 ** 9, 100)
+        shop_db.add_stock(b, name, 10 ** 9)
+    shop_db.set_reorder_level(a, names[0], 40)
+    shop_db.set_sku(a, names[0], "6000000000000")
+    shop_db.set_sell_price(a, names[0], 199, "2026-01-01")
+    shop_db.set_sell_price(a, names[0], 249, "2026-01-15")
+    stocktake.apply(a, [(names[2], 2 * 10 ** 9 - 7), ("Counted only", 3)])
+    shop_db.sell_basket(b, [(names[1], 5, 300)])
+
+    written = len(names) + 2
+    day = 0
+    while written < changes:
+        lines = [(rng.choice(names), rng.randint(1, 5), rng.randint(50, 5000))
+                 for _ in range(min(1000, changes - written))]
+        shop_db.sell_basket(a, lines, f"2026-01-{day % 30 + 1:02d}")
+        written += len(lines)
+        day += 1
+    shop_db.clear_recent(a)
+
+    last = a.execute("SELECT MAX(seq) FROM changes").fetchone()[0]
+    older = os.path.join(workdir, "a_older.seg")
+    newer = os.path.join(workdir, "a_newer.seg")
+    t0 = time.perf_counter()
+    sync.export_segment(a, older, 0, last // 2)
+    sync.export_segment(a, newer, last // 2)
+    print(f"{last} changes: exported in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    applied = sync.import_segment(c, newer) + sync.import_segment(c, older)
+    print(f"  merged {applied} into an empty branch, newest first, in {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    applied = sync.import_segment(b, older) + sync.import_segment(b, newer)
+    print(f"  merged {applied} into a branch with its own sales in {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    again = sync.import_segment(b, older) + sync.import_segment(b, newer)
+    print(f"  re-imported both segments: {again} new changes, {time.perf_counter() - t0:.1f}s")
+
+    def state(conn):
+        return (conn.execute("SELECT name, quantity, reorder_level, sku, sell_price_cents FROM commodities ORDER BY name").fetchall(),
+                conn.execute("SELECT * FROM price_history ORDER BY name, effective").fetchall(),
+                conn.execute("SELECT date, name, SUM(quantity_sold), SUM(total_cents) FROM sales "
+                             "GROUP BY date, name ORDER BY date, name").fetchall())
+
+    identical = state(a) == state(c)
+    print(f"  branch C matches branch A: {identical}")
+    for conn in (a, b, c):
+        conn.close()
+    return identical and again == 0
+
+
+# =================== Group Commit ===================
+# `tills` threads sell single items as fast as they can for `seconds`, first
+# each committing its own sales through the pool's writer, then through the
+# group commit writer. Returns {mode: sales per second}.
+def group_commit_bench(tills, workdir, seconds=3.0):
+    path = os.path.join(workdir, "group_commit.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    names = [f"Item {i:03d}" for i in range(100)]
+    for name in names:
+        shop_db.add_stock(conn, name, 10 ** 9)
+    conn.close()
+
+    def run(sell):
+        sold = [0] * tills
+        deadline = time.perf_counter() + seconds
+
+        def till(i):
+            rng = random.Random(i)
+            while time.perf_counter() < deadline:
+                if sell(rng.choice(names)) is not None:
+                    sold[i] += 1
+
+        threads = [threading.Thread(target=till, args=(i,)) for i in range(tills)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(sold) / seconds
+
+    def sell_own_commit(name):
+        with pool.writer() as conn:
+            return shop_db.sell_stock(conn, name, 1, 250)
+
+    pool.start(path)
+    try:
+        rates = {"off": run(sell_own_commit)}
+        group_commit.start()
+        try:
+            rates["on"] = run(lambda name: group_commit.sell_stock(name, 1, 250))
+        finally:
+            group_commit.stop()
+    finally:
+        pool.stop()
+
+    conn = shop_db.connect(path)
+    journalled = conn.execute("SELECT COUNT(*) FROM changes WHERE kind = 'sale'").fetchone()[0]
+    recorded = conn.execute("SELECT COUNT(*) FROM sales WHERE quantity_sold > 0").fetchone()[0]
+    conn.close()
+    print(f"{tills} tills, {seconds:.0f}s each way")
+    for mode, rate in rates.items():
+        print(f"  group commit {mode:<4}{rate:>10.0f} sales/second")
+    print(f"  sales journalled {journalled}, recorded {recorded}")
+    return rates
+
+
+# =================== Connection Pool ===================
+# One till sells while `readers` threads run reports for `seconds`: first all
+# sharing one connection, as the app did, then through the pool. Counts
+# operations and "database is locked" errors; the pool must have no errors
+# and more operations per second.
+def pool_check(readers, workdir, rows=100_000, seconds=3.0):
+    path = os.path.join(workdir, "pool.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    synth_data.generate(conn, commodities=max(50, rows // 1000), sales=rows)
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    conn.close()
+
+    reports = [shop_db.progress_rows, shop_db.stock_rows, shop_db.reorder_rows,
+               lambda conn: shop_db.search_totals(conn, names[0])]
+
+    def run(writing, reading):
+        counts = {"sales": 0, "reports": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def work(key, step):
+            rng = random.Random(key)
+            done = locked = 0
+            while time.perf_counter() < deadline:
+                try:
+                    step(rng)
+                    done += 1
+                except sqlite3.OperationalError as error:
+                    if "locked" not in str(error):
+                        raise
+                    locked += 1
+            with lock:
+                counts[key] += done
+                counts["locked"] += locked
+
+        threads = [threading.Thread(target=work, args=("sales", writing))]
+        threads += [threading.Thread(target=work, args=("reports", reading)) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
+
+    shared = sqlite3.connect(path, check_same_thread=False)
+    shared_lock = threading.Lock()
+
+    def shared_sale(rng):
+        with shared_lock:
+            shop_db.sell_stock(shared, rng.choice(names), 1, 250)
+
+    def shared_report(rng):
+        with shared_lock:
+            rng.choice(reports)(shared)
+
+    results = {"shared": run(shared_sale, shared_report)}
+    shared.close()
+
+    def pooled_sale(rng):
+        with pool.writer() as conn:
+            shop_db.sell_stock(conn, rng.choice(names), 1, 250)
+
+    def pooled_report(rng):
+        with pool.reader() as conn:
+            rng.choice(reports)(conn)
+
+    pool.start(path, readers=readers)
+    try:
+        results["pool"] = run(pooled_sale, pooled_report)
+    finally:
+        pool.stop()
+
+    print(f"{rows} sales, 1 till and {readers} report threads, {seconds:.0f}s each way")
+    for mode, counts in results.items():
+        total = (counts["sales"] + counts["reports"]) / seconds
+        print(f"  {mode:<8}{counts['sales'] / seconds:>8.0f} sales/s {counts['reports'] / seconds:>8.0f} reports/s "
+              f"{total:>8.0f} ops/s  {counts['locked']} locked")
+    ops = {mode: counts["sales"] + counts["reports"] for mode, counts in results.items()}
+    return results["pool"]["locked"] == 0 and ops["pool"] > ops["shared"]
+
+
+# =================== Maintenance ===================
+# Clears `days` days of sales from a `rows` database, then reclaims the space
+# with idle-time steps. Every step, and ANALYZE, must stay under
+# MAINTENANCE_STEP_MS; optimize, the integrity check and converting an older
+# database happen at shutdown or off the till thread and are only reported.
+MAINTENANCE_STEP_MS = 5.0
+
+
+def maintenance_check(rows, workdir, days=60):
+    path = os.path.join(workdir, "maintenance.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = build_db(workdir, rows)
+    conn.close()
+    os.replace(os.path.join(workdir, f"shop_{rows}.db"), path)
+
+    pool.start(path)
+    try:
+        with pool.writer() as conn:
+            page_size, before, free = maintenance.page_stats(conn)
+            for _ in range(days):
+                shop_db.clear_recent(conn)
+            free = maintenance.page_stats(conn)[2]
+            print(f"{rows} sales, {before * page_size // 1024} KB; clearing {days} days freed {free * page_size // 1024} KB")
+            maintenance.analyze(conn)
+            while maintenance.vacuum_step(conn):
+                pass
+            after = maintenance.page_stats(conn)[1]
+        maintenance.check_integrity()
+        while maintenance.integrity == "running":
+            time.sleep(0.01)
+        with pool.writer() as conn:
+            maintenance.shutdown(conn)
+            # An older database, as shipped before incremental auto-vacuum.
+            conn.execute("PRAGMA auto_vacuum = NONE")
+            conn.execute("VACUUM")
+            maintenance.shutdown(conn)
+            converted = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        pool.stop()
+
+    print(f"  file went from {before} to {after} pages; integrity {maintenance.integrity}; converted {converted}")
+    print(f"  {'action':<30}{'runs':>6}{'total ms':>10}{'max ms':>9}{'reclaimed KB':>14}")
+    for action, runs, total_ms, max_ms, reclaimed in maintenance.summary():
+        print(f"  {action:<30}{runs:>6}{total_ms:>10.1f}{max_ms:>9.2f}{reclaimed // 1024:>14}")
+    worst = max(max_ms for action, runs, total_ms, max_ms, reclaimed in maintenance.summary()
+                if action in ("incremental vacuum", "analyze"))
+    return worst < MAINTENANCE_STEP_MS and after < before and maintenance.integrity == "ok" and converted
+
+
+# =================== Purge ===================
+# Purges the older half of a `rows` history on the background thread while
+# the till sells flat out, then cancels a second purge part way. Sale latency
+# must stay low, day totals must match the rows left, and every journalled
+# row purged must be voided.
+def purge_check(rows, workdir, seconds=2.0):
+    conn = build_db(workdir, rows)
+    path = os.path.join(workdir, f"shop_{rows}.db")
+    first, last = shop_db.sales_date_range(conn)
+    middle = date.fromordinal((date.fromisoformat(first).toordinal() + date.fromisoformat(last).toordinal()) // 2).isoformat()
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+    for _ in range(100):
+        shop_db.sell_basket(conn, [(names[0], 1, 250), (names[1], 2, 300)], first)
+    conn.close()
+
+    def sell_for(seconds, until_done=False):
+        rng = random.Random(seconds)
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline or (until_done and purge.running()):
+            t0 = time.perf_counter()
+            with pool.writer() as conn:
+                shop_db.sell_stock(conn, rng.choice(names), 1, 250)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        return latencies
+
+    def describe(latencies):
+        return (f"{len(latencies)} sales, median {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                f"p99 {latencies[len(latencies) * 99 // 100] * 1000:.2f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+    def consistent(conn):
+        kept = conn.execute("SELECT date, SUM(quantity_sold), SUM(total_cents) FROM sales "
+                            "WHERE quantity_sold > 0 GROUP BY date ORDER BY date").fetchall()
+        return kept == conn.execute("SELECT date, units, cents FROM daily_sales WHERE units > 0 ORDER BY date").fetchall()
+
+    pool.start(path)
+    try:
+        alone = sell_for(seconds)
+        with pool.reader() as conn:
+            journalled = conn.execute("SELECT COUNT(*) FROM sales WHERE date BETWEEN ? AND ? AND change_seq IS NOT NULL",
+                                      (first, middle)).fetchone()[0]
+        t0 = time.perf_counter()
+        purge.start(first, middle)
+        during = sell_for(0, until_done=True)
+        purge.wait()
+        purge_seconds = time.perf_counter() - t0
+        with pool.reader() as conn:
+            left = shop_db.purge_count(conn, first, middle)
+            voids = conn.execute("SELECT COUNT(*) FROM changes WHERE kind = 'void'").fetchone()[0]
+            totals_ok = consistent(conn)
+        purged = purge.deleted
+        print(f"{rows} sales: purged {purged} rows from {first} to {middle} in {purge_seconds:.1f}s, {purge.status}")
+        print(f"  selling alone:     {describe(alone)}")
+        print(f"  during the purge:  {describe(during)}")
+        print(f"  rows left in range {left}, voids {voids} for {journalled} journalled rows, day totals consistent: {totals_ok}")
+
+        purge.start(middle, last)
+        time.sleep(0.05)
+        purge.cancel()
+        purge.wait()
+        with pool.reader() as conn:
+            cancelled_ok = consistent(conn)
+        print(f"  second purge {purge.status} after {purge.deleted} of {purge.total} rows; "
+              f"day totals consistent: {cancelled_ok}")
+    finally:
+        pool.stop()
+    return (purge.status == "cancelled" and 0 < purge.deleted < purge.total and left == 0 and purged > 0 and voids == journalled
+            and totals_ok and cancelled_ok)
+
+
+# =================== Columnar Snapshot ===================
+# Writes a snapshot of a `rows` history, appends a day's trade to it, then
+# answers the same totals from the mapped columns and from SQL. They must
+# agree; a clear must make the next refresh rewrite it.
+def snapshot_check(rows, workdir):
+    conn = build_db(workdir, rows)
+    directory = os.path.join(workdir, "snapshot")
+    t0 = time.perf_counter()
+    written = snapshot.export(conn, directory)
+    seconds = time.perf_counter() - t0
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"{rows} sales: snapshot of {written} rows written in {seconds:.1f}s, {size / 2 ** 20:.0f} MB")
+
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+    rng = random.Random(rows)
+    for _ in range(100):
+        shop_db.sell_basket(conn, [(rng.choice(names), rng.randint(1, 3), 250) for _ in range(10)])
+    t0 = time.perf_counter()
+    appended, rewritten = snapshot.refresh(conn, directory)
+    print(f"  refresh after 1000 new sales: {appended} appended, rewritten {rewritten}, "
+          f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    first, last = shop_db.sales_date_range(conn)
+    month = date.fromordinal(date.fromisoformat(last).toordinal() - 29).isoformat()
+    cases = [("all sales", None, None, None), ("last 30 days", month, last, None), ("one item, all time", None, None, names[0])]
+    agree = not rewritten and appended == 1000
+    with snapshot.Snapshot(directory) as snap:
+        for label, since, until, name in cases:
+            t0 = time.perf_counter()
+            mapped = snap.totals(since, until, name)
+            ms = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            sql = conn.execute("SELECT COUNT(*), IFNULL(SUM(quantity_sold), 0), IFNULL(SUM(total_cents), 0) FROM sales "
+                               "WHERE quantity_sold > 0 AND date BETWEEN ? AND ? AND name = IFNULL(?, name)",
+                               (since or first, until or last, name)).fetchone()
+            sql_ms = (time.perf_counter() - t0) * 1000
+            agree = agree and tuple(mapped) == tuple(sql)
+            print(f"  {label:<20}{ms:>9.1f} ms mapped {sql_ms:>9.1f} ms SQL  match: {tuple(mapped) == tuple(sql)}")
+        # Again under tracemalloc, which slows it down too much to time.
+        tracemalloc.start()
+        for label, since, until, name in cases:
+            snap.totals(since, until, name)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"  peak Python memory while querying: {peak / 2 ** 20:.1f} MB")
+
+    shop_db.clear_recent(conn)
+    appended, rewritten = snapshot.refresh(conn, directory)
+    with snapshot.Snapshot(directory) as snap:
+        cleared = snap.totals()
+    print(f"  after clearing a day the refresh rewrote it: {rewritten}")
+
+    # Sales ids are reused once the newest rows are cleared. The same
+    # quantities and prices sold again under other names leave every total
+    # as it was, so only the journal seq shows the rows are new.
+    baskets = [[(rng.choice(names), rng.randint(1, 3), 250) for _ in range(10)] for _ in range(100)]
+    for basket in baskets:
+        shop_db.sell_basket(conn, basket)
+    snapshot.refresh(conn, directory)
+    shop_db.clear_recent(conn)
+    for basket in baskets:
+        shop_db.sell_basket(conn, [(names[(names.index(name) + 1) % len(names)], qty, price) for name, qty, price in basket])
+    snapshot.refresh(conn, directory)
+    with snapshot.Snapshot(directory) as snap:
+        resold = all(tuple(snap.totals(name=name)) == conn.execute(
+            "SELECT COUNT(*), IFNULL(SUM(quantity_sold), 0), IFNULL(SUM(total_cents), 0) FROM sales "
+            "WHERE quantity_sold > 0 AND name = ?", (name,)).fetchone() for name in names)
+    conn.close()
+    print(f"  cleared and sold again under reused ids, every item matches: {resold}")
+    return agree and rewritten and cleared[0] == appended and resold
+
+
+# =================== Report Outbox ===================
+# Queues `count` reports for a slow channel, a channel that fails twice
+# before it works, the file drop and an SMTP server that is not there. The
+# till only pays for queueing; every delivery must end sent, except SMTP,
+# which must give up after MAX_ATTEMPTS. Half-way the worker is stopped and
+# started again, as at a restart, and must carry on from the spool.
+def outbox_check(count, workdir, slow_seconds=0.2):
+    conn = build_db(workdir, 10_000)
+    outbox.SPOOL_DIR = os.path.join(workdir, "outbox")
+    outbox.DROP_DIR = os.path.join(workdir, "drop")
+    outbox.SMTP_PORT = 9  # Nothing listens on discard; the connection is refused.
+    outbox.BACKOFF = 0.01
+    failures = {}
+
+    def slow(meta, files):
+        time.sleep(slow_seconds)
+
+    def flaky(meta, files):
+        failures[meta["id"]] = failures.get(meta["id"], 0) + 1
+        if failures[meta["id"]] <= 2:
+            raise ConnectionError("try again")
+
+    outbox.register("slow", slow)
+    outbox.register("flaky", flaky)
+
+    latencies = []
+    outbox.start()
+    for i in range(count):
+        t0 = time.perf_counter()
+        text, page = io.StringIO(), io.StringIO()
+        reports.write_report(conn, [reports.TextSink(text), reports.HtmlSink(page)])
+        outbox.enqueue(f"Report {i}", {"txt": text.getvalue(), "html": page.getvalue()}, ["slow", "flaky", "file", "smtp"])
+        latencies.append(time.perf_counter() - t0)
+        if i == count // 2:
+            outbox.stop()
+            outbox.start()
+    conn.close()
+
+    t0 = time.perf_counter()
+    deadline = t0 + count * slow_seconds + 30
+    while time.perf_counter() < deadline:
+        statuses = [row[4] for row in outbox.status_rows()]
+        if all(status in ("sent", "failed") for status in statuses):
+            break
+        time.sleep(0.05)
+    outbox.stop()
+
+    rows = outbox.status_rows()
+    ended = {}
+    for report_id, created, subject, channel, status, attempts, error in rows:
+        ended.setdefault((channel, status, attempts), 0)
+        ended[(channel, status, attempts)] += 1
+    dropped = len(os.listdir(outbox.DROP_DIR))
+    latencies.sort()
+    print(f"{count} reports over 4 channels: queueing took median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms (rendering included); the slow channel alone takes {slow_seconds * 1000:.0f} ms")
+    for (channel, status, attempts), reports_ended in sorted(ended.items()):
+        print(f"  {channel:<8}{status:<8} after {attempts} attempt(s): {reports_ended}")
+    print(f"  {dropped} files in the drop folder")
+    expected = {("file", "sent", 1): count, ("flaky", "sent", 3): count, ("slow", "sent", 1): count,
+                ("smtp", "failed", outbox.MAX_ATTEMPTS): count}
+    return ended == expected and dropped == 2 * count
+
+
+# =================== Progress Cache ===================
+# The progress report refreshed after each of `runs` sales, over one day of
+# history and over five years of the same daily trade. Once loaded, both
+# should cost the same: only today's block is re-read.
+def progress_check(workdir, per_day=100, runs=200):
+    results = {}
+    for days in (1, 5 * 365):
+        path = os.path.join(workdir, f"progress_{days}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        conn = shop_db.connect(path)
+        synth_data.generate(conn, commodities=50, sales=per_day * days, days=days)
+        conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+        conn.commit()
+        names = [item[1] for item in shop_db.stock_rows(conn)]
+        rng = random.Random(days)
+
+        progress.reset()
+        t0 = time.perf_counter()
+        progress.refresh(conn)
+        load_ms = (time.perf_counter() - t0) * 1000
+        samples = []
+        for _ in range(runs):
+            shop_db.sell_stock(conn, rng.choice(names), 1, 250)
+            t0 = time.perf_counter()
+            progress.refresh(conn)
+            samples.append((time.perf_counter() - t0) * 1000)
+        full = timed(lambda: shop_db.progress_rows(conn), max_runs=20)["median_ms"]
+        correct = sorted(progress.blocks.items(), reverse=True) == shop_db.progress_rows(conn)
+        conn.close()
+        results[days] = statistics.median(samples)
+        print(f"{days:>5} days: first load {load_ms:.1f} ms, refresh after a sale {results[days]:.3f} ms, "
+              f"full recompute {full:.1f} ms, matches: {correct}")
+        if not correct:
+            return False
+    return results[5 * 365] < 2 * results[1] + 0.5
+
+
+# =================== Cost Layers ===================
+# Live FIFO costing must agree with a rebuild from history: a branch
+# journals priced deliveries and `changes` sales, its costs are saved, then
+# rebuilt and compared; again once a day has been cleared, a range purged
+# and more sold. The rebuild is also timed over `rows` legacy sales, with
+# its peak Python memory.
+def cost_check(changes, rows, workdir):
+    path = os.path.join(workdir, "costs.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    rng = random.Random(changes)
+    names = [f"Item {i:03d}" for i in range(50)]
+    for name in names:
+        shop_db.add_stock(conn, name, 50, rng.randint(50, 500))
+    written = 0
+    while written < changes:
+        if rng.random() < 0.05:
+            # Some deliveries come without a price; their units take the last known cost.
+            shop_db.add_stock(conn, rng.choice(names), rng.randint(20, 200), rng.choice((None, rng.randint(50, 500))))
+        lines = [(rng.choice(names), rng.randint(1, 3), 600) for _ in range(rng.randint(1, 10))]
+        total, short = shop_db.sell_basket(conn, lines, f"2026-01-{written // 2000 % 28 + 1:02d}")
+        if short:
+            for name in short:
+                shop_db.add_stock(conn, name, 100, rng.randint(50, 500))
+        else:
+            written += len(lines)
+
+    def rebuild_agrees():
+        costs = "SELECT id, cost_cents FROM sales WHERE quantity_sold > 0 ORDER BY id"
+        layers = "SELECT change_seq, name, qty_received, qty_left, unit_cents FROM cost_layers ORDER BY change_seq"
+        live, live_layers = conn.execute(costs).fetchall(), conn.execute(layers).fetchall()
+        costing.rebuild(conn)
+        return live == conn.execute(costs).fetchall() and live_layers == conn.execute(layers).fetchall(), len(live)
+
+    agree, costed = rebuild_agrees()
+    print(f"{costed} sales costed live; rebuild agrees: {agree}")
+    cleared = shop_db.clear_recent(conn)
+    while shop_db.purge_sales(conn, "2026-01-03", "2026-01-05", limit=500)[0] == 500:
+        pass
+    for _ in range(200):
+        lines = [(rng.choice(names), 1, 600) for _ in range(3)]
+        if shop_db.sell_basket(conn, lines, "2026-01-02")[1]:
+            for name in {line[0] for line in lines}:
+                shop_db.add_stock(conn, name, 100, rng.randint(50, 500))
+    after_clear, costed = rebuild_agrees()
+    stock_layered = conn.execute("""SELECT COUNT(*) FROM commodities c WHERE quantity !=
+                                     (SELECT IFNULL(SUM(qty_left), 0) FROM cost_layers WHERE name = c.name)""").fetchone()[0]
+    print(f"after clearing {cleared}, purging 2026-01-03..05 and selling on: rebuild agrees: {after_clear}, "
+          f"items whose layers differ from their stock: {stock_layered}")
+    conn.close()
+    agree = agree and after_clear and stock_layered == 0
+
+    conn = build_db(workdir, rows)
+    t0 = time.perf_counter()
+    costed, layers = costing.rebuild(conn)
+    seconds = time.perf_counter() - t0
+    # Again under tracemalloc, which slows it down too much to time.
+    tracemalloc.start()
+    costing.rebuild(conn)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    uncosted = conn.execute("SELECT COUNT(*) FROM sales WHERE quantity_sold > 0 AND cost_cents IS NULL").fetchone()[0]
+    t0 = time.perf_counter()
+    by_day = costing.margin_by_day(conn)
+    by_item = costing.margin_by_item(conn)
+    report_ms = (time.perf_counter() - t0) * 1000
+    conn.close()
+    print(f"{rows} legacy sales: rebuilt {costed} costs and {layers} layers in {seconds:.1f}s, "
+          f"peak Python memory {peak / 2 ** 20:.1f} MB, {uncosted} without a cost")
+    print(f"  30-day margin by day ({len(by_day)} rows) and by item ({len(by_item)} rows) in {report_ms:.1f} ms")
+    return agree
+
+
+# =================== Refresh Coalescing ===================
+# Stands in for the Tk root: callbacks queue up and run when the test says
+# the event loop has come round.
+class FakeRoot:
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.pending[self.next_id] = callback
+        return self.next_id
+
+    def after_idle(self, callback):
+        return self.after(0, callback)
+
+    def after_cancel(self, job):
+        self.pending.pop(job, None)
+
+    def run_pending(self):
+        while self.pending:
+            job = min(self.pending)
+            self.pending.pop(job)()
+
+
+# `changes` sales in one burst, each marking the views as the till does,
+# must redraw each view exactly once.
+def refresh_check(changes, workdir):
+    path = os.path.join(workdir, "refresh.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    synth_data.generate(conn, commodities=50, sales=10_000)
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    rng = random.Random(changes)
+
+    root = FakeRoot()
+    draws = {"unsold": 0, "progress": 0}
+
+    def redraw(name, fn):
+        def run():
+            draws[name] += 1
+            fn(conn)
+        return run
+
+    views.attach(root)
+    views.register("unsold", redraw("unsold", shop_db.stock_rows))
+    views.register("progress", redraw("progress", progress.refresh))
+    t0 = time.perf_counter()
+    for _ in range(changes):
+        shop_db.sell_stock(conn, rng.choice(names), 1, 250)
+        views.mark("unsold", "progress")
+    root.run_pending()
+    seconds = time.perf_counter() - t0
+    conn.close()
+    print(f"{changes} sales in {seconds:.2f}s: redraws {draws}, {views.requested} asked, "
+          f"{views.redrawn} done, {views.saved()} saved")
+    return draws == {"unsold": 1, "progress": 1}
+
+
+# =================== Report Writing ===================
+# The full report in all four formats, once as a single pass feeding every
+# sink and once as a separate pass per format. The files must match.
+def report_bench(rows, workdir):
+    conn = build_db(workdir, rows)
+    results = {}
+    for label, groups in (("one pass", [reports.EXTENSIONS]), ("separate passes", [(ext,) for ext in reports.EXTENSIONS])):
+        stem = os.path.join(workdir, label.replace(" ", "_"))
+
+        def run():
+            for formats in groups:
+                count, paths = reports.export(conn, stem, ["Shop Location: Bench"], formats)
+            return count
+
+        t0 = time.perf_counter()
+        count = run()
+        seconds = time.perf_counter() - t0
+        # Again under tracemalloc, which slows it down too much to time.
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[label] = stem
+        print(f"{label}: {count} rows x {len(groups[0]) * len(groups)} formats in {seconds:.2f}s, "
+              f"peak Python memory {peak / 2 ** 20:.2f} MB")
+    conn.close()
+
+    same = True
+    for ext in reports.EXTENSIONS:
+        contents = []
+        for stem in results.values():
+            with open(f"{stem}.{ext}", encoding="utf-8") as f:
+                text = f.read()
+            # The JSON's first line carries the time it was written.
+            contents.append(text.split("\n", 1)[1] if ext == "json" else text)
+        size = os.path.getsize(f"{stem}.{ext}")
+        print(f"  {ext}: {size / 2 ** 20:.1f} MB, identical: {contents[0] == contents[1]}")
+        same = same and contents[0] == contents[1]
+    return same
+
+
+# =================== Stock-take ===================
+# A stock-take over `items` items: some counts off either way, some items not
+# counted, a few never seen before. Counted items must end at their count,
+# the rest untouched, and on a journalled history the live cost layers must
+# match a rebuild.
+def stocktake_check(items, workdir):
+    path = os.path.join(workdir, "stocktake.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    rng = random.Random(items)
+    names = [f"Item {i:03d}" for i in range(50)]
+    for name in names:
+        shop_db.add_stock(conn, name, rng.randint(20, 100), rng.randint(50, 500))
+        shop_db.add_stock(conn, name, rng.randint(20, 100), rng.choice((None, rng.randint(50, 500))))
+    for _ in range(500):
+        shop_db.sell_basket(conn, [(rng.choice(names), rng.randint(1, 3), 600)])
+    counts = [(name, max(0, quantity + rng.randint(-60, 30))) for _, name, quantity in shop_db.stock_rows(conn)]
+    stocktake.apply(conn, counts, "bench")
+    for _ in range(500):
+        shop_db.sell_basket(conn, [(rng.choice(names), rng.randint(1, 3), 600)])
+    live = conn.execute("SELECT id, cost_cents FROM sales WHERE quantity_sold > 0 ORDER BY id").fetchall()
+    live_layers = conn.execute("SELECT change_seq, name, qty_received, qty_left, unit_cents FROM cost_layers ORDER BY change_seq").fetchall()
+    costing.rebuild(conn)
+    costs_agree = (live == conn.execute("SELECT id, cost_cents FROM sales WHERE quantity_sold > 0 ORDER BY id").fetchall()
+                   and live_layers == conn.execute("SELECT change_seq, name, qty_received, qty_left, unit_cents FROM cost_layers ORDER BY change_seq").fetchall())
+    print(f"journalled history: live costs and layers match a rebuild after the stock-take: {costs_agree}")
+    conn.close()
+
+    os.remove(path)
+    conn = shop_db.connect(path)
+    synth_data.generate(conn, commodities=items, sales=100_000)
+    before = dict((name, quantity) for _, name, quantity in shop_db.stock_rows(conn))
+    counts = []
+    for name, quantity in before.items():
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        counts.append((name, max(0, quantity + rng.randint(-5, 5)) if roll < 0.6 else quantity))
+    counts += [(f"New item {i}", rng.randint(1, 20)) for i in range(10)]
+
+    t0 = time.perf_counter()
+    off = stocktake.differences(conn, counts)
+    preview = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    take, adjusted, units = stocktake.apply(conn, counts, "bench")
+    seconds = time.perf_counter() - t0
+
+    after = dict((name, quantity) for _, name, quantity in shop_db.stock_rows(conn))
+    expected = dict(before, **dict(counts))
+    journalled = conn.execute("SELECT COUNT(*) FROM changes WHERE kind = 'adjust'").fetchone()[0]
+    recorded = stocktake.history(conn)[0]
+    conn.close()
+    correct = after == expected and adjusted == len(off) == journalled and recorded[3] == adjusted
+    print(f"{len(counts)} counts over {items} items: {len(off)} off, previewed in {preview * 1000:.0f} ms, "
+          f"applied in {seconds * 1000:.0f} ms (net {units:+d} units)")
+    print(f"  stock matches the counts, uncounted items untouched, one journal entry per difference: {correct}")
+    return costs_agree and correct
+
+
+# =================== Day Close ===================
+def _days_ago(n):
+    return (date.fromisoformat(shop_db.today()) - timedelta(days=n)).isoformat()
+
+
+# A month of deliveries, sales and stock-takes through the journal, with the
+# true stock noted at the end of every day. The first close backfills it; a
+# later close must pick up only the new movements, one after a gap of several
+# unclosed days must cover every one of them, and a backdated sale must be
+# caught and rebuilt. Then a year of `changes` movements over 2000 items is
+# backfilled and the stock on a date is read from the closes and by replay.
+def closing_check(changes, workdir):
+    path = os.path.join(workdir, "closing.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = shop_db.connect(path)
+    rng = random.Random(changes)
+    names = [f"Item {i:02d}" for i in range(40)]
+    truth = {}
+    for ago in range(30, -1, -1):
+        day = _days_ago(ago)
+        for name in rng.sample(names, 8):
+            shop_db.add_stock(conn, name, rng.randint(10, 40), rng.choice((None, 300)), date=day)
+        for _ in range(20):
+            shop_db.sell_basket(conn, [(rng.choice(names), rng.randint(1, 3), 500)], date=day)
+        if ago % 10 == 5:
+            counts = [(name, max(0, quantity + rng.randint(-4, 2))) for _, name, quantity in shop_db.stock_rows(conn)]
+            stocktake.apply(conn, counts, "bench", date=day)
+        truth[day] = dict((name, quantity) for _, name, quantity in shop_db.stock_rows(conn))
+        if ago == 8:
+            seq_day_8 = shop_db.last_change_seq(conn)
+
+    def agrees():
+        return all(dict(closing.stock_on(conn, day)) == dict(dict.fromkeys(names, 0), **truth[day])
+                   for day in truth)
+
+    closing.close_day(conn)
+    backfilled = agrees()
+    shop_db.sell_basket(conn, [(names[0], 1, 500)])
+    closing.close_day(conn)
+    truth[shop_db.today()] = dict((name, quantity) for _, name, quantity in shop_db.stock_rows(conn))
+    again = agrees()
+    # As if the shop had last closed eight days ago.
+    conn.execute("DELETE FROM stock_snapshots WHERE date > ?", (_days_ago(8),))
+    conn.execute("DELETE FROM day_closes WHERE date > ?", (_days_ago(8),))
+    conn.execute("UPDATE day_closes SET last_seq = ? WHERE date = ?", (seq_day_8, _days_ago(8)))
+    conn.commit()
+    closing.close_day(conn)
+    caught_up = agrees()
+    shop_db.sell_basket(conn, [(names[1], 2, 500)], date=_days_ago(12))
+    for day in truth:
+        if day >= _days_ago(12):
+            truth[day][names[1]] -= 2
+    closing.close_day(conn)
+    rebuilt = agrees()
+    # Dated before the first close's baseline, so the history is rebuilt.
+    shop_db.add_stock(conn, names[2], 3, date=_days_ago(40))
+    for day in truth:
+        truth[day][names[2]] = truth[day].get(names[2], 0) + 3
+    closing.close_day(conn)
+    rebuilt = rebuilt and agrees()
+    print(f"month of journalled trade: backfill {backfilled}, same-day close {again}, "
+          f"after 8 unclosed days {caught_up}, after backdated moves {rebuilt}")
+    conn.close()
+
+    os.remove(path)
+    conn = shop_db.connect(path)
+    names = [f"Item {i:05d}" for i in range(2000)]
+    days = [_days_ago(ago) for ago in range(365, 0, -1)]
+    stock = dict.fromkeys(names, 0)
+    moves = []
+    for i in range(changes):
+        day = days[i * len(days) // changes]
+        name = rng.choice(names)
+        if rng.random() < 0.2:
+            kind, qty = "delivery", rng.randint(20, 60)
+            stock[name] += qty
+        else:
+            kind, qty = "sale", rng.randint(1, 3)
+            stock[name] -= qty
+        moves.append((i + 1, "bench", i + 1, kind, name, qty, 500, day, "stamp"))
+    conn.executemany("INSERT INTO changes (seq, origin, origin_seq, kind, name, qty, price_cents, date, stamp) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", moves)
+    conn.executemany("INSERT INTO commodities (name, quantity) VALUES (?, ?)", stock.items())
+    conn.commit()
+    del moves
+
+    t0 = time.perf_counter()
+    written = closing.close_day(conn)
+    backfill_seconds = time.perf_counter() - t0
+    day = days[len(days) // 2]
+    closed_all = timed(lambda: closing.stock_on(conn, day))
+    closed_one = timed(lambda: closing.stock_on(conn, day, names[7]))
+    replay_all = timed(lambda: conn.execute("""
+        SELECT c.name, c.quantity - IFNULL(SUM(CASE m.kind WHEN 'sale' THEN -m.qty ELSE m.qty END), 0)
+        FROM commodities c LEFT JOIN changes m ON m.name = c.name AND m.date > ? AND m.kind IN ('delivery', 'sale', 'adjust')
+        GROUP BY c.name ORDER BY c.name""", (day,)).fetchall())
+    replay_one = timed(lambda: conn.execute("""
+        SELECT (SELECT quantity FROM commodities WHERE name = ?)
+               - IFNULL(SUM(CASE kind WHEN 'sale' THEN -qty ELSE qty END), 0)
+        FROM changes WHERE name = ? AND date > ? AND kind IN ('delivery', 'sale', 'adjust')""",
+        (names[7], names[7], day)).fetchone())
+    def replay(day):
+        return dict(conn.execute("""
+            SELECT c.name, c.quantity - IFNULL(SUM(CASE m.kind WHEN 'sale' THEN -m.qty ELSE m.qty END), 0)
+            FROM commodities c LEFT JOIN changes m ON m.name = c.name AND m.date > ? AND m.kind IN ('delivery', 'sale', 'adjust')
+            GROUP BY c.name""", (day,)).fetchall())
+
+    matches = dict(closing.stock_on(conn, day)) == replay(day)
+    for _ in range(changes // 365):
+        shop_db.sell_basket(conn, [(rng.choice(names), 1, 500)])
+    t0 = time.perf_counter()
+    closing.close_day(conn)
+    close_seconds = time.perf_counter() - t0
+    # A delivery backdated three days closes those days again, not the year.
+    shop_db.add_stock(conn, names[7], 5, date=days[-3])
+    t0 = time.perf_counter()
+    closing.close_day(conn)
+    reclose_seconds = time.perf_counter() - t0
+    matches = matches and all(dict(closing.stock_on(conn, day)) == replay(day) for day in days[-5:])
+    conn.close()
+    print(f"{changes} movements over {len(days)} days: backfilled {written} snapshot rows in {backfill_seconds:.1f} s, "
+          f"a day's close in {close_seconds * 1000:.0f} ms, after a delivery backdated 3 days {reclose_seconds * 1000:.0f} ms")
+    print(f"  stock of every item on {day}: {closed_all['median_ms']:.1f} ms from the closes, "
+          f"{replay_all['median_ms']:.1f} ms by replay; one item {closed_one['median_ms']:.3f} ms vs "
+          f"{replay_one['median_ms']:.1f} ms; closes match the replay: {matches}")
+    return backfilled and again and caught_up and rebuilt and matches
+
+
+# =================== Receipts ===================
+# Times `sales` sales with no printing, then the same with a receipt queued
+# after each while a slow printer has over 1,000 receipts waiting. The till
+# must not slow down and every receipt must print. A full queue must refuse
+# at once, and receipts must reach the spool directory and a device file.
+def receipt_check(sales, workdir, seconds_per_receipt=0.005):
+    conn = build_db(workdir, 100_000)
+    names = [item[1] for item in shop_db.stock_rows(conn)]
+    conn.execute("UPDATE commodities SET quantity = quantity + 1000000")
+    conn.commit()
+    rng = random.Random(sales)
+
+    def basket():
+        return [(rng.choice(names), rng.randint(1, 3), rng.randint(50, 5000)) for _ in range(rng.randint(1, 6))]
+
+    def sell(print_receipts):
+        latencies = []
+        for _ in range(sales):
+            lines = basket()
+            t0 = time.perf_counter()
+            total, short = shop_db.sell_basket(conn, lines)
+            if print_receipts:
+                receipts.submit(lines, total, shop_db.last_change_seq(conn))
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        return latencies
+
+    def describe(latencies):
+        return (f"median {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                f"p99 {latencies[len(latencies) * 99 // 100] * 1000:.2f} ms")
+
+    quiet = sell(False)
+
+    written = []
+    slow = threading.Event()
+    slow.set()
+
+    def printer(data):
+        if slow.is_set():
+            time.sleep(seconds_per_receipt * data.count(receipts.CUT))
+        written.append(data)
+
+    receipts.start(printer)
+    queued = 0
+    while receipts.pending() < 1000:
+        queued += receipts.submit(basket(), 100, 0)
+    backlog = receipts.pending()
+    busy = sell(True)
+    least = receipts.pending()
+    slow.clear()
+    receipts.stop()
+    cuts = sum(data.count(receipts.CUT) for data in written)
+    all_printed = cuts == receipts.printed == queued + sales
+    print(f"{sales} baskets without receipts: {describe(quiet)}")
+    print(f"  with {backlog} receipts waiting on a slow printer: {describe(busy)} ({least} still waiting at the end)")
+    print(f"  every receipt printed, {len(written)} writes: {all_printed}")
+    unchanged = busy[len(busy) // 2] < quiet[len(quiet) // 2] * 1.25 + 0.0002 and least >= 1000
+
+    stuck = threading.Event()
+    receipts.start(lambda data: stuck.wait(), max_pending=100)
+    t0 = time.perf_counter()
+    accepted = sum(receipts.submit(basket(), 100, 0) for _ in range(200))
+    refusing = time.perf_counter() - t0
+    refused = receipts.refused
+    stuck.set()
+    receipts.stop()
+    pushed_back = 100 <= accepted <= 101 and refused == 200 - accepted and refusing < 0.05
+    print(f"  full queue: {accepted} of 200 queued, {refused} refused, in {refusing * 1000:.1f} ms: {pushed_back}")
+
+    receipts.SPOOL_DIR = os.path.join(workdir, "receipts")
+    receipts.start()
+    for number in range(300):
+        receipts.submit(basket(), 100, 700_000 + number, "Main Street")
+    receipts.stop()
+    spooled = b"".join(open(os.path.join(receipts.SPOOL_DIR, name), "rb").read()
+                       for name in os.listdir(receipts.SPOOL_DIR))
+    receipts.DEVICE = os.path.join(workdir, "lp0")
+    receipts.start()
+    for _ in range(20):
+        receipts.submit(basket(), 100, 0)
+    receipts.stop()
+    with open(receipts.DEVICE, "rb") as f:
+        device = f.read()
+    conn.close()
+    numbered = all(f"Receipt {700_000 + number}\n".encode() in spooled for number in range(300))
+    delivered = (spooled.count(receipts.CUT) == 300 and spooled.count(b"Main Street") == 300 and numbered
+                 and device.count(receipts.CUT) == 20 and device.startswith(receipts.INIT))
+    print(f"  300 receipts spooled in {len(os.listdir(receipts.SPOOL_DIR))} files, 20 to a device file: {delivered}")
+    return all_printed and unchanged and pushed_back and delivered
+
+
+# =================== Baseline ===================
+def compare(baseline, current):
+    regressions = []
+    for size, cases in current.items():
+        for name, result in cases.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else 1.0
+            flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+            print(f"{size:>9} {name:<22}{old['median_ms']:>12.3f} -> {result['median_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((size, name))
+    return regressions
+
+
+# =================== Checks ===================
+# One entry per option that runs a single check instead of the benchmark:
+# (option, argparse settings, run(args, value, workdir) -> passed, words
+# printed when it passes and when it fails). Without words the run is only
+# a comparison and always exits 0.
+CHECKS = [
+    ("--money-check", dict(type=int, metavar="ROWS", help="only check exact money totals over ROWS sales"),
+     lambda args, rows, workdir: money_check(rows), "exact", "MISMATCH"),
+    ("--sync-check", dict(type=int, metavar="CHANGES", help="only check branch sync over CHANGES changes"),
+     lambda args, changes, workdir: sync_check(changes, workdir), "merged", "MISMATCH"),
+    ("--group-commit", dict(type=int, metavar="TILLS", help="only compare sales/second with group commit on and off"),
+     lambda args, tills, workdir: group_commit_bench(tills, workdir, args.budget * 3), None, None),
+    ("--pool-check", dict(type=int, metavar="READERS", help="only check pooled readers alongside a writer"),
+     lambda args, readers, workdir: pool_check(readers, workdir, seconds=args.budget * 3), "no locks, faster", "FAILED"),
+    ("--maintenance-check", dict(type=int, metavar="ROWS", help="only check idle-time maintenance over ROWS sales"),
+     lambda args, rows, workdir: maintenance_check(rows, workdir), "bounded", "FAILED"),
+    ("--progress-check", dict(action="store_true", help="only check the progress refresh with 1 day and 5 years"),
+     lambda args, value, workdir: progress_check(workdir), "flat", "FAILED"),
+    ("--cost-check", dict(type=int, nargs=2, metavar=("CHANGES", "ROWS"),
+                          help="only check live FIFO costing against a rebuild, and time a rebuild over ROWS sales"),
+     lambda args, sizes, workdir: cost_check(*sizes, workdir), "consistent", "MISMATCH"),
+    ("--refresh-check", dict(type=int, metavar="CHANGES", help="only check that a burst of CHANGES redraws once"),
+     lambda args, changes, workdir: refresh_check(changes, workdir), "coalesced", "FAILED"),
+    ("--report-bench", dict(type=int, metavar="ROWS",
+                            help="only compare one report pass into every format with a pass per format"),
+     lambda args, rows, workdir: report_bench(rows, workdir), "identical", "MISMATCH"),
+    ("--stocktake-check", dict(type=int, metavar="ITEMS", help="only check a stock-take over ITEMS items"),
+     lambda args, items, workdir: stocktake_check(items, workdir), "reconciled", "FAILED"),
+    ("--purge-check", dict(type=int, metavar="ROWS", help="only check a background purge of half of ROWS sales"),
+     lambda args, rows, workdir: purge_check(rows, workdir), "purged", "FAILED"),
+    ("--snapshot-check", dict(type=int, metavar="ROWS", help="only check a columnar snapshot of ROWS sales"),
+     lambda args, rows, workdir: snapshot_check(rows, workdir), "consistent", "MISMATCH"),
+    ("--outbox-check", dict(type=int, metavar="REPORTS", help="only check background delivery of REPORTS reports"),
+     lambda args, count, workdir: outbox_check(count, workdir), "delivered", "FAILED"),
+    ("--closing-check", dict(type=int, metavar="CHANGES", help="only check day closes over CHANGES movements"),
+     lambda args, changes, workdir: closing_check(changes, workdir), "closes correct", "FAILED"),
+    ("--receipt-check", dict(type=int, metavar="SALES",
+                             help="only check SALES sale latencies with 1,000 receipts waiting to print"),
+     lambda args, sales, workdir: receipt_check(sales, workdir), "printed", "FAILED"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shop tracker hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="sales rows per database")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds to spend per case")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline instead of writing it")
+    parser.add_argument("--workdir", default=None, help="where to build the databases (default: a temp dir)")
+    for option, settings, run, passed, failed in CHECKS:
+        parser.add_argument(option, **settings)
+    args = parser.parse_args()
+
+    for option, settings, run, passed, failed in CHECKS:
+        value = getattr(args, option[2:].replace("-", "_"))
+        if not value:
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            ok = run(args, value, args.workdir or tmp)
+        if passed is None:
+            return
+        print(passed if ok else failed)
+        sys.exit(0 if ok else 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        current = {}
+        for rows in args.sizes:
+            print(f"{rows} rows")
+            current[str(rows)] = bench_size(workdir, rows, args.budget)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        sys.exit(1 if compare(baseline, current) else 0)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": current,
+    }
+    with open(args.baseline, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Baseline written to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
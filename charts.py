@@ -0,0 +1,97 @@
+from datetime import date
+import shop_db
+
+# Sales trends drawn straight onto a Tk Canvas. The database returns one row
+# per day for the visible range only, and LTTB thins that to about one point
+# per pixel, so years of history draw as quickly as a week.
+MARGIN_LEFT = 70
+MARGIN_RIGHT = 20
+MARGIN_TOP = 20
+MARGIN_BOTTOM = 30
+METRICS = {"Revenue": 2, "Units": 1}
+
+
+# =================== Downsampling ===================
+# Largest-Triangle-Three-Buckets: keeps `threshold` of the (x, y) points,
+# first and last included, choosing in each bucket the point that spans the
+# largest triangle with the previous pick and the next bucket's average, so
+# peaks and dips survive.
+def lttb(points, threshold):
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (count - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        following = points[end:next_end] or points[-1:]
+        avg_x = sum(point[0] for point in following) / len(following)
+        avg_y = sum(point[1] for point in following) / len(following)
+
+        ax, ay = points[previous]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            x, y = points[i]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+# =================== Data ===================
+# [(day ordinal, value)] for `metric` ("Revenue" in cents or "Units") from
+# day ordinal `first` to `last`, downsampled to at most `points`.
+# Returns (points, days with sales in the range).
+def series(conn, first, last, metric="Revenue", name=None, points=800):
+    column = METRICS[metric]
+    rows = shop_db.daily_totals(conn, date.fromordinal(first).isoformat(),
+                                date.fromordinal(last).isoformat(), name)
+    values = [(date.fromisoformat(row[0]).toordinal(), row[column]) for row in rows]
+    return lttb(values, points), len(values)
+
+
+# =================== Drawing ===================
+def draw(canvas, points, first, last, metric="Revenue"):
+    canvas.delete("all")
+    width = int(canvas.winfo_width())
+    height = int(canvas.winfo_height())
+    left, right = MARGIN_LEFT, width - MARGIN_RIGHT
+    top, bottom = MARGIN_TOP, height - MARGIN_BOTTOM
+    canvas.create_line(left, top, left, bottom, right, bottom, fill="#888888")
+    canvas.create_text(left, bottom + 5, text=date.fromordinal(first).isoformat(), anchor="nw")
+    canvas.create_text(right, bottom + 5, text=date.fromordinal(last).isoformat(), anchor="ne")
+    if not points:
+        canvas.create_text((left + right) / 2, (top + bottom) / 2, text="No sales in this range.")
+        return
+
+    peak = max(value for day, value in points) or 1
+    label = shop_db.format_cents(peak) if metric == "Revenue" else str(peak)
+    canvas.create_text(left - 5, top, text=label, anchor="ne")
+    canvas.create_text(left - 5, bottom, text="0", anchor="se")
+
+    span = max(last - first, 1)
+    x_scale = (right - left) / span
+    y_scale = (bottom - top) / peak
+    coords = []
+    for day, value in points:
+        coords.append(left + (day - first) * x_scale)
+        coords.append(bottom - value * y_scale)
+    # One line item for the whole series keeps the canvas cheap to redraw.
+    if len(coords) >= 4:
+        canvas.create_line(*coords, fill="#2c7be5", width=2)
+    else:
+        canvas.create_oval(coords[0] - 3, coords[1] - 3, coords[0] + 3, coords[1] + 3, fill="#2c7be5")
+
+
+# Maps a canvas x position back to a day ordinal in the visible range.
+def day_at(canvas, x, first, last):
+    width = int(canvas.winfo_width())
+    fraction = (x - MARGIN_LEFT) / max(width - MARGIN_LEFT - MARGIN_RIGHT, 1)
+    return first + min(max(fraction, 0.0), 1.0) * (last - first)
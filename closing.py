@@ -0,0 +1,170 @@
+from datetime import date, datetime, timedelta
+import shop_db
+
+# End-of-day close. Stock moves only through journalled deliveries, sales and
+# stock-take adjustments, so the stock at the end of any day is today's stock
+# less every movement dated after it. A close writes that down once, in
+# stock_snapshots, for each item that moved, plus the day's totals in
+# day_closes; afterwards past stock is an index lookup instead of a replay.
+FLUSH_ROWS = 10_000
+
+MOVES_SQL = "kind IN ('delivery', 'sale', 'adjust')"
+
+
+# The latest close of a day before `day`, as (date, last_seq), or None.
+def _last_close(c, day):
+    return c.execute("SELECT date, last_seq FROM day_closes WHERE date < ? ORDER BY date DESC LIMIT 1",
+                     (day,)).fetchone()
+
+
+def _day_sales(c, day):
+    row = c.execute("SELECT units, cents FROM daily_sales WHERE date = ?", (day,)).fetchone()
+    return row or (0, 0)
+
+
+# Walks movements dated after `after`, newest day first, taking each
+# day's movements back off `running` (item -> stock, starting at today's).
+# Each day with movements gets a snapshot of the items that moved, at their
+# stock that evening, and its totals. Only the running stock per item is
+# held here. Returns (snapshot rows written, earliest day walked or None).
+def _walk(c, after, running, seq, stamp):
+    total = sum(running.values())
+    moves = c.connection.execute(f"""
+        SELECT date, name, SUM(CASE kind WHEN 'sale' THEN -qty ELSE qty END),
+               SUM(CASE kind WHEN 'delivery' THEN qty ELSE 0 END),
+               SUM(CASE kind WHEN 'adjust' THEN qty ELSE 0 END)
+        FROM changes WHERE {MOVES_SQL} AND date > ? AND seq <= ?
+        GROUP BY date, name ORDER BY date DESC""", (after, seq))
+
+    written = 0
+    snapshots = []
+
+    def close(day, day_moves):
+        nonlocal total, written
+        delivered = sum(move[2] for move in day_moves)
+        adjusted = sum(move[3] for move in day_moves)
+        snapshots.extend((name, day, running.get(name, 0)) for name, delta, _, _ in day_moves)
+        c.execute("""INSERT OR REPLACE INTO day_closes (date, stamp, last_seq, items, stock_units, sold_units,
+                                                        sold_cents, delivered_units, adjusted_units)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                  (day, stamp, seq, len(day_moves), total, *_day_sales(c, day), delivered, adjusted))
+        # Back to the stock the evening before.
+        for name, delta, _, _ in day_moves:
+            running[name] = running.get(name, 0) - delta
+            total -= delta
+        written += len(day_moves)
+        if len(snapshots) >= FLUSH_ROWS:
+            c.executemany("INSERT OR REPLACE INTO stock_snapshots (name, date, quantity) VALUES (?, ?, ?)", snapshots)
+            snapshots.clear()
+
+    day, day_moves = None, []
+    for move_date, name, delta, delivered, adjusted in moves:
+        if move_date != day:
+            if day is not None:
+                close(day, day_moves)
+            day, day_moves = move_date, []
+        day_moves.append((name, delta, delivered, adjusted))
+    if day is not None:
+        close(day, day_moves)
+    c.executemany("INSERT OR REPLACE INTO stock_snapshots (name, date, quantity) VALUES (?, ?, ?)", snapshots)
+    return written, day
+
+
+# =================== Closing ===================
+# Closes the days since the last close, today included, in one transaction:
+# a snapshot of every item that moved on each of them and each day's totals.
+# Closing again later the same day brings the close up to date. When a
+# movement has since been dated into an already closed day (a backdated
+# entry, or one merged from another branch), the days from the earliest such
+# date on are closed again; only a movement dated on or before the first
+# close's baseline, or no close at all, rebuilds the whole history with
+# backfill. Returns the snapshot rows written.
+def close_day(conn):
+    c = conn.cursor()
+    today = shop_db.today()
+    last = _last_close(c, today)
+    if last is None:
+        return backfill(conn)
+    after = last[0]
+    backdated = c.execute(f"SELECT MIN(date) FROM changes WHERE seq > ? AND {MOVES_SQL} AND date <= ?",
+                          (last[1], last[0])).fetchone()[0]
+    if backdated is not None:
+        if backdated <= c.execute("SELECT MIN(date) FROM day_closes").fetchone()[0]:
+            return backfill(conn)
+        after = (date.fromisoformat(backdated) - timedelta(days=1)).isoformat()
+
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("DELETE FROM stock_snapshots WHERE date > ?", (after,))
+        c.execute("DELETE FROM day_closes WHERE date > ?", (after,))
+        seq = shop_db.last_change_seq(conn)
+        stamp = datetime.now().isoformat()
+        running = dict(c.execute("SELECT name, quantity FROM commodities").fetchall())
+        written, _ = _walk(c, after, running, seq, stamp)
+        # A quiet day still gets its close, for its totals.
+        c.execute("""INSERT OR IGNORE INTO day_closes (date, stamp, last_seq, items, stock_units, sold_units,
+                                                       sold_cents, delivered_units, adjusted_units)
+                     SELECT ?, ?, ?, 0, IFNULL(SUM(quantity), 0), ?, ?, 0, 0 FROM commodities""",
+                  (today, stamp, seq, *_day_sales(c, today)))
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return written
+
+
+# Rebuilds every snapshot and day close from the whole journal in one
+# streaming pass. The day before the first journalled movement gets a
+# snapshot of every item, since stock from before the journal cannot be
+# traced any further back. Returns the snapshot rows written.
+def backfill(conn):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("DELETE FROM stock_snapshots")
+        c.execute("DELETE FROM day_closes")
+        seq = shop_db.last_change_seq(conn)
+        stamp = datetime.now().isoformat()
+        running = dict(c.execute("SELECT name, quantity FROM commodities").fetchall())
+        written, first = _walk(c, "", running, seq, stamp)
+        baseline = (date.fromisoformat(first) - timedelta(days=1)).isoformat() if first else shop_db.today()
+        c.executemany("INSERT OR REPLACE INTO stock_snapshots (name, date, quantity) VALUES (?, ?, ?)",
+                      ((name, baseline, quantity) for name, quantity in running.items()))
+        c.execute("""INSERT OR IGNORE INTO day_closes (date, stamp, last_seq, items, stock_units, sold_units,
+                                                       sold_cents, delivered_units, adjusted_units)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0)""",
+                  (baseline, stamp, seq, len(running), sum(running.values()), *_day_sales(c, baseline)))
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return written + len(running)
+
+
+# =================== Queries ===================
+# Stock at the end of `day`: (name, quantity) for every item, or just the
+# quantity of `name`. None where the day is before anything was recorded.
+def stock_on(conn, day, name=None):
+    if name is not None:
+        row = conn.execute("SELECT quantity FROM stock_snapshots WHERE name = ? AND date <= ? "
+                           "ORDER BY date DESC LIMIT 1", (name, day)).fetchone()
+        return row[0] if row else None
+    return conn.execute("""SELECT name, (SELECT quantity FROM stock_snapshots
+                                         WHERE name = commodities.name AND date <= ?
+                                         ORDER BY date DESC LIMIT 1)
+                           FROM commodities ORDER BY name""", (day,)).fetchall()
+
+
+# Units each item lost to stock-take corrections from `since` to `until`,
+# worst first; gains count against losses. Read from idx_changes_adjust.
+def shrinkage(conn, since, until):
+    return conn.execute("""SELECT name, -SUM(qty) FROM changes
+                           WHERE kind = 'adjust' AND date BETWEEN ? AND ?
+                           GROUP BY name HAVING SUM(qty) < 0 ORDER BY 2 DESC""", (since, until)).fetchall()
+
+
+# (date, items moved, stock, units sold, revenue, delivered, adjusted) per
+# closed day from `since` to `until`, newest first.
+def closes(conn, since, until):
+    return conn.execute("""SELECT date, items, stock_units, sold_units, sold_cents, delivered_units, adjusted_units
+                           FROM day_closes WHERE date BETWEEN ? AND ? ORDER BY date DESC""", (since, until)).fetchall()
@@ -0,0 +1,203 @@
+import argparse
+import os
+import sqlite3
+import sys
+from pathlib import Path
+import shop_db
+
+# SQLite's default build attaches at most 10 databases to one connection, so
+# larger groups of shops are aggregated in batches. Each shop's history is
+# still read exactly once, by SQL, and only per-location totals reach Python.
+ATTACH_BATCH = 10
+
+
+# The location and branch id stored in a database, or None where unset.
+def _stored_settings(path):
+    conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        stored = dict(conn.execute("SELECT key, value FROM settings WHERE key IN ('location', 'branch')"))
+    except sqlite3.OperationalError:
+        stored = {}
+    finally:
+        conn.close()
+    return stored.get("location") or None, stored.get("branch")
+
+
+# One label per database: its location, or else its file name. Every branch
+# is grocery_shop.db by default, so a shared file name gets its folder added,
+# and a label still shared after that gets the database's position. Returns
+# (labels, locations set in more than one database): those are not told
+# apart, and their figures are added together under the one label.
+def labels(paths):
+    stored = [_stored_settings(path)[0] for path in paths]
+    names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    result = []
+    for path, location, name in zip(paths, stored, names):
+        if location:
+            result.append(location)
+        elif names.count(name) > 1:
+            result.append(f"{os.path.basename(os.path.dirname(os.path.abspath(path)))}/{name}")
+        else:
+            result.append(name)
+    for i, location in enumerate(stored):
+        if not location and result.count(result[i]) > 1:
+            result[i] = f"{result[i]} #{i + 1}"
+    return result, sorted({location for location in stored if location and stored.count(location) > 1})
+
+
+def _columns(conn, schema, table):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+
+
+# Runs `select(schema, location, branch)` against every shop and collects the
+# rows in a temp table `consolidated`; the branch ids of all the shops are in
+# a temp table `shops`. Returns the locations in the order given.
+def _gather(conn, paths, columns, select):
+    conn.execute(f"CREATE TEMP TABLE consolidated ({columns})")
+    shop_labels = dict(zip(paths, labels(paths)[0]))
+    branches = {path: _stored_settings(path)[1] for path in paths}
+    conn.execute("CREATE TEMP TABLE shops (branch TEXT PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO shops VALUES (?)", [(b,) for b in branches.values() if b])
+    locations = []
+    for start in range(0, len(paths), ATTACH_BATCH):
+        batch = paths[start:start + ATTACH_BATCH]
+        schemas = []
+        for i, path in enumerate(batch):
+            schema = f"shop{i}"
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            schemas.append(schema)
+        try:
+            parts = []
+            for schema, path in zip(schemas, batch):
+                location = shop_labels[path]
+                if location not in locations:
+                    locations.append(location)
+                parts.append(select(schema, location, branches[path]))
+            sql = " UNION ALL ".join(part[0] for part in parts)
+            conn.execute(f"INSERT INTO consolidated {sql}", [value for part in parts for value in part[1]])
+            conn.commit()
+        finally:
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+    return locations
+
+
+def _pivot(conn, locations, value):
+    per_location = ", ".join(f"SUM(CASE WHEN location = ? THEN {value} ELSE 0 END)" for _ in locations)
+    return conn.execute(f"""SELECT name, {per_location}, SUM({value}) FROM consolidated
+                            GROUP BY name ORDER BY name""", locations).fetchall()
+
+
+# =================== Reports ===================
+# Units and revenue per item, one column per location plus a total, over
+# sales dated from `since` to `until` inclusive. Sales recorded before
+# locations existed count towards the location of their database.
+# Synced branches hold copies of each other's sales, so a journalled sale is
+# counted once, by its (origin, origin_seq): from its own branch's file when
+# that is in the group, otherwise from the first copy found. Sales voided in
+# any of the files are left out.
+# Returns (locations, [(name, [cents per location], total_cents, [units per location], total_units)]).
+def consolidated_sales(paths, since="0000-00-00", until="9999-99-99"):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TEMP TABLE voids (origin TEXT, origin_seq INTEGER, PRIMARY KEY (origin, origin_seq))")
+    for path in paths:
+        source = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            conn.executemany("INSERT OR IGNORE INTO voids VALUES (?, ?)",
+                             source.execute("SELECT ref_origin, ref_seq FROM changes WHERE kind = 'void'"))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            source.close()
+
+    def select(schema, location, branch):
+        where = "s.quantity_sold > 0 AND s.date BETWEEN ? AND ?"
+        sales_columns = _columns(conn, schema, "sales")
+        place, group = ("IFNULL(s.location, ?)", "s.location, s.name") if "location" in sales_columns else ("?", "s.name")
+        if "change_seq" not in sales_columns or not branch:
+            return (f"SELECT {place}, s.name, SUM(s.quantity_sold), SUM(s.total_cents), NULL, NULL "
+                    f"FROM {schema}.sales s WHERE {where} GROUP BY {group}"), (location, since, until)
+        kept = "NOT EXISTS (SELECT 1 FROM voids v WHERE v.origin = n.origin AND v.origin_seq = n.origin_seq)"
+        # Sales made here, and those from before the journal.
+        own = (f"SELECT {place}, s.name, SUM(s.quantity_sold), SUM(s.total_cents), NULL, NULL "
+               f"FROM {schema}.sales s LEFT JOIN {schema}.changes n ON n.seq = s.change_seq "
+               f"WHERE {where} AND (n.seq IS NULL OR (n.origin = ? AND {kept})) GROUP BY {group}")
+        # Copies of sales from branches that are not in the group, deduplicated below.
+        foreign = "IFNULL(s.location, 'branch ' || n.origin)" if "location" in sales_columns else "'branch ' || n.origin"
+        relayed = (f"SELECT {foreign}, s.name, s.quantity_sold, s.total_cents, n.origin, n.origin_seq "
+                   f"FROM {schema}.sales s JOIN {schema}.changes n ON n.seq = s.change_seq "
+                   f"WHERE {where} AND n.origin NOT IN (SELECT branch FROM shops) AND {kept}")
+        return f"{own} UNION ALL {relayed}", (location, since, until, branch, since, until)
+
+    locations = _gather(conn, paths, "location, name, sold, cents, origin, origin_seq", select)
+    conn.execute("""DELETE FROM consolidated WHERE origin IS NOT NULL AND rowid NOT IN
+                    (SELECT MIN(rowid) FROM consolidated WHERE origin IS NOT NULL GROUP BY origin, origin_seq)""")
+    # Merged branches can hold sales of locations that have no file of their own.
+    for (location,) in conn.execute("SELECT DISTINCT location FROM consolidated ORDER BY location"):
+        if location not in locations:
+            locations.append(location)
+    cents = _pivot(conn, locations, "cents")
+    units = _pivot(conn, locations, "sold")
+    conn.close()
+    count = len(locations)
+    return locations, [(c_row[0], list(c_row[1:count + 1]), c_row[-1], list(u_row[1:count + 1]), u_row[-1])
+                       for c_row, u_row in zip(cents, units)]
+
+
+# Stock per item, one column per location plus a total. A synced branch's
+# quantities include the deliveries, sales and adjustments it imported from
+# the others, so those are taken back out to leave the stock on its shelves.
+# Returns (locations, [(name, [quantity per location], total)]).
+def consolidated_stock(paths):
+    conn = sqlite3.connect(":memory:")
+
+    def select(schema, location, branch):
+        if not branch or "origin" not in _columns(conn, schema, "changes"):
+            return f"SELECT ?, name, quantity FROM {schema}.commodities", (location,)
+        return (f"""SELECT ?, c.name, c.quantity - IFNULL(f.delta, 0) FROM {schema}.commodities c
+                    LEFT JOIN (SELECT name, SUM(CASE kind WHEN 'sale' THEN -qty ELSE qty END) AS delta
+                               FROM {schema}.changes
+                               WHERE kind IN ('delivery', 'sale', 'adjust') AND origin != ?
+                               GROUP BY name) f ON f.name = c.name"""), (location, branch)
+
+    locations = _gather(conn, paths, "location, name, quantity", select)
+    rows = _pivot(conn, locations, "quantity")
+    conn.close()
+    count = len(locations)
+    return locations, [(row[0], list(row[1:count + 1]), row[-1]) for row in rows]
+
+
+def format_sales(locations, rows):
+    lines = ["Item\t" + "\t".join(locations) + "\tTotal"]
+    for name, cents, total, units, total_units in rows:
+        lines.append(f"{name}\t" + "\t".join(f"{u} / {shop_db.format_cents(c)}" for u, c in zip(units, cents))
+                     + f"\t{total_units} / {shop_db.format_cents(total)}")
+    return "\n".join(lines)
+
+
+def format_stock(locations, rows):
+    lines = ["Item\t" + "\t".join(locations) + "\tTotal"]
+    for name, quantities, total in rows:
+        lines.append(f"{name}\t" + "\t".join(str(q) for q in quantities) + f"\t{total}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidated report across several shop databases.")
+    parser.add_argument("databases", nargs="+")
+    parser.add_argument("--since", default="0000-00-00", help="first sales date (YYYY-MM-DD)")
+    parser.add_argument("--until", default="9999-99-99", help="last sales date (YYYY-MM-DD)")
+    parser.add_argument("--stock", action="store_true", help="report stock instead of sales")
+    args = parser.parse_args()
+
+    for location in labels(args.databases)[1]:
+        print(f"Warning: {location} is the location of more than one database; their figures are added together.",
+              file=sys.stderr)
+    if args.stock:
+        print(format_stock(*consolidated_stock(args.databases)))
+    else:
+        print(format_sales(*consolidated_sales(args.databases, args.since, args.until)))
+
+
+if __name__ == "__main__":
+    main()
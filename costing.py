@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+
+# Cost of goods sold is worked out once, when a sale is made, by drawing
+# down FIFO cost layers (shop_db._consume_layers) and stored on the sales
+# row. Margin reports only add those costs up.
+FLUSH_ROWS = 10_000
+WINDOW_DAYS = 30
+
+
+# =================== Rebuild ===================
+# Recomputes every layer and every sale's cost from history, item by item in
+# the order things happened. SQLite sorts the history (spilling to disk when it must), and
+# only one item's layers and FLUSH_ROWS pending costs are held here, so
+# memory stays flat at any size. Deliveries, sales and stock-take adjustments
+# come from the change journal; price-only rows from before the journal set
+# the cost of later units. A journalled sale since cleared or purged still
+# drew its units from the layers, since clearing never puts stock back, so
+# it is replayed too and only its cost is not written anywhere.
+# Returns (sales costed, layers written).
+def rebuild(conn):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("DELETE FROM cost_layers")
+        # Journalled history replays in journal order; rows from before the
+        # journal come first, by date, a day's price ahead of its sales.
+        history = conn.execute("""
+            SELECT name, 0 AS journalled, date AS day_key, 0 AS phase, id AS order_key,
+                   0 AS kind, date, NULL, 0, price_cents
+            FROM sales WHERE quantity_sold = 0 AND change_seq IS NULL
+            UNION ALL
+            SELECT name, 0, date, 1, id, 1, date, id, quantity_sold, NULL
+            FROM sales WHERE quantity_sold > 0 AND change_seq IS NULL
+            UNION ALL
+            SELECT name, 1, '', 0, seq, 0, date, seq, qty, price_cents FROM changes WHERE kind = 'delivery'
+            UNION ALL
+            SELECT name, 1, '', 0, seq, 0, date, seq, qty, NULL FROM changes WHERE kind = 'adjust' AND qty > 0
+            UNION ALL
+            SELECT name, 1, '', 0, seq, 1, date, NULL, -qty, NULL FROM changes WHERE kind = 'adjust' AND qty < 0
+            UNION ALL
+            SELECT n.name, 1, '', 0, n.seq, 1, n.date, s.id, n.qty, NULL
+            FROM changes n LEFT JOIN sales s ON s.change_seq = n.seq
+            WHERE n.kind = 'sale'
+            ORDER BY 1, 2, 3, 4, 5""")
+
+        costed = layers_written = 0
+        pending = []
+        current = None
+        layers = []
+        first_open = 0
+        last_cost = None
+        for name, journalled, day_key, phase, order_key, kind, day, key, qty, unit_cents in history:
+            if name != current:
+                layers_written += _write_layers(c, current, layers)
+                current, layers, first_open, last_cost = name, [], 0, None
+            if kind == 0:
+                layers.append([day, qty, qty, unit_cents, key])
+                if unit_cents is not None:
+                    last_cost = unit_cents
+                continue
+
+            cost = unpriced = 0
+            remaining = qty
+            while first_open < len(layers) and not layers[first_open][2]:
+                first_open += 1
+            for layer in layers[first_open:]:
+                if not remaining:
+                    break
+                taken = min(layer[2], remaining)
+                layer[2] -= taken
+                remaining -= taken
+                if layer[3] is None:
+                    unpriced += taken
+                else:
+                    cost += taken * layer[3]
+            if key is None:
+                # A stock-take shortfall, or a sale since cleared: its units
+                # are gone, but there is no sales row to cost.
+                continue
+            unpriced += remaining
+            if unpriced:
+                cost = cost + unpriced * last_cost if last_cost is not None else None
+            pending.append((cost, key))
+            costed += 1
+            if len(pending) >= FLUSH_ROWS:
+                c.executemany("UPDATE sales SET cost_cents = ? WHERE id = ?", pending)
+                pending = []
+        layers_written += _write_layers(c, current, layers)
+        c.executemany("UPDATE sales SET cost_cents = ? WHERE id = ?", pending)
+        c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('costs_built', '1')")
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return costed, layers_written
+
+
+def _write_layers(c, name, layers):
+    if name is None:
+        return 0
+    c.executemany("""INSERT INTO cost_layers (name, date, qty_received, qty_left, unit_cents, change_seq)
+                     VALUES (?, ?, ?, ?, ?, ?)""", [(name, *layer) for layer in layers])
+    return len(layers)
+
+
+# Costs history once, for databases from before cost layers were kept.
+def ensure_built(conn):
+    if not conn.execute("SELECT 1 FROM settings WHERE key = 'costs_built'").fetchone():
+        rebuild(conn)
+
+
+# =================== Reports ===================
+def _window(since, until):
+    until = until or date.today().isoformat()
+    since = since or (date.fromisoformat(until) - timedelta(days=WINDOW_DAYS - 1)).isoformat()
+    return since, until
+
+
+# Margin is over costed sales only; units sold with no known cost are
+# counted separately.
+MARGIN_COLUMNS = """SUM(quantity_sold), SUM(total_cents), SUM(cost_cents),
+                    SUM(CASE WHEN cost_cents IS NOT NULL THEN total_cents - cost_cents END),
+                    SUM(CASE WHEN cost_cents IS NULL THEN quantity_sold ELSE 0 END)"""
+
+
+# (date, units, revenue, cost, margin, uncosted units) per day, newest first.
+def margin_by_day(conn, since=None, until=None):
+    return conn.execute(f"""SELECT date, {MARGIN_COLUMNS} FROM sales
+                            WHERE quantity_sold > 0 AND date BETWEEN ? AND ?
+                            GROUP BY date ORDER BY date DESC""", _window(since, until)).fetchall()
+
+
+# (name, units, revenue, cost, margin, uncosted units) per item, best margin first.
+def margin_by_item(conn, since=None, until=None):
+    return conn.execute(f"""SELECT name, {MARGIN_COLUMNS} FROM sales
+                            WHERE quantity_sold > 0 AND date BETWEEN ? AND ?
+                            GROUP BY name ORDER BY 5 DESC""", _window(since, until)).fetchall()
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import pool
+import shop_db
+
+# Group commit: sales from every till thread in this process are queued to
+# one writer thread, which applies whatever has queued up in a single
+# transaction and commits once, so one fsync covers the whole batch instead
+# of one fsync per sale. A sale is confirmed only when its batch has
+# committed, i.e. once it is on disk. The queue lives in one process, so
+# separate till processes each have a queue of their own. Callers that wait
+# on each sale in turn only ever make batches of one; the app instead polls
+# the Future and carries on, and gives a batch a few ms to fill.
+MAX_BATCH = 64
+MAX_DELAY = 0.0
+
+_jobs = queue.Queue()
+_writer = None
+_STOP = object()
+
+
+# =================== Writer ===================
+# Sales are written through the pool's writer, so pool.start() comes first.
+def start(max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+    global _writer
+    if _writer is not None:
+        return
+    _writer = threading.Thread(target=_run, args=(max_batch, max_delay), name="group-commit", daemon=True)
+    _writer.start()
+
+
+# Flushes everything already queued, then stops the writer.
+def stop():
+    global _writer
+    if _writer is None:
+        return
+    _jobs.put(_STOP)
+    _writer.join()
+    _writer = None
+
+
+def running():
+    return _writer is not None
+
+
+def _run(max_batch, max_delay):
+    stopping = False
+    while not stopping:
+        batch = [_jobs.get()]
+        if batch[0] is _STOP:
+            break
+        # Whatever queued up during the last commit goes into this one. A
+        # max_delay above 0 also waits that long for more sales to ride along.
+        deadline = time.monotonic() + max_delay
+        while len(batch) < max_batch:
+            try:
+                job = _jobs.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if job is _STOP:
+                stopping = True
+                break
+            batch.append(job)
+        _flush(batch)
+
+
+def _flush(batch):
+    try:
+        with pool.writer() as conn:
+            seq = shop_db.last_change_seq(conn)
+            results = shop_db.sell_baskets(conn, [lines for lines, future in batch])
+    except Exception as error:
+        for lines, future in batch:
+            future.set_exception(error)
+        return
+    # Each basket sold journals one change per line, in batch order.
+    for (lines, future), (total, short) in zip(batch, results):
+        number = None
+        if not short:
+            seq += len(lines)
+            number = seq
+        future.set_result((total, short, number))
+
+
+# =================== Selling ===================
+# Queues a basket and returns a Future of (total_cents, short, number),
+# resolved once the basket is durable (or refused, when short of stock).
+# `number` is the journal seq of the basket's last line, or None if refused.
+def submit(lines):
+    if _writer is None:
+        raise RuntimeError("group commit is not running")
+    future = Future()
+    _jobs.put((list(lines), future))
+    return future
+
+
+# Same results as shop_db.sell_basket, waiting until the sale is on disk.
+def sell_basket(lines):
+    total, short, number = submit(lines).result()
+    return total, short
+
+
+def sell_stock(name, qty, price_cents):
+    total, short = sell_basket([(name, qty, price_cents)])
+    return total
@@ -0,0 +1,131 @@
+import threading
+import time
+from datetime import datetime
+import pool
+
+# Housekeeping that runs only while nobody is using the till, a small bounded
+# piece at a time, plus PRAGMA optimize when the app closes.
+IDLE_SECONDS = 5
+TICK_MS = 1000
+# Pages returned to the file system per idle tick; under 5 ms at 1M sales.
+STEP_PAGES = 64
+ANALYZE_EVERY = 24 * 3600
+# Rows ANALYZE samples per index, so statistics cost milliseconds at any size.
+ANALYSIS_LIMIT = 400
+
+# (when, action, ms, bytes reclaimed, note), oldest first.
+history = []
+integrity = None
+
+_last_input = time.monotonic()
+
+
+def _record(action, seconds, reclaimed=0, note=""):
+    history.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action, seconds * 1000, reclaimed, note))
+
+
+# (page_size, page_count, freelist_count) of the main database.
+def page_stats(conn):
+    return tuple(conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                 for pragma in ("page_size", "page_count", "freelist_count"))
+
+
+# =================== Steps ===================
+# Hands up to `pages` free pages back to the file system. Only databases in
+# auto_vacuum=INCREMENTAL mode can; new databases are created that way and
+# older ones are converted at shutdown. Returns the bytes reclaimed.
+def vacuum_step(conn, pages=STEP_PAGES):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    page_size, page_count, free = page_stats(conn)
+    if not free:
+        return 0
+    t0 = time.perf_counter()
+    conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+    reclaimed = (free - page_stats(conn)[2]) * page_size
+    _record("incremental vacuum", time.perf_counter() - t0, reclaimed)
+    return reclaimed
+
+
+def analyze_due(conn):
+    row = conn.execute("SELECT value FROM settings WHERE key = 'analyzed'").fetchone()
+    return not row or time.time() - float(row[0]) >= ANALYZE_EVERY
+
+
+def analyze(conn):
+    t0 = time.perf_counter()
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('analyzed', ?)", (str(time.time()),))
+    conn.commit()
+    _record("analyze", time.perf_counter() - t0)
+
+
+# Runs on a pooled reader in its own thread; in WAL mode the till keeps
+# selling meanwhile. The result lands in `integrity`.
+def check_integrity():
+    global integrity
+
+    def run():
+        global integrity
+        t0 = time.perf_counter()
+        with pool.reader() as conn:
+            problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+        integrity = "ok" if problems == ["ok"] else "; ".join(problems[:10])
+        _record("integrity check", time.perf_counter() - t0, note=integrity)
+
+    integrity = "running"
+    threading.Thread(target=run, name="integrity-check", daemon=True).start()
+
+
+# At shutdown: refresh statistics the planner asked for, and convert an older
+# database to incremental auto-vacuum, which needs one full VACUUM.
+def shutdown(conn):
+    t0 = time.perf_counter()
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize")
+    _record("optimize", time.perf_counter() - t0)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        page_size, page_count, free = page_stats(conn)
+        t0 = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        reclaimed = (page_count - page_stats(conn)[1]) * page_size
+        _record("convert to incremental vacuum", time.perf_counter() - t0, reclaimed)
+
+
+# =================== Scheduling ===================
+# Every TICK_MS, once there has been no key press or click for IDLE_SECONDS,
+# does at most one bounded step: the daily ANALYZE, else one vacuum step.
+# The integrity check starts at the first idle moment of each session.
+def schedule(root):
+    def touched(event):
+        global _last_input
+        _last_input = time.monotonic()
+
+    def tick():
+        if time.monotonic() - _last_input >= IDLE_SECONDS:
+            if integrity is None:
+                check_integrity()
+            with pool.writer() as conn:
+                if analyze_due(conn):
+                    analyze(conn)
+                else:
+                    vacuum_step(conn)
+        root.after(TICK_MS, tick)
+
+    root.bind_all("<KeyPress>", touched, add="+")
+    root.bind_all("<ButtonPress>", touched, add="+")
+    root.after(TICK_MS, tick)
+
+
+# Rows of (action, runs, total ms, max ms, bytes reclaimed), in first-run order.
+def summary():
+    totals = {}
+    for when, action, ms, reclaimed, note in history:
+        entry = totals.setdefault(action, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += ms
+        entry[2] = max(entry[2], ms)
+        entry[3] += reclaimed
+    return [(action, *entry) for action, entry in totals.items()]
@@ -0,0 +1,264 @@
+import json
+import os
+import shutil
+import smtplib
+import threading
+import time
+import urllib.parse
+import uuid
+import webbrowser
+from datetime import datetime
+from email.message import EmailMessage
+
+# Reports are rendered once into a spool directory and delivered from there
+# by a background worker, so a slow or missing browser or mail server never
+# holds up the till. Each report goes out over one or more channels; a
+# delivery that fails is retried with a growing delay until MAX_ATTEMPTS.
+# The spool survives a restart: anything not yet delivered is picked up again.
+SPOOL_DIR = "outbox"
+DROP_DIR = "report_drop"
+SMTP_HOST = "localhost"
+SMTP_PORT = 1025
+MAIL_FROM = "shop@localhost"
+MAIL_TO = "owner@localhost"
+MAX_ATTEMPTS = 5
+# Seconds before the first retry; doubles after each failure.
+BACKOFF = 30.0
+# Longest report text put into a WhatsApp link; the rest is left in the spool.
+MAX_LINK_CHARS = 4000
+# Reports delivered everywhere are deleted after this many days.
+KEEP_DAYS = 30
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stopping = threading.Event()
+_worker = None
+
+
+# =================== Channels ===================
+# A channel delivers one report and raises when it could not. It is given the
+# report's meta (subject, created) and the paths of its rendered files.
+def send_whatsapp(meta, files):
+    with open(files["txt"], encoding="utf-8") as f:
+        text = f.read().strip()
+    if len(text) > MAX_LINK_CHARS:
+        text = text[:MAX_LINK_CHARS].rsplit("\n", 1)[0] + "\n…"
+    if not webbrowser.open(f"https://wa.me/?text={urllib.parse.quote(text)}"):
+        raise RuntimeError("no web browser could be opened")
+
+
+def send_file(meta, files):
+    os.makedirs(DROP_DIR, exist_ok=True)
+    for path in files.values():
+        shutil.copy(path, os.path.join(DROP_DIR, os.path.basename(path)))
+
+
+# Mails the text as the body and the other formats as attachments to a local
+# SMTP server (for example `python -m aiosmtpd -n -l localhost:1025`).
+def send_smtp(meta, files):
+    message = EmailMessage()
+    message["Subject"] = meta["subject"]
+    message["From"] = MAIL_FROM
+    message["To"] = MAIL_TO
+    with open(files["txt"], encoding="utf-8") as f:
+        message.set_content(f.read())
+    for ext, path in files.items():
+        if ext != "txt":
+            with open(path, "rb") as f:
+                message.add_attachment(f.read(), maintype="text", subtype="html" if ext == "html" else "plain",
+                                       filename=os.path.basename(path))
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as smtp:
+        smtp.send_message(message)
+
+
+CHANNELS = {"whatsapp": send_whatsapp, "file": send_file, "smtp": send_smtp}
+
+
+def register(name, send):
+    CHANNELS[name] = send
+
+
+# =================== Spool ===================
+def _meta_path(report_id):
+    return os.path.join(SPOOL_DIR, f"{report_id}.json")
+
+
+def _write_meta(meta):
+    path = _meta_path(meta["id"])
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+
+def _read_meta(report_id):
+    with open(_meta_path(report_id), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Spools a rendered report for delivery over `channels`. `rendered` maps a
+# file extension ("txt", "html", ...) to its text; every report has a "txt".
+# Returns the report id.
+def enqueue(subject, rendered, channels):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    report_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    for ext, text in rendered.items():
+        with open(os.path.join(SPOOL_DIR, f"{report_id}.{ext}"), "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+    meta = {"id": report_id, "subject": subject, "created": datetime.now().isoformat(timespec="seconds"),
+            "formats": sorted(rendered),
+            "deliveries": {channel: {"status": "queued", "attempts": 0, "next_try": 0.0, "error": None}
+                           for channel in channels}}
+    with _lock:
+        _write_meta(meta)
+    _wake.set()
+    return report_id
+
+
+def _ids():
+    if not os.path.isdir(SPOOL_DIR):
+        return []
+    return sorted(name[:-5] for name in os.listdir(SPOOL_DIR) if name.endswith(".json"))
+
+
+# Every spooled report's meta, oldest first.
+def spooled():
+    with _lock:
+        return [_read_meta(report_id) for report_id in _ids()]
+
+
+# (report id, created, subject, channel, status, attempts, error) per
+# delivery, newest first, for the status list.
+def status_rows():
+    rows = []
+    for meta in reversed(spooled()):
+        for channel, delivery in meta["deliveries"].items():
+            rows.append((meta["id"], meta["created"], meta["subject"], channel,
+                         delivery["status"], delivery["attempts"], delivery["error"]))
+    return rows
+
+
+# Queues every failed delivery for another round of attempts.
+def retry_failed():
+    with _lock:
+        for report_id in _ids():
+            meta = _read_meta(report_id)
+            failed = [delivery for delivery in meta["deliveries"].values() if delivery["status"] == "failed"]
+            for delivery in failed:
+                delivery.update(status="queued", attempts=0, next_try=0.0)
+            if failed:
+                _write_meta(meta)
+    _wake.set()
+
+
+# Deletes reports delivered everywhere more than `days` days ago.
+def prune(days=KEEP_DAYS):
+    cutoff = datetime.fromtimestamp(time.time() - days * 86400).isoformat(timespec="seconds")
+    with _lock:
+        for report_id in _ids():
+            meta = _read_meta(report_id)
+            if meta["created"] < cutoff and all(d["status"] == "sent" for d in meta["deliveries"].values()):
+                for ext in meta["formats"]:
+                    os.remove(os.path.join(SPOOL_DIR, f"{report_id}.{ext}"))
+                os.remove(_meta_path(report_id))
+
+
+# =================== Scheduling ===================
+# Calls `make_report` once a day at the first check after `at` ("HH:MM", so
+# "9:00" works too); raises ValueError at once if `at` is not a time. The last
+# day it ran is kept in the spool, so a restart does not repeat it. A report
+# that raises is tried again at the next check, and checking carries on.
+def schedule(root, at, make_report, check_ms=60_000):
+    due = datetime.strptime(at, "%H:%M").time()
+    marker = os.path.join(SPOOL_DIR, "last_scheduled")
+
+    def check():
+        try:
+            now = datetime.now()
+            today = now.strftime("%Y-%m-%d")
+            if now.time() >= due:
+                try:
+                    with open(marker) as f:
+                        last = f.read().strip()
+                except FileNotFoundError:
+                    last = None
+                if last != today:
+                    make_report()
+                    os.makedirs(SPOOL_DIR, exist_ok=True)
+                    with open(marker, "w") as f:
+                        f.write(today)
+        finally:
+            root.after(check_ms, check)
+
+    root.after(check_ms, check)
+
+
+# =================== Worker ===================
+def start():
+    global _worker
+    if _worker is not None:
+        return
+    prune()
+    _stopping.clear()
+    _worker = threading.Thread(target=_run, name="outbox", daemon=True)
+    _worker.start()
+
+
+# Stops after the delivery in progress; the rest wait in the spool.
+def stop():
+    global _worker
+    if _worker is None:
+        return
+    _stopping.set()
+    _wake.set()
+    _worker.join()
+    _worker = None
+
+
+def running():
+    return _worker is not None
+
+
+def _run():
+    while not _stopping.is_set():
+        wait = deliver_due()
+        _wake.wait(wait)
+        _wake.clear()
+
+
+# Attempts every delivery that is due. Returns the seconds until the next
+# retry is due, or None when nothing is waiting.
+def deliver_due():
+    now = time.time()
+    next_due = None
+    for meta in spooled():
+        files = {ext: os.path.join(SPOOL_DIR, f"{meta['id']}.{ext}") for ext in meta["formats"]}
+        for channel, delivery in meta["deliveries"].items():
+            if delivery["status"] in ("sent", "failed"):
+                continue
+            if delivery["next_try"] > now:
+                due = delivery["next_try"] - now
+                next_due = due if next_due is None else min(next_due, due)
+                continue
+            if _stopping.is_set():
+                return None
+            try:
+                CHANNELS[channel](meta, files)
+            except Exception as e:
+                delivery["attempts"] += 1
+                delivery["error"] = str(e) or type(e).__name__
+                if delivery["attempts"] >= MAX_ATTEMPTS:
+                    delivery["status"] = "failed"
+                else:
+                    delivery["status"] = "retrying"
+                    delay = BACKOFF * 2 ** (delivery["attempts"] - 1)
+                    delivery["next_try"] = time.time() + delay
+                    next_due = delay if next_due is None else min(next_due, delay)
+            else:
+                delivery["attempts"] += 1
+                delivery.update(status="sent", error=None, sent=datetime.now().isoformat(timespec="seconds"))
+            # Only this delivery is written back; others may have changed meanwhile.
+            with _lock:
+                fresh = _read_meta(meta["id"])
+                fresh["deliveries"][channel] = delivery
+                _write_meta(fresh)
+    return next_due
@@ -0,0 +1,183 @@
+import functools
+import logging
+import logging.handlers
+import re
+import sqlite3
+import threading
+import time
+
+LOG_PATH = 'perf.log'
+STALL_MS = 100
+
+# Instrumentation is opt-in: nothing is timed or logged until enable().
+enabled = False
+stalls = 0
+
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+_log = logging.getLogger("mb.perf")
+_log.propagate = False
+
+
+# =================== Recording ===================
+def enable(log_path=LOG_PATH, max_bytes=1_000_000, backups=3):
+    global enabled
+    if not _log.handlers:
+        handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(asctime)s\t%(message)s"))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    global stalls
+    with _lock:
+        _stats.clear()
+        stalls = 0
+
+
+def record(kind, name, seconds, count=1):
+    key = (kind, name)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = [0, 0.0, 0.0]
+        entry[0] += count
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    if count:
+        _log.info("%s\t%s\t%.3f", kind, name, seconds * 1000)
+
+
+# Counts an event without timing or logging it, e.g. one keystroke.
+def count(kind, name):
+    if not enabled:
+        return
+    with _lock:
+        entry = _stats.get((kind, name))
+        if entry is None:
+            entry = _stats[(kind, name)] = [0, 0.0, 0.0]
+        entry[0] += 1
+
+
+# Rows of (kind, name, calls, total_ms, max_ms), most expensive first.
+def summary(limit=None):
+    with _lock:
+        rows = [(kind, name, calls, total * 1000, worst * 1000)
+                for (kind, name), (calls, total, worst) in _stats.items()]
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+# =================== UI Handlers ===================
+def timed(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        stack = _handler_stack()
+        stack.append(fn.__name__)
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stack.pop()
+            record("ui", fn.__name__, time.perf_counter() - t0)
+    return wrapper
+
+
+def _handler_stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+# Counts main-thread stalls: a heartbeat scheduled every `interval_ms` that
+# fires more than STALL_MS late means the event loop was blocked.
+def watch_stalls(root, interval_ms=50):
+    expected = [time.perf_counter() + interval_ms / 1000]
+
+    def tick():
+        global stalls
+        now = time.perf_counter()
+        late_ms = (now - expected[0]) * 1000
+        if enabled and late_ms > STALL_MS:
+            with _lock:
+                stalls += 1
+            _log.info("stall\tmain thread\t%.3f", late_ms)
+        expected[0] = now + interval_ms / 1000
+        root.after(interval_ms, tick)
+
+    root.after(interval_ms, tick)
+
+
+# Counts keystrokes and mouse clicks, to compare how much input a task takes.
+def watch_input(root):
+    root.bind_all("<KeyPress>", lambda event: count("input", "keystrokes"), add="+")
+    root.bind_all("<ButtonPress>", lambda event: count("input", "clicks"), add="+")
+
+
+# =================== SQLite Statements ===================
+# Statement time covers execute plus every fetch, and is filed under the UI
+# handler that issued it so show_progress's queries are told apart from
+# refresh_unsold's.
+def _statement_key(sql):
+    stack = _handler_stack()
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return f"{stack[-1]}: {sql}" if stack else sql
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def _timed(self, method, key, count, *args):
+        if not enabled:
+            return method(self, *args)
+        t0 = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            record("sql", key, time.perf_counter() - t0, count)
+
+    def execute(self, sql, parameters=()):
+        self._perf_key = _statement_key(sql) if enabled else sql
+        return self._timed(sqlite3.Cursor.execute, self._perf_key, 1, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._perf_key = _statement_key(sql) if enabled else sql
+        return self._timed(sqlite3.Cursor.executemany, self._perf_key, 1, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._timed(sqlite3.Cursor.fetchone, getattr(self, "_perf_key", "?"), 0)
+
+    def fetchmany(self, size=1):
+        return self._timed(sqlite3.Cursor.fetchmany, getattr(self, "_perf_key", "?"), 0, size)
+
+    def fetchall(self):
+        return self._timed(sqlite3.Cursor.fetchall, getattr(self, "_perf_key", "?"), 0)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not enabled:
+            return super().commit()
+        t0 = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record("sql", _statement_key("COMMIT"), time.perf_counter() - t0)
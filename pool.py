@@ -0,0 +1,80 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import shop_db
+
+# One writer connection, shared under a lock, and a few reader connections
+# handed out one thread at a time. In WAL mode readers never wait for the
+# writer and the writer never waits for readers, so a report, export or
+# backup can run in the background while the tills keep selling.
+READERS = 4
+# Room for every distinct statement the app runs, so none is re-prepared.
+CACHED_STATEMENTS = 256
+BUSY_TIMEOUT = 30
+
+path = None
+_writer = None
+_write_lock = threading.RLock()
+# LIFO, so a single busy thread keeps getting the same warm connection back.
+_readers = queue.LifoQueue()
+_connections = []
+
+
+# =================== Pool ===================
+def start(db_path=shop_db.DB_PATH, readers=READERS, factory=sqlite3.Connection,
+          cached_statements=CACHED_STATEMENTS):
+    global path, _writer
+    if _writer is not None:
+        return
+    options = {"factory": factory, "cached_statements": cached_statements,
+               "check_same_thread": False, "timeout": BUSY_TIMEOUT}
+    _writer = shop_db.connect(db_path, **options)
+    _writer.execute("PRAGMA journal_mode = WAL")
+    _connections.append(_writer)
+    for _ in range(readers):
+        conn = sqlite3.connect(db_path, **options)
+        _connections.append(conn)
+        _readers.put(conn)
+    path = db_path
+
+
+def stop():
+    global path, _writer
+    with _write_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        while not _readers.empty():
+            _readers.get_nowait()
+        _writer = None
+        path = None
+
+
+def running():
+    return _writer is not None
+
+
+# =================== Transactions ===================
+# The writer, for as long as the block runs. Data functions commit their own
+# work; anything left open when the block raises is rolled back.
+@contextlib.contextmanager
+def writer():
+    with _write_lock:
+        try:
+            yield _writer
+        except BaseException:
+            _writer.rollback()
+            raise
+
+
+# A reader of its own for as long as the block runs; waits when all are busy.
+@contextlib.contextmanager
+def reader():
+    conn = _readers.get()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        _readers.put(conn)
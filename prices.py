@@ -0,0 +1,20 @@
+import shop_db
+
+# name -> selling price in cents for every priced item. The till fills the
+# price in from here as soon as a name is typed or scanned; the map is loaded
+# once and updated whenever a price is set.
+current = {}
+
+
+def load(conn):
+    current.clear()
+    current.update(shop_db.sell_price_rows(conn))
+
+
+def lookup(name):
+    return current.get(name.strip())
+
+
+def set_price(conn, name, price_cents):
+    shop_db.set_sell_price(conn, name, price_cents)
+    current[name] = price_cents
@@ -0,0 +1,47 @@
+import shop_db
+
+# date -> [(name, sold, total_cents)] for every day with sales rows. Past days
+# only change when a write touches them, so after the first load a refresh
+# re-reads just the dates the change journal names since the last refresh.
+blocks = {}
+
+_seen = None
+_dirty = set()
+
+
+def reset():
+    global _seen
+    blocks.clear()
+    _dirty.clear()
+    _seen = None
+
+
+# For writes the journal cannot point at, e.g. clearing sales recorded before
+# the journal existed.
+def invalidate(sale_date):
+    _dirty.add(sale_date)
+
+
+# Brings `blocks` up to date. Returns the dates whose block changed, appeared
+# or went away; every date on the first call.
+def refresh(conn):
+    global _seen
+    if _seen is None:
+        # Read the journal position first, so a write landing during the load
+        # is picked up again next time rather than missed.
+        _seen = shop_db.last_change_seq(conn)
+        blocks.clear()
+        blocks.update(shop_db.progress_rows(conn))
+        _dirty.clear()
+        return set(blocks)
+
+    dates, _seen = shop_db.progress_dates_since(conn, _seen)
+    dates |= _dirty
+    _dirty.clear()
+    for sale_date in dates:
+        rows = shop_db.progress_block(conn, sale_date)
+        if rows is None:
+            blocks.pop(sale_date, None)
+        else:
+            blocks[sale_date] = rows
+    return dates
@@ -0,0 +1,79 @@
+import threading
+import time
+import pool
+import shop_db
+
+# Deletes sales for a date range, optionally only some items, on a background
+# thread in small chunks found through the sales indexes. Each chunk is its
+# own short transaction on the pooled writer, so the till gets the lock back
+# between chunks and keeps selling through a purge of millions of rows.
+# Journalled rows are voided as they go, so other branches purge them too,
+# and the daily_sales triggers keep the day totals right at every step.
+CHUNK_ROWS = 250
+# About 5 ms a chunk at 1M sales; then a pause to let the till in.
+PAUSE = 0.005
+
+# Rows deleted and to delete by the current or last purge, and its state:
+# None, "running", "cancelled", "done" or the error that stopped it.
+deleted = 0
+total = 0
+status = None
+
+_cancel = threading.Event()
+_lock = threading.Lock()
+_dates = set()
+_thread = None
+
+
+# =================== Background Purge ===================
+def start(since, until, names=None):
+    global deleted, total, status, _thread
+    if running():
+        raise RuntimeError("a purge is already running")
+    names = list(names or ())
+    with pool.reader() as conn:
+        total = shop_db.purge_count(conn, since, until, names)
+    deleted = 0
+    status = "running"
+    _cancel.clear()
+    _thread = threading.Thread(target=_run, args=(since, until, names), name="purge", daemon=True)
+    _thread.start()
+
+
+def _run(since, until, names):
+    global deleted, status
+    try:
+        while not _cancel.is_set():
+            with pool.writer() as conn:
+                done, dates = shop_db.purge_sales(conn, since, until, names, CHUNK_ROWS)
+            with _lock:
+                _dates.update(dates)
+            deleted += done
+            if done < CHUNK_ROWS:
+                break
+            time.sleep(PAUSE)
+        status = "cancelled" if _cancel.is_set() else "done"
+    except Exception as e:
+        status = f"failed: {e}"
+
+
+# Stops after the chunk in progress; everything deleted so far stays deleted.
+def cancel():
+    _cancel.set()
+
+
+def running():
+    return _thread is not None and _thread.is_alive()
+
+
+def wait(timeout=None):
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+# Dates purged from since the last call, for redrawing their reports.
+def take_dates():
+    with _lock:
+        dates = set(_dates)
+        _dates.clear()
+    return dates
@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+from datetime import datetime
+import shop_db
+
+# Receipts are printed by a background thread, so a slow, busy or jammed
+# printer never holds up a sale. The till only queues the lines it has just
+# sold; the thread lays them out and sends everything that has queued up to
+# the printer in one write. The queue is bounded, and when it is full a
+# receipt is refused at once instead of making the till wait for room.
+# Set DEVICE to the printer's device file (for example /dev/usb/lp0);
+# without one each batch is written as a file into SPOOL_DIR instead.
+DEVICE = None
+SPOOL_DIR = "receipts"
+SHOP_NAME = "M & B Shop"
+# Characters per line: 42 suits 80 mm paper in the printer's small font.
+WIDTH = 42
+MAX_PENDING = 5000
+MAX_BATCH = 50
+# Seconds between attempts while the printer is failing.
+RETRY_DELAY = 2.0
+
+# ESC/POS commands understood by most thermal receipt printers.
+INIT = b"\x1b@"
+BOLD_ON, BOLD_OFF = b"\x1bE\x01", b"\x1bE\x00"
+CENTER, LEFT = b"\x1ba\x01", b"\x1ba\x00"
+# Feed past the tear bar, then a partial cut.
+CUT = b"\n\n\n\x1dV\x01"
+ENCODING = "cp437"
+
+# Receipts printed and refused so far, and the printer's last error or None.
+printed = 0
+refused = 0
+error = None
+
+_jobs = None
+_write = None
+_worker = None
+_stopping = threading.Event()
+_STOP = object()
+
+
+# =================== Layout ===================
+def _columns(left, right):
+    room = WIDTH - len(right) - 1
+    return f"{left[:room]:<{room}} {right}"
+
+
+# One receipt as printer bytes. `lines` are (name, qty, price_cents).
+def render(lines, total_cents, stamp, number, location=None):
+    head = [SHOP_NAME] + ([location] if location else [])
+    body = [f"{stamp:%Y-%m-%d %H:%M}", f"Receipt {number}", "-" * WIDTH]
+    for name, qty, price in lines:
+        amount = shop_db.format_cents(qty * price)
+        if qty == 1:
+            body.append(_columns(name, amount))
+        else:
+            body.append(name[:WIDTH])
+            body.append(_columns(f"  {qty} x {shop_db.format_cents(price)}", amount))
+    body.append("-" * WIDTH)
+    units = sum(qty for _, qty, _ in lines)
+    return b"".join((
+        INIT, CENTER, BOLD_ON, "\n".join(head).encode(ENCODING, "replace"), b"\n", BOLD_OFF,
+        LEFT, "\n".join(body).encode(ENCODING, "replace"), b"\n",
+        BOLD_ON, _columns(f"TOTAL ({units} items)", shop_db.format_cents(total_cents)).encode(ENCODING), b"\n",
+        BOLD_OFF, CENTER, b"Thank you!\n", CUT,
+    ))
+
+
+# =================== Output ===================
+def write_device(data):
+    with open(DEVICE, "ab") as f:
+        f.write(data)
+
+
+# One file per batch, renamed into place so nothing reads it half written.
+def write_spool(data):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}.prn")
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+# Keeps trying while the printer fails. Once stopping, whatever cannot be
+# printed is left in the spool directory instead.
+def _output(data):
+    global error
+    while True:
+        try:
+            _write(data)
+            error = None
+            return
+        except OSError as e:
+            error = str(e) or type(e).__name__
+            if _stopping.is_set():
+                write_spool(data)
+                return
+            _stopping.wait(RETRY_DELAY)
+
+
+# =================== Printer Thread ===================
+# `write` takes the bytes of a batch; by default the device, or the spool.
+def start(write=None, max_pending=MAX_PENDING):
+    global _jobs, _write, _worker
+    if _worker is not None:
+        return
+    _jobs = queue.Queue(max_pending)
+    _write = write or (write_device if DEVICE else write_spool)
+    _stopping.clear()
+    _worker = threading.Thread(target=_run, name="receipts", daemon=True)
+    _worker.start()
+
+
+# Prints everything already queued, then stops the thread.
+def stop():
+    global _worker
+    if _worker is None:
+        return
+    _stopping.set()
+    _jobs.put(_STOP)
+    _worker.join()
+    _worker = None
+
+
+def running():
+    return _worker is not None
+
+
+def pending():
+    return _jobs.qsize() if _jobs is not None else 0
+
+
+def _run():
+    global printed
+    stopping = False
+    while not stopping:
+        batch = [_jobs.get()]
+        if batch[0] is _STOP:
+            break
+        # Whatever queued up while the last batch printed goes in this one.
+        while len(batch) < MAX_BATCH:
+            try:
+                job = _jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                stopping = True
+                break
+            batch.append(job)
+        _output(b"".join(render(*job) for job in batch))
+        printed += len(batch)
+
+
+# =================== Printing ===================
+# Queues a receipt for a sale that has committed, without waiting for the
+# printer. `number` identifies the sale, e.g. its journal seq. Returns False
+# when the queue is full and the receipt was refused.
+def submit(lines, total_cents, number, location=None):
+    global refused
+    if _worker is None:
+        raise RuntimeError("receipt printing is not running")
+    try:
+        _jobs.put_nowait((list(lines), total_cents, datetime.now(), number, location))
+    except queue.Full:
+        refused += 1
+        return False
+    return True
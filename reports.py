@@ -0,0 +1,212 @@
+import csv
+import html
+import json
+from datetime import datetime
+import shop_db
+
+# One report, several formats. write_report walks each section's rows once,
+# straight off the cursor, and hands every row to all the sinks, which write
+# it out at once. Nothing holds more than the row in hand, so a report over
+# years of sales costs the same memory as one over a day.
+TITLE = "M & B Shop Report"
+EXTENSIONS = ("txt", "csv", "json", "html")
+
+# (key, title, [(column, kind)], group heading, query). Kinds are "text",
+# "int" and "cents". A section with a group heading starts a new group, under
+# that heading, whenever its first column changes; the column itself is then
+# shown only in the heading.
+SECTIONS = [
+    ("stock", "Unsold Commodities", [("Name", "text"), ("Quantity", "int")], None,
+     "SELECT name, quantity FROM commodities ORDER BY name"),
+    ("progress", "Daily Sales Progress", [("Date", "text"), ("Item", "text"), ("Sold", "int"), ("Total", "cents")],
+     "Progress for {}",
+     """SELECT date, name, SUM(quantity_sold), SUM(total_cents) FROM sales
+        WHERE quantity_sold > 0 GROUP BY date, name ORDER BY date DESC, name"""),
+]
+
+
+def _cell(value, kind):
+    if value is None:
+        return ""
+    return shop_db.format_cents(value) if kind == "cents" else str(value)
+
+
+# =================== Sinks ===================
+# Every sink takes begin(title, notes), then per section begin_section,
+# row for each row and end_section, then close. A row comes both as raw
+# values and as display cells, formatted once for all the sinks. Sinks write
+# to a file object they are given and leave closing it to the caller.
+class TextSink:
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title, notes):
+        self.f.write(f"📋 {title}\n\n")
+        for note in notes:
+            self.f.write(f"{note}\n")
+        if notes:
+            self.f.write("\n")
+
+    def begin_section(self, key, title, columns, group):
+        self.columns, self.group, self.current = columns, group, None
+        self.f.write(f"{title}:\n")
+        if not group:
+            self.f.write("\t".join(name for name, kind in columns) + "\n")
+
+    def row(self, values, cells):
+        if self.group:
+            if values[0] != self.current:
+                self.current = values[0]
+                self.f.write(f"\n{self.group.format(values[0])}\n")
+                self.f.write("\t".join(name for name, kind in self.columns[1:]) + "\n")
+            cells = cells[1:]
+        self.f.write("\t".join(cells) + "\n")
+
+    def end_section(self, count):
+        if not count:
+            self.f.write("No rows.\n")
+        self.f.write("\n")
+
+    def close(self):
+        pass
+
+
+# One file, sections one after another: a title row, a header row, the rows
+# and a blank row. Money is written as plain decimals.
+class CsvSink:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+
+    def begin(self, title, notes):
+        self.writer.writerow([title])
+        for note in notes:
+            self.writer.writerow([note])
+        self.writer.writerow([])
+
+    def begin_section(self, key, title, columns, group):
+        self.writer.writerow([title])
+        self.writer.writerow([name for name, kind in columns])
+
+    def row(self, values, cells):
+        self.writer.writerow(cells)
+
+    def end_section(self, count):
+        self.writer.writerow([])
+
+    def close(self):
+        pass
+
+
+# Written a row at a time, never built up as one object. Money stays in
+# integer cents, in columns named "<column>_cents".
+class JsonSink:
+    def __init__(self, f):
+        self.f = f
+        self.sections = 0
+
+    def begin(self, title, notes):
+        self.f.write(f'{{"title": {json.dumps(title)}, "generated": {json.dumps(datetime.now().isoformat(timespec="seconds"))}, '
+                     f'"notes": {json.dumps(notes)}, "sections": {{')
+
+    def begin_section(self, key, title, columns, group):
+        names = [f"{name.lower()}_cents" if kind == "cents" else name.lower() for name, kind in columns]
+        self.f.write(f'{", " if self.sections else ""}{json.dumps(key)}: {{"title": {json.dumps(title)}, '
+                     f'"columns": {json.dumps(names)}, "rows": [')
+        self.sections += 1
+        self.first = True
+
+    def row(self, values, cells):
+        self.f.write(("\n" if self.first else ",\n") + json.dumps(list(values)))
+        self.first = False
+
+    def end_section(self, count):
+        self.f.write("]}")
+
+    def close(self):
+        self.f.write("}}\n")
+
+
+# A standalone page with its own print styles, ready for the browser's Print.
+class HtmlSink:
+    STYLE = """body { font-family: Helvetica, Arial, sans-serif; margin: 2em; }
+table { border-collapse: collapse; margin-bottom: 2em; }
+th, td { border: 1px solid #999; padding: 2px 8px; text-align: left; }
+td.num { text-align: right; }
+tr.group th { background: #eee; }
+@media print { body { margin: 0; } h2 { break-after: avoid; } tr { break-inside: avoid; } }"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title, notes):
+        title = html.escape(title)
+        self.f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{title}</title>\n"
+                     f"<style>\n{self.STYLE}\n</style></head><body>\n<h1>{title}</h1>\n")
+        for note in notes:
+            self.f.write(f"<p>{html.escape(note)}</p>\n")
+
+    def begin_section(self, key, title, columns, group):
+        self.group, self.current = group, None
+        shown = columns[1:] if group else columns
+        self.numeric = [kind != "text" for name, kind in shown]
+        self.f.write(f"<h2>{html.escape(title)}</h2>\n<table>\n<tr>"
+                     + "".join(f"<th>{html.escape(name)}</th>" for name, kind in shown) + "</tr>\n")
+
+    def row(self, values, cells):
+        if self.group:
+            if values[0] != self.current:
+                self.current = values[0]
+                self.f.write(f"<tr class=\"group\"><th colspan=\"{len(self.numeric)}\">"
+                             f"{html.escape(self.group.format(values[0]))}</th></tr>\n")
+            cells = cells[1:]
+        self.f.write("<tr>" + "".join(
+            f"<td class=\"num\">{cell}</td>" if numeric else f"<td>{html.escape(cell)}</td>"
+            for cell, numeric in zip(cells, self.numeric)) + "</tr>\n")
+
+    def end_section(self, count):
+        self.f.write("</table>\n")
+
+    def close(self):
+        self.f.write("</body></html>\n")
+
+
+SINKS = {"txt": TextSink, "csv": CsvSink, "json": JsonSink, "html": HtmlSink}
+
+
+# =================== Writing ===================
+# Feeds every sink from a single pass over each section's rows.
+# Returns the number of rows written (per sink).
+def write_report(conn, sinks, title=TITLE, notes=(), sections=SECTIONS):
+    notes = list(notes)
+    for sink in sinks:
+        sink.begin(title, notes)
+    total = 0
+    for key, section_title, columns, group, query in sections:
+        for sink in sinks:
+            sink.begin_section(key, section_title, columns, group)
+        kinds = [kind for name, kind in columns]
+        count = 0
+        for values in conn.execute(query):
+            cells = [_cell(value, kind) for value, kind in zip(values, kinds)]
+            for sink in sinks:
+                sink.row(values, cells)
+            count += 1
+        for sink in sinks:
+            sink.end_section(count)
+        total += count
+    for sink in sinks:
+        sink.close()
+    return total
+
+
+# Writes `stem`.txt, .csv, .json and .html (or just `formats`) in one pass.
+# Returns (rows written, paths).
+def export(conn, stem, notes=(), formats=EXTENSIONS):
+    paths = [f"{stem}.{ext}" for ext in formats]
+    files = [open(path, "w", encoding="utf-8", newline="") for path in paths]
+    try:
+        count = write_report(conn, [SINKS[ext](f) for ext, f in zip(formats, files)], notes=notes)
+    finally:
+        for f in files:
+            f.close()
+    return count, paths
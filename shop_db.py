@@ -0,0 +1,634 @@
+import sqlite3
+import uuid
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+DB_PATH = 'grocery_shop.db'
+
+SALES_SQL = '''CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    quantity_sold INTEGER,
+    price_cents INTEGER,
+    total_cents INTEGER,
+    date TEXT,
+    change_seq INTEGER,
+    location TEXT
+)'''
+
+# Append-only journal of every stock and sales mutation. A change is known
+# everywhere by (origin, origin_seq): the branch that made it and its number
+# there. seq is only the local arrival order, used to export segments.
+CHANGES_SQL = '''CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY,
+    origin TEXT NOT NULL,
+    origin_seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    qty INTEGER,
+    price_cents INTEGER,
+    date TEXT,
+    ref_origin TEXT,
+    ref_seq INTEGER,
+    note TEXT,
+    stamp TEXT,
+    location TEXT
+)'''
+
+# Local changes take the next seq as their origin_seq, tagged with this
+# database's branch id and the shop location at the time.
+JOURNAL_SQL = """INSERT INTO changes (seq, origin, origin_seq, kind, name, qty, price_cents, date, note, stamp, location)
+    SELECT top, (SELECT value FROM settings WHERE key = 'branch'), top, ?, ?, ?, ?, ?, ?, ?,
+           (SELECT value FROM settings WHERE key = 'location')
+    FROM (SELECT IFNULL(MAX(seq), 0) + 1 AS top FROM changes)"""
+
+
+# =================== Database Setup ===================
+def connect(path=DB_PATH, factory=sqlite3.Connection, **options):
+    conn = sqlite3.connect(path, factory=factory, **options)
+    init_db(conn)
+    return conn
+
+
+def init_db(conn):
+    c = conn.cursor()
+    # Only takes effect on a new, empty database; see maintenance.py.
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    c.execute('''CREATE TABLE IF NOT EXISTS commodities (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE,
+        quantity INTEGER,
+        reorder_level INTEGER NOT NULL DEFAULT 0,
+        sku TEXT
+    )''')
+    c.execute(SALES_SQL)
+    c.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+    c.execute(CHANGES_SQL)
+    migrate(conn)
+    conn.commit()
+
+
+# =================== Migrations ===================
+# Tables are created in their current shape, so steps that add columns must
+# skip databases that already have them.
+def _add_column(c, table, column, declaration):
+    columns = [row[1] for row in c.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+# Money used to be stored as REAL units; it is now integer cents so SUMs are
+# exact and small amounts pack into 1-4 bytes instead of 8. The old table is
+# copied across in a single INSERT ... SELECT, which SQLite streams row by row.
+def _migrate_money_to_cents(c):
+    columns = [row[1] for row in c.execute("PRAGMA table_info(sales)")]
+    if "price_per_unit" not in columns:
+        return
+    c.execute("ALTER TABLE sales RENAME TO sales_real")
+    c.execute(SALES_SQL)
+    c.execute("""INSERT INTO sales (id, name, quantity_sold, price_cents, total_cents, date)
+                 SELECT id, name, quantity_sold,
+                        CAST(ROUND(price_per_unit * 100) AS INTEGER),
+                        CAST(ROUND(total_price * 100) AS INTEGER),
+                        date
+                 FROM sales_real""")
+    c.execute("DROP TABLE sales_real")
+
+
+# Covers the per-day reports: show_progress, clear_recent and analytics read
+# only this index and never touch the table rows.
+def _index_sales_by_day(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_day_item ON sales(date, name, quantity_sold, total_cents)")
+
+
+# Items at or below their reorder level, found through an index on the
+# shortfall instead of a scan of every commodity. Items without a level
+# (reorder_level = 0) are left out of the index altogether.
+def _add_reorder_levels(c):
+    _add_column(c, "commodities", "reorder_level", "INTEGER NOT NULL DEFAULT 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_commodities_shortfall "
+              "ON commodities(quantity - reorder_level) WHERE reorder_level > 0")
+
+
+# Barcode or SKU per item. NULLs are allowed, so items without a code
+# do not collide.
+def _add_skus(c):
+    _add_column(c, "commodities", "sku", "TEXT")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_commodities_sku ON commodities(sku)")
+
+
+# Every mutation from here on is journalled, and each sales row points at the
+# change that produced it so a clear can be replayed on other branches.
+def _add_change_journal(c):
+    _add_column(c, "sales", "change_seq", "INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_change ON sales(change_seq) WHERE change_seq IS NOT NULL")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_origin ON changes(origin, origin_seq)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_changes_void ON changes(ref_origin, ref_seq) WHERE kind = 'void'")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_changes_reorder ON changes(name, stamp) WHERE kind = 'reorder'")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_changes_sku ON changes(name, stamp) WHERE kind = 'sku'")
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('branch', ?)", (uuid.uuid4().hex[:12],))
+
+
+# Which shop a sale or delivery happened in. Rows from before this are NULL
+# and are reported under the location of the database they live in.
+def _add_locations(c):
+    _add_column(c, "sales", "location", "TEXT")
+    _add_column(c, "changes", "location", "TEXT")
+
+
+# Units and revenue per day, kept current by triggers on every sales insert
+# and delete, so trend charts read one row per day whatever the history.
+# Per-item trends read idx_sales_item_day, which also serves search_totals.
+def _add_daily_totals(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS daily_sales (
+        date TEXT PRIMARY KEY,
+        units INTEGER NOT NULL,
+        cents INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+    c.execute("""INSERT OR REPLACE INTO daily_sales (date, units, cents)
+                 SELECT date, SUM(quantity_sold), SUM(total_cents) FROM sales
+                 WHERE quantity_sold > 0 GROUP BY date""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_daily_insert AFTER INSERT ON sales
+                 WHEN NEW.quantity_sold > 0
+                 BEGIN
+                     INSERT INTO daily_sales (date, units, cents) VALUES (NEW.date, NEW.quantity_sold, NEW.total_cents)
+                     ON CONFLICT(date) DO UPDATE SET units = units + excluded.units, cents = cents + excluded.cents;
+                 END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_sales_daily_delete AFTER DELETE ON sales
+                 WHEN OLD.quantity_sold > 0
+                 BEGIN
+                     UPDATE daily_sales SET units = units - OLD.quantity_sold, cents = cents - OLD.total_cents
+                     WHERE date = OLD.date;
+                 END""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_item_day ON sales(name, date, quantity_sold, total_cents)")
+
+
+# FIFO cost layers: one per delivery, drawn down oldest first as the item
+# sells, and the cost of goods sold stored on each sales row. Older history
+# is costed by costing.rebuild.
+def _add_cost_layers(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS cost_layers (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        date TEXT,
+        qty_received INTEGER NOT NULL,
+        qty_left INTEGER NOT NULL,
+        unit_cents INTEGER,
+        change_seq INTEGER
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cost_layers_item ON cost_layers(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cost_layers_open ON cost_layers(name) WHERE qty_left > 0")
+    _add_column(c, "sales", "cost_cents", "INTEGER")
+
+
+# The price an item sells at, and every price it has had, one row per item
+# and day it took effect, so the price on any date is one index lookup.
+# Existing items start at the price of their latest sale.
+def _add_selling_prices(c):
+    _add_column(c, "commodities", "sell_price_cents", "INTEGER")
+    c.execute("""CREATE TABLE IF NOT EXISTS price_history (
+        name TEXT NOT NULL,
+        effective TEXT NOT NULL,
+        price_cents INTEGER NOT NULL,
+        PRIMARY KEY (name, effective)
+    ) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_changes_price ON changes(name, date, stamp) WHERE kind = 'price'")
+    c.execute("""INSERT OR IGNORE INTO price_history (name, effective, price_cents)
+                 SELECT name, date, price_cents FROM (
+                     SELECT name, date, price_cents,
+                            ROW_NUMBER() OVER (PARTITION BY name ORDER BY date DESC, id DESC) AS latest
+                     FROM sales WHERE quantity_sold > 0)
+                 WHERE latest = 1""")
+    c.execute("""UPDATE commodities SET sell_price_cents = (
+                     SELECT price_cents FROM price_history WHERE name = commodities.name
+                     ORDER BY effective DESC LIMIT 1)""")
+
+
+# One row per applied stock-take. Its per-item corrections are journalled as
+# 'adjust' changes (qty is the signed difference) from first_seq to last_seq.
+def _add_stock_takes(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS stock_takes (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        stamp TEXT NOT NULL,
+        counted INTEGER NOT NULL,
+        adjusted INTEGER NOT NULL,
+        units INTEGER NOT NULL,
+        first_seq INTEGER,
+        last_seq INTEGER,
+        note TEXT
+    )""")
+
+
+# Stock at the end of each closed day, one row per item whose stock moved that
+# day, so the stock on any date is one index seek per item. Each close also
+# keeps the day's totals. See closing.py.
+def _add_day_closes(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS stock_snapshots (
+        name TEXT NOT NULL,
+        date TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (name, date)
+    ) WITHOUT ROWID""")
+    c.execute("""CREATE TABLE IF NOT EXISTS day_closes (
+        date TEXT PRIMARY KEY,
+        stamp TEXT NOT NULL,
+        last_seq INTEGER NOT NULL,
+        items INTEGER NOT NULL,
+        stock_units INTEGER NOT NULL,
+        sold_units INTEGER NOT NULL,
+        sold_cents INTEGER NOT NULL,
+        delivered_units INTEGER NOT NULL,
+        adjusted_units INTEGER NOT NULL
+    ) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_stock_snapshots_date ON stock_snapshots(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_changes_adjust ON changes(date, name, qty) WHERE kind = 'adjust'")
+    # Covers the close's walk over stock movements, in day and item order.
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_changes_moves ON changes(date, name, kind, qty, seq)
+                 WHERE kind IN ('delivery', 'sale', 'adjust')""")
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1.
+MIGRATIONS = [
+    _migrate_money_to_cents,
+    _index_sales_by_day,
+    _add_reorder_levels,
+    _add_skus,
+    _add_change_journal,
+    _add_locations,
+    _add_daily_totals,
+    _add_cost_layers,
+    _add_selling_prices,
+    _add_stock_takes,
+    _add_day_closes,
+]
+
+
+def migrate(conn):
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    # One transaction, so a failed upgrade leaves the old schema untouched.
+    c.execute("BEGIN")
+    for step in MIGRATIONS[version:]:
+        step(c)
+    c.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+
+# =================== Money ===================
+# "12.5" -> 1250. Rounds half up, like the till does.
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+# 1250 -> "12.50"
+def format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def branch_id(conn):
+    return conn.execute("SELECT value FROM settings WHERE key = 'branch'").fetchone()[0]
+
+
+def shop_location(conn):
+    row = conn.execute("SELECT value FROM settings WHERE key = 'location'").fetchone()
+    return row[0] if row else None
+
+
+def set_shop_location(conn, location):
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('location', ?)", (location,))
+    conn.commit()
+
+
+# =================== Change Journal ===================
+def _journal(c, kind, name=None, qty=None, price_cents=None, date=None, note=None):
+    c.execute(JOURNAL_SQL, (kind, name, qty, price_cents, date, note, datetime.now().isoformat()))
+    return c.lastrowid
+
+
+def _last_change(c):
+    return c.execute("SELECT IFNULL(MAX(seq), 0) FROM changes").fetchone()[0]
+
+
+# Journals a void for every journalled sales row matching `where`, so other
+# branches drop the same rows when they merge. Call before deleting them.
+def _void_sales(c, where, params=()):
+    c.execute(f"""INSERT INTO changes (seq, origin, origin_seq, kind, ref_origin, ref_seq, stamp)
+                  SELECT top + ROW_NUMBER() OVER (ORDER BY s.id), b.value, top + ROW_NUMBER() OVER (ORDER BY s.id),
+                         'void', ch.origin, ch.origin_seq, ?
+                  FROM sales s
+                  JOIN changes ch ON ch.seq = s.change_seq
+                  JOIN settings b ON b.key = 'branch'
+                  JOIN (SELECT IFNULL(MAX(seq), 0) AS top FROM changes)
+                  WHERE {where}""", (datetime.now().isoformat(),) + tuple(params))
+
+
+# =================== Stock and Sales ===================
+def add_stock(conn, name, qty, price_cents=None, date=None):
+    c = conn.cursor()
+    date = date or today()
+    change = _journal(c, "delivery", name, qty, price_cents, date)
+    if price_cents is not None:
+        c.execute("""INSERT INTO sales (name, quantity_sold, price_cents, total_cents, date, change_seq, location)
+                     SELECT ?, ?, ?, ?, ?, ?, location FROM changes WHERE seq = ?""",
+                  (name, 0, price_cents, 0, date, change, change))
+    c.execute("""INSERT INTO cost_layers (name, date, qty_received, qty_left, unit_cents, change_seq)
+                 VALUES (?, ?, ?, ?, ?, ?)""", (name, date, qty, qty, price_cents, change))
+
+    c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
+    row = c.fetchone()
+    if row:
+        c.execute("UPDATE commodities SET quantity = quantity + ? WHERE name=?", (qty, name))
+    else:
+        c.execute("INSERT INTO commodities (name, quantity) VALUES (?, ?)", (name, qty))
+    conn.commit()
+
+
+# Returns the sale total in cents, or None when the item is missing or short of stock.
+def sell_stock(conn, name, qty, price_cents, date=None):
+    total, short = sell_basket(conn, [(name, qty, price_cents)], date)
+    return total
+
+
+# Sells every (name, qty, price_cents) line in one transaction and one commit.
+# Returns (total_cents, []) on success. If any item is missing or short of
+# stock nothing is written and (None, [names that failed]) is returned.
+def sell_basket(conn, lines, date=None):
+    c = conn.cursor()
+    # IMMEDIATE takes the write lock first, so stock cannot change between
+    # the checks and the updates.
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        total, short = _sell_lines(c, lines, date)
+    except Exception:
+        conn.rollback()
+        raise
+    if short:
+        conn.rollback()
+    else:
+        conn.commit()
+    return total, short
+
+
+# Sells each basket of lines on its own merits, all in one transaction and one
+# commit; a short basket writes nothing but does not stop the others.
+# Returns one (total_cents, short) per basket, as sell_basket would.
+def sell_baskets(conn, baskets, date=None):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        results = [_sell_lines(c, lines, date) for lines in baskets]
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return results
+
+
+# The body of a sale, inside the caller's write transaction.
+def _sell_lines(c, lines, date=None):
+    needed = {}
+    for name, qty, price_cents in lines:
+        needed[name] = needed.get(name, 0) + qty
+
+    short = []
+    for name, qty in needed.items():
+        c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
+        row = c.fetchone()
+        if not row or row[0] < qty:
+            short.append(name)
+    if short:
+        return None, short
+
+    sale_date = date or today()
+    stamp = datetime.now().isoformat()
+    first = _last_change(c)
+    costs = [_consume_layers(c, name, qty) for name, qty, price_cents in lines]
+    c.executemany("UPDATE commodities SET quantity = quantity - ? WHERE name=?",
+                  [(qty, name) for name, qty in needed.items()])
+    c.executemany(JOURNAL_SQL, [("sale", name, qty, price_cents, sale_date, None, stamp)
+                                for name, qty, price_cents in lines])
+    # Journalled changes take consecutive seqs, one per line in order.
+    c.executemany("""INSERT INTO sales (name, quantity_sold, price_cents, total_cents, date, change_seq, location, cost_cents)
+                     SELECT name, qty, price_cents, qty * price_cents, date, seq, location, ? FROM changes WHERE seq = ?""",
+                  [(cost, first + i + 1) for i, cost in enumerate(costs)])
+    return sum(qty * price_cents for name, qty, price_cents in lines), []
+
+
+# Draws `qty` units from the item's oldest open cost layers and returns their
+# cost in cents. Units with no layer (stock from before layers were kept) or
+# delivered without a price are costed at the item's latest known unit cost.
+# Returns None when the item has never had a cost.
+def _consume_layers(c, name, qty):
+    cost = 0
+    unpriced = 0
+    remaining = qty
+    c.execute("SELECT id, qty_left, unit_cents FROM cost_layers WHERE name=? AND qty_left > 0 ORDER BY id", (name,))
+    for layer_id, left, unit_cents in c.fetchall():
+        taken = min(left, remaining)
+        c.execute("UPDATE cost_layers SET qty_left = qty_left - ? WHERE id=?", (taken, layer_id))
+        if unit_cents is None:
+            unpriced += taken
+        else:
+            cost += taken * unit_cents
+        remaining -= taken
+        if not remaining:
+            break
+    unpriced += remaining
+    if unpriced:
+        row = c.execute("SELECT unit_cents FROM cost_layers WHERE name=? AND unit_cents IS NOT NULL "
+                        "ORDER BY id DESC LIMIT 1", (name,)).fetchone()
+        if not row:
+            return None
+        cost += unpriced * row[0]
+    return cost
+
+
+def set_reorder_level(conn, name, level):
+    c = conn.cursor()
+    c.execute("UPDATE commodities SET reorder_level = ? WHERE name=?", (level, name))
+    _journal(c, "reorder", name, level)
+    conn.commit()
+
+
+# Returns False when the code already belongs to another item.
+def set_sku(conn, name, sku):
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE commodities SET sku = ? WHERE name=?", (sku, name))
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return False
+    _journal(c, "sku", name, note=sku)
+    conn.commit()
+    return True
+
+
+def sku_rows(conn):
+    return conn.execute("SELECT sku, name FROM commodities WHERE sku IS NOT NULL").fetchall()
+
+
+# The item sells at `price_cents` from `date` (today) on.
+def set_sell_price(conn, name, price_cents, date=None):
+    c = conn.cursor()
+    date = date or today()
+    c.execute("UPDATE commodities SET sell_price_cents = ? WHERE name=?", (price_cents, name))
+    c.execute("INSERT OR REPLACE INTO price_history (name, effective, price_cents) VALUES (?, ?, ?)",
+              (name, date, price_cents))
+    _journal(c, "price", name, price_cents=price_cents, date=date)
+    conn.commit()
+
+
+def sell_price_rows(conn):
+    return conn.execute("SELECT name, sell_price_cents FROM commodities WHERE sell_price_cents IS NOT NULL").fetchall()
+
+
+# The selling price in force on `date`, or None when the item had none yet.
+def price_on(conn, name, date):
+    row = conn.execute("SELECT price_cents FROM price_history WHERE name = ? AND effective <= ? "
+                       "ORDER BY effective DESC LIMIT 1", (name, date)).fetchone()
+    return row[0] if row else None
+
+
+# =================== Reports ===================
+def stock_rows(conn):
+    return conn.execute("SELECT id, name, quantity FROM commodities").fetchall()
+
+
+# Returns (quantity, reorder_level) for one item, or None when it is unknown.
+def stock_level(conn, name):
+    return conn.execute("SELECT quantity, reorder_level FROM commodities WHERE name=?", (name,)).fetchone()
+
+
+# (name, quantity, reorder_level) for every item at or below its reorder level,
+# shortest first. Served by idx_commodities_shortfall.
+def reorder_rows(conn):
+    return conn.execute("SELECT name, quantity, reorder_level FROM commodities "
+                        "WHERE reorder_level > 0 AND quantity - reorder_level <= 0 "
+                        "ORDER BY quantity - reorder_level").fetchall()
+
+
+# One (date, [(name, sold, total_cents), ...]) block per sales date, newest first.
+def progress_rows(conn):
+    c = conn.cursor()
+    c.execute("SELECT date FROM sales GROUP BY date ORDER BY date DESC")
+    blocks = []
+    for (sale_date,) in c.fetchall():
+        c.execute(
+            "SELECT name, SUM(quantity_sold), SUM(total_cents) FROM sales WHERE date=? AND quantity_sold > 0 GROUP BY name",
+            (sale_date,))
+        blocks.append((sale_date, c.fetchall()))
+    return blocks
+
+
+# One day's (name, sold, total_cents) rows, or None when the day has no sales
+# rows at all any more.
+def progress_block(conn, sale_date):
+    c = conn.cursor()
+    rows = c.execute("SELECT name, SUM(quantity_sold), SUM(total_cents) FROM sales "
+                     "WHERE date=? AND quantity_sold > 0 GROUP BY name", (sale_date,)).fetchall()
+    if rows or c.execute("SELECT 1 FROM sales WHERE date=? LIMIT 1", (sale_date,)).fetchone():
+        return rows
+    return None
+
+
+# (date, units, cents) per day from `since` to `until` inclusive, oldest first,
+# for all items or just `name`. Days without sales are left out.
+def daily_totals(conn, since, until, name=None):
+    if name is None:
+        return conn.execute("SELECT date, units, cents FROM daily_sales "
+                            "WHERE date BETWEEN ? AND ? AND units > 0 ORDER BY date", (since, until)).fetchall()
+    return conn.execute("SELECT date, SUM(quantity_sold), SUM(total_cents) FROM sales "
+                        "WHERE name = ? AND date BETWEEN ? AND ? AND quantity_sold > 0 GROUP BY date ORDER BY date",
+                        (name, since, until)).fetchall()
+
+
+# (first, last) sales date, or (None, None) before the first sale.
+def sales_date_range(conn):
+    return conn.execute("SELECT MIN(date), MAX(date) FROM daily_sales WHERE units > 0").fetchone()
+
+
+def last_change_seq(conn):
+    return _last_change(conn.cursor())
+
+
+# Dates whose sales rows were written or voided by changes after journal seq
+# `since`. Returns (dates, last seq) for the next call.
+def progress_dates_since(conn, since):
+    c = conn.cursor()
+    last = _last_change(c)
+    if last == since:
+        return set(), last
+    c.execute("""SELECT date FROM changes WHERE seq > ? AND kind IN ('sale', 'delivery')
+                 UNION
+                 SELECT target.date FROM changes v
+                 JOIN changes target ON target.origin = v.ref_origin AND target.origin_seq = v.ref_seq
+                 WHERE v.seq > ? AND v.kind = 'void'""", (since, since))
+    return {row[0] for row in c.fetchall()}, last
+
+
+# Returns (stock_qty, sold_qty), or None when the item is not in inventory.
+def search_totals(conn, name):
+    c = conn.cursor()
+    c.execute("SELECT quantity FROM commodities WHERE name=?", (name,))
+    stock_result = c.fetchone()
+
+    c.execute("SELECT SUM(quantity_sold) FROM sales WHERE name=? AND quantity_sold > 0", (name,))
+    sold_result = c.fetchone()
+
+    if not stock_result:
+        return None
+    return stock_result[0], sold_result[0] if sold_result[0] else 0
+
+
+def _purge_where(names):
+    if not names:
+        return "date BETWEEN ? AND ?"
+    return f"name IN ({', '.join('?' * len(names))}) AND date BETWEEN ? AND ?"
+
+
+# Sales rows from `since` to `until`, for all items or just `names`, price
+# rows included.
+def purge_count(conn, since, until, names=None):
+    names = list(names or ())
+    return conn.execute(f"SELECT COUNT(*) FROM sales WHERE {_purge_where(names)}", (*names, since, until)).fetchone()[0]
+
+
+# Deletes up to `limit` of those rows, found through idx_sales_day_item or
+# idx_sales_item_day, in one short transaction. Journalled rows are voided
+# first. Returns (rows deleted, dates they were on).
+def purge_sales(conn, since, until, names=None, limit=1000):
+    names = list(names or ())
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        rows = c.execute(f"SELECT id, date FROM sales WHERE {_purge_where(names)} LIMIT ?",
+                         (*names, since, until, limit)).fetchall()
+        if rows:
+            ids = [row[0] for row in rows]
+            marks = ", ".join("?" * len(ids))
+            _void_sales(c, f"s.id IN ({marks})", ids)
+            c.execute(f"DELETE FROM sales WHERE id IN ({marks})", ids)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return len(rows), {row[1] for row in rows}
+
+
+# Deletes the most recent sales date and returns it, or None when empty.
+def clear_recent(conn):
+    c = conn.cursor()
+    c.execute("SELECT MAX(date) FROM sales")
+    recent_date = c.fetchone()[0]
+    if recent_date:
+        _void_sales(c, "s.date = ?", (recent_date,))
+        c.execute("DELETE FROM sales WHERE date=?", (recent_date,))
+        conn.commit()
+    return recent_date
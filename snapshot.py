@@ -0,0 +1,209 @@
+import argparse
+import json
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from itertools import compress
+import shop_db
+
+# A columnar copy of the sales history for analysis away from the till's
+# database. A snapshot is a directory of fixed-width column files, one entry
+# per sale and all in day order, plus a dictionary of item names:
+#   day.i32    day ordinal          item.i32   index into names.txt
+#   qty.i32    units sold           cents.i64  sale total in cents
+# Opened with mmap the columns are memoryviews over the OS page cache, so
+# nothing is copied into Python objects. Day order makes any date range a
+# pair of binary searches and a C-speed sum over a slice.
+VERSION = 2
+COLUMNS = (("day", "i"), ("item", "i"), ("qty", "i"), ("cents", "q"))
+BATCH_ROWS = 65536
+
+
+def _path(directory, column, code):
+    return os.path.join(directory, f"{column}.{'i64' if code == 'q' else 'i32'}")
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    return meta if meta.get("version") == VERSION else None
+
+
+# =================== Writing ===================
+# Appends `rows` of (change_seq, date, name, qty, cents), in day order, to the
+# column files. The meta file is written last, so a snapshot whose append
+# was interrupted still opens as it was before.
+def _append(directory, meta, rows):
+    names_path = os.path.join(directory, "names.txt")
+    item_ids = {}
+    if os.path.exists(names_path):
+        with open(names_path, encoding="utf-8") as f:
+            item_ids = {line.rstrip("\n"): i for i, line in enumerate(f)}
+    files = {column: open(_path(directory, column, code), "r+b" if meta["rows"] else "wb")
+             for column, code in COLUMNS}
+    new_names = []
+    try:
+        # Drop whatever an interrupted append left past the recorded rows.
+        for column, code in COLUMNS:
+            files[column].truncate(meta["rows"] * array(code).itemsize)
+            files[column].seek(0, os.SEEK_END)
+        days = {}
+        batch = {column: array(code) for column, code in COLUMNS}
+        for change_seq, sale_date, name, qty, cents in rows:
+            day = days.get(sale_date)
+            if day is None:
+                day = days[sale_date] = date.fromisoformat(sale_date).toordinal()
+            item = item_ids.get(name)
+            if item is None:
+                item = item_ids[name] = len(item_ids)
+                new_names.append(name)
+            batch["day"].append(day)
+            batch["item"].append(item)
+            batch["qty"].append(qty)
+            batch["cents"].append(cents)
+            meta["rows"] += 1
+            meta["units"] += qty
+            meta["total_cents"] += cents
+            meta["last_seq"] = max(meta["last_seq"], change_seq or 0)
+            meta["last_day"] = day
+            if len(batch["day"]) >= BATCH_ROWS:
+                for column, values in batch.items():
+                    values.tofile(files[column])
+                    del values[:]
+        for column, values in batch.items():
+            values.tofile(files[column])
+    finally:
+        for f in files.values():
+            f.close()
+    with open(names_path, "a", encoding="utf-8") as f:
+        f.writelines(f"{name}\n" for name in new_names)
+    with open(os.path.join(directory, "meta.json.tmp"), "w") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(directory, "meta.json.tmp"), os.path.join(directory, "meta.json"))
+
+
+# Writes a fresh snapshot of every sale. Streams the rows in day order off
+# idx_sales_day_item, so memory stays flat. Returns the rows written.
+def export(conn, directory):
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, "names.txt")):
+        os.remove(os.path.join(directory, "names.txt"))
+    meta = {"version": VERSION, "rows": 0, "units": 0, "total_cents": 0, "last_seq": 0, "last_day": 0}
+    _append(directory, meta, conn.execute(
+        "SELECT change_seq, date, name, quantity_sold, total_cents FROM sales WHERE quantity_sold > 0 ORDER BY date"))
+    return meta["rows"]
+
+
+# Brings a snapshot up to date by appending only the sales added since it
+# was written, found by their journal seq: sales ids are reused once the
+# newest rows are cleared, but the journal only grows. Sales from before the
+# journal have no seq and are never new. It is rewritten from scratch
+# instead when it is missing, when sales it holds were since deleted (its
+# totals plus the new rows' no longer match daily_sales) or when a new sale
+# is dated before its last day.
+# Returns (rows appended or written, whether it was rewritten).
+def refresh(conn, directory):
+    meta = _read_meta(directory)
+    if meta is None:
+        return export(conn, directory), True
+    # The unary + keeps the planner on the idx_sales_change range rather than
+    # walking idx_sales_day_item for the sort.
+    rows = conn.execute("""SELECT change_seq, date, name, quantity_sold, total_cents FROM sales
+                           WHERE change_seq > ? AND quantity_sold > 0 ORDER BY +date, change_seq""",
+                        (meta["last_seq"],)).fetchall()
+    units, cents = conn.execute("SELECT IFNULL(SUM(units), 0), IFNULL(SUM(cents), 0) FROM daily_sales").fetchone()
+    if (units != meta["units"] + sum(row[3] for row in rows)
+            or cents != meta["total_cents"] + sum(row[4] for row in rows)
+            or (rows and date.fromisoformat(rows[0][1]).toordinal() < meta["last_day"])):
+        return export(conn, directory), True
+    _append(directory, meta, rows)
+    return len(rows), False
+
+
+# =================== Reading ===================
+# An open snapshot: `day`, `item`, `qty` and `cents` are memoryviews straight
+# over the mapped files and `names` the item names, indexed by `item`.
+class Snapshot:
+    def __init__(self, directory):
+        meta = _read_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"no snapshot in {directory}")
+        self.rows = meta["rows"]
+        with open(os.path.join(directory, "names.txt"), encoding="utf-8") as f:
+            self.names = [line.rstrip("\n") for line in f]
+        self.item_ids = {name: i for i, name in enumerate(self.names)}
+        self._maps = []
+        for column, code in COLUMNS:
+            view = memoryview(b"").cast(code)
+            if self.rows:
+                with open(_path(directory, column, code), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(mapped)
+                view = memoryview(mapped).cast(code)[:self.rows]
+            setattr(self, column, view)
+
+    def close(self):
+        for column, code in COLUMNS:
+            getattr(self, column).release()
+        for mapped in self._maps:
+            mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # (first row, end row) of the sales from `since` to `until`, as dates.
+    def span(self, since=None, until=None):
+        first = bisect_left(self.day, date.fromisoformat(since).toordinal()) if since else 0
+        end = bisect_right(self.day, date.fromisoformat(until).toordinal()) if until else self.rows
+        return first, end
+
+    # (sales, units, cents) from `since` to `until`, for every item or one.
+    # A date range alone is two binary searches and two slice sums; picking
+    # out one item scans the range.
+    def totals(self, since=None, until=None, name=None):
+        first, end = self.span(since, until)
+        qty, cents = self.qty[first:end], self.cents[first:end]
+        if name is None:
+            return end - first, sum(qty), sum(cents)
+        item = self.item_ids.get(name)
+        if item is None:
+            return 0, 0, 0
+        # One byte per sale in the range marks the item's rows.
+        picked = bytes(map(item.__eq__, self.item[first:end]))
+        return picked.count(1), sum(compress(qty, picked)), sum(compress(cents, picked))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar snapshots of the sales history.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update = commands.add_parser("refresh", help="write or bring a snapshot up to date")
+    update.add_argument("db")
+    update.add_argument("snapshot")
+    query = commands.add_parser("totals", help="sales, units and revenue from a snapshot")
+    query.add_argument("snapshot")
+    query.add_argument("--since", help="first day, YYYY-MM-DD")
+    query.add_argument("--until", help="last day, YYYY-MM-DD")
+    query.add_argument("--item", help="only this item")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        conn = shop_db.connect(args.db)
+        rows, rewritten = refresh(conn, args.snapshot)
+        conn.close()
+        print(f"{'Wrote' if rewritten else 'Appended'} {rows} sales")
+    else:
+        with Snapshot(args.snapshot) as snap:
+            sales, units, cents = snap.totals(args.since, args.until, args.item)
+        print(f"{sales} sales, {units} units, {shop_db.format_cents(cents)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import csv
+from datetime import datetime
+import shop_db
+
+# Month-end stock-takes. Counted quantities go into a temporary table and the
+# differences against commodities come out of one join, so reconciling tens
+# of thousands of items is a handful of statements, not one per item. Items
+# that were not counted are left as they are.
+COUNT_SQL = """CREATE TEMP TABLE IF NOT EXISTS stock_count (
+    name TEXT PRIMARY KEY,
+    counted INTEGER NOT NULL,
+    on_record INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID"""
+
+
+# =================== Counts ===================
+# (name, counted) pairs from a CSV file of item and count, with or without a
+# header row. Blank lines are skipped; a bad or negative count raises
+# ValueError naming the line.
+def read_counts(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            if not row or not row[0].strip():
+                continue
+            name, count = row[0].strip(), row[1].strip() if len(row) > 1 else ""
+            try:
+                counted = int(count)
+            except ValueError:
+                if number == 1:
+                    continue
+                raise ValueError(f"line {number}: {count!r} is not a whole number") from None
+            if counted < 0:
+                raise ValueError(f"line {number}: a count cannot be negative")
+            yield name, counted
+
+
+# Fills the temporary table with `counts`. An item counted in several places
+# (shelf and store room) has its counts added up.
+def _load(c, counts):
+    c.execute(COUNT_SQL)
+    c.execute("DELETE FROM temp.stock_count")
+    c.executemany("""INSERT INTO temp.stock_count (name, counted) VALUES (?, ?)
+                     ON CONFLICT(name) DO UPDATE SET counted = counted + excluded.counted""", counts)
+    c.execute("""UPDATE temp.stock_count SET on_record = commodities.quantity
+                 FROM commodities WHERE commodities.name = stock_count.name""")
+
+
+DIFFERENCES_SQL = """SELECT name, on_record, counted, counted - on_record FROM temp.stock_count
+                     WHERE counted != on_record ORDER BY name"""
+
+
+# (name, on record, counted, difference) for every counted item that is off,
+# without changing anything. Only the temporary table is written, so any
+# pooled reader will do.
+def differences(conn, counts):
+    c = conn.cursor()
+    _load(c, counts)
+    rows = c.execute(DIFFERENCES_SQL).fetchall()
+    c.execute("DELETE FROM temp.stock_count")
+    conn.commit()
+    return rows
+
+
+# =================== Applying ===================
+# Sets every counted item to its count in one transaction: journals an
+# 'adjust' change per difference, records the stock-take, and keeps cost
+# layers in step (shortfalls draw down the oldest layers, surpluses become an
+# unpriced layer). Returns (stock-take id, items adjusted, net units).
+def apply(conn, counts, note=None, date=None):
+    c = conn.cursor()
+    date = date or shop_db.today()
+    stamp = datetime.now().isoformat()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        _load(c, counts)
+        counted, adjusted, units = c.execute(
+            """SELECT COUNT(*), IFNULL(SUM(counted != on_record), 0), IFNULL(SUM(counted - on_record), 0)
+               FROM temp.stock_count""").fetchone()
+        c.execute("INSERT INTO stock_takes (date, stamp, counted, adjusted, units, note) VALUES (?, ?, ?, ?, ?, ?)",
+                  (date, stamp, counted, adjusted, units, note))
+        take = c.lastrowid
+        first = shop_db.last_change_seq(conn)
+
+        c.execute("""INSERT INTO changes (seq, origin, origin_seq, kind, name, qty, date, note, stamp, location)
+                     SELECT top + ROW_NUMBER() OVER (ORDER BY s.name), b.value, top + ROW_NUMBER() OVER (ORDER BY s.name),
+                            'adjust', s.name, s.counted - s.on_record, ?, ?, ?, l.value
+                     FROM temp.stock_count s
+                     JOIN settings b ON b.key = 'branch'
+                     LEFT JOIN settings l ON l.key = 'location'
+                     JOIN (SELECT IFNULL(MAX(seq), 0) AS top FROM changes)
+                     WHERE s.counted != s.on_record""", (date, f"stock take {take}", stamp))
+
+        # Shortfalls come out of the oldest open layers first, as sales do.
+        c.execute("""UPDATE cost_layers SET qty_left = qty_left - d.taken
+                     FROM (SELECT l.id, MIN(l.qty_left, MAX(0, s.on_record - s.counted
+                                  - (SUM(l.qty_left) OVER (PARTITION BY l.name ORDER BY l.id) - l.qty_left))) AS taken
+                           FROM temp.stock_count s JOIN cost_layers l ON l.name = s.name AND l.qty_left > 0
+                           WHERE s.counted < s.on_record) AS d
+                     WHERE cost_layers.id = d.id AND d.taken > 0""")
+        c.execute("""INSERT INTO cost_layers (name, date, qty_received, qty_left, unit_cents, change_seq)
+                     SELECT name, date, qty, qty, NULL, seq FROM changes
+                     WHERE seq > ? AND kind = 'adjust' AND qty > 0""", (first,))
+
+        c.execute("INSERT OR IGNORE INTO commodities (name, quantity) SELECT name, 0 FROM temp.stock_count")
+        c.execute("""UPDATE commodities SET quantity = s.counted
+                     FROM temp.stock_count s
+                     WHERE commodities.name = s.name AND s.counted != s.on_record""")
+        c.execute("UPDATE stock_takes SET first_seq = ?, last_seq = ? WHERE id = ?",
+                  (first + 1 if adjusted else None, first + adjusted if adjusted else None, take))
+        c.execute("DELETE FROM temp.stock_count")
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return take, adjusted, units
+
+
+# (id, date, items counted, items adjusted, net units, note), newest first.
+def history(conn):
+    return conn.execute("SELECT id, date, counted, adjusted, units, note FROM stock_takes ORDER BY id DESC").fetchall()
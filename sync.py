@@ -0,0 +1,153 @@
+import argparse
+import os
+import costing
+import shop_db
+
+# A segment is a small SQLite file holding a slice of the change journal, so
+# it can travel on a USB stick or a shared folder and be exported and merged
+# with ATTACH and INSERT ... SELECT, without Python touching each change.
+COLUMNS = ["origin", "origin_seq", "kind", "name", "qty", "price_cents", "date",
+           "ref_origin", "ref_seq", "note", "stamp", "location"]
+MAX_SEQ = 2 ** 63 - 1
+
+
+# =================== Export ===================
+# Writes every change that arrived after local seq `since` (up to `until`),
+# our own and those merged from other branches, so segments can be relayed
+# onwards. Returns (changes written, last seq written) for the next `since`.
+def export_segment(conn, path, since=0, until=None):
+    if os.path.exists(path):
+        os.remove(path)
+    conn.execute("ATTACH DATABASE ? AS segment", (path,))
+    try:
+        c = conn.cursor()
+        c.execute(f"CREATE TABLE segment.changes AS SELECT {', '.join(COLUMNS)} FROM changes WHERE 0")
+        c.execute(f"""INSERT INTO segment.changes SELECT {', '.join(COLUMNS)} FROM changes
+                      WHERE seq > ? AND seq <= ? ORDER BY seq""",
+                  (since, until if until is not None else MAX_SEQ))
+        count = c.rowcount
+        last = c.execute("SELECT IFNULL(MAX(seq), ?) FROM changes WHERE seq <= ?",
+                         (since, until if until is not None else MAX_SEQ)).fetchone()[0]
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE segment")
+    return count, last
+
+
+# =================== Merge ===================
+# Merges a segment into this database in one transaction. Changes already
+# present (by origin, origin_seq) are skipped, so importing the same file
+# twice or overlapping segments is harmless. Stock deltas (deliveries, sales
+# and stock-take adjustments) add up in any order, a void removes its sale
+# whether it arrives before or after it, and reorder levels and barcodes take
+# the most recently stamped value.
+# Returns the number of new changes applied.
+def import_segment(conn, path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    conn.execute("ATTACH DATABASE ? AS segment", (path,))
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # Segments written before a column existed simply leave it NULL.
+            present = {row[1] for row in c.execute("PRAGMA segment.table_info(changes)")}
+            columns = [column if column in present else "NULL" for column in COLUMNS]
+            first = c.execute("SELECT IFNULL(MAX(seq), 0) FROM changes").fetchone()[0]
+            c.execute(f"""INSERT OR IGNORE INTO changes (seq, {', '.join(COLUMNS)})
+                          SELECT ? + ROW_NUMBER() OVER (ORDER BY rowid), {', '.join(columns)}
+                          FROM segment.changes""", (first,))
+            applied = _apply_changes(c, first)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE segment")
+    return applied
+
+
+def _apply_changes(c, first):
+    applied = c.execute("SELECT COUNT(*) FROM changes WHERE seq > ?", (first,)).fetchone()[0]
+    if not applied:
+        return 0
+
+    c.execute("""INSERT OR IGNORE INTO commodities (name, quantity)
+                 SELECT DISTINCT name, 0 FROM changes
+                 WHERE seq > ? AND kind IN ('delivery', 'sale', 'adjust', 'reorder', 'sku', 'price')""", (first,))
+    c.execute("""UPDATE commodities SET quantity = quantity + delta.qty
+                 FROM (SELECT name, SUM(CASE kind WHEN 'sale' THEN -qty ELSE qty END) AS qty
+                       FROM changes WHERE seq > ? AND kind IN ('delivery', 'sale', 'adjust') GROUP BY name) AS delta
+                 WHERE commodities.name = delta.name""", (first,))
+
+    # Sales rows, and delivery price rows, unless a void for them is already here.
+    c.execute("""INSERT INTO sales (name, quantity_sold, price_cents, total_cents, date, change_seq, location)
+                 SELECT n.name, CASE n.kind WHEN 'sale' THEN n.qty ELSE 0 END, n.price_cents,
+                        CASE n.kind WHEN 'sale' THEN n.qty * n.price_cents ELSE 0 END, n.date, n.seq, n.location
+                 FROM changes n
+                 WHERE n.seq > ?
+                   AND (n.kind = 'sale' OR (n.kind = 'delivery' AND n.price_cents IS NOT NULL))
+                   AND NOT EXISTS (SELECT 1 FROM changes v
+                                   WHERE v.kind = 'void' AND v.ref_origin = n.origin AND v.ref_seq = n.origin_seq)""",
+              (first,))
+    c.execute("""DELETE FROM sales WHERE change_seq IN (
+                     SELECT target.seq FROM changes v
+                     JOIN changes target ON target.origin = v.ref_origin AND target.origin_seq = v.ref_seq
+                     WHERE v.seq > ? AND v.kind = 'void')""", (first,))
+
+    c.execute("""UPDATE commodities SET reorder_level = (
+                     SELECT qty FROM changes
+                     WHERE kind = 'reorder' AND name = commodities.name
+                     ORDER BY stamp DESC, origin DESC, origin_seq DESC LIMIT 1)
+                 WHERE name IN (SELECT name FROM changes WHERE seq > ? AND kind = 'reorder')""", (first,))
+    c.execute("""UPDATE OR IGNORE commodities SET sku = (
+                     SELECT note FROM changes
+                     WHERE kind = 'sku' AND name = commodities.name
+                     ORDER BY stamp DESC, origin DESC, origin_seq DESC LIMIT 1)
+                 WHERE name IN (SELECT name FROM changes WHERE seq > ? AND kind = 'sku')""", (first,))
+
+    # Selling prices: the latest stamped change per item and day, and the
+    # item's current price from its latest day.
+    c.execute("""INSERT OR REPLACE INTO price_history (name, effective, price_cents)
+                 SELECT n.name, n.date, (SELECT price_cents FROM changes p
+                                         WHERE p.kind = 'price' AND p.name = n.name AND p.date = n.date
+                                         ORDER BY p.stamp DESC, p.origin DESC, p.origin_seq DESC LIMIT 1)
+                 FROM (SELECT DISTINCT name, date FROM changes WHERE seq > ? AND kind = 'price') AS n""", (first,))
+    c.execute("""UPDATE commodities SET sell_price_cents = (
+                     SELECT price_cents FROM price_history WHERE name = commodities.name
+                     ORDER BY effective DESC LIMIT 1)
+                 WHERE name IN (SELECT name FROM changes WHERE seq > ? AND kind = 'price')""", (first,))
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exchange change segments between shop databases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write changes to a segment file")
+    export.add_argument("db")
+    export.add_argument("segment")
+    export.add_argument("--since", type=int, default=0, help="only changes after this local seq")
+    export.add_argument("--until", type=int, default=None, help="only changes up to this local seq")
+    merge = commands.add_parser("import", help="merge a segment file into a database")
+    merge.add_argument("db")
+    merge.add_argument("segments", nargs="+")
+    args = parser.parse_args()
+
+    conn = shop_db.connect(args.db)
+    if args.command == "export":
+        count, last = export_segment(conn, args.segment, args.since, args.until)
+        print(f"Exported {count} changes (next --since {last})")
+    else:
+        applied = 0
+        for segment in args.segments:
+            count = import_segment(conn, segment)
+            applied += count
+            print(f"{segment}: {count} new changes")
+        # Merged deliveries and sales can land anywhere in the FIFO order.
+        if applied:
+            costing.rebuild(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import random
+from datetime import date, timedelta
+import shop_db
+
+
+# =================== Synthetic Shop Data ===================
+# Fills a grocery_shop.db-compatible database with `commodities` items and
+# `sales` sale rows spread over `days` days ending today. Deliveries with an
+# order price are written as zero-quantity rows, the same way add_commodity does.
+def generate(conn, commodities=200, sales=10000, days=365, deliveries=None, seed=533):
+    rng = random.Random(seed)
+    if deliveries is None:
+        deliveries = max(commodities, sales // 20)
+
+    names = [f"Item {i:05d}" for i in range(commodities)]
+    prices = [rng.randint(50, 5000) for _ in names]
+    start = date.today() - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+
+    conn.executemany("INSERT OR IGNORE INTO commodities (name, quantity, reorder_level, sku, sell_price_cents) "
+                     "VALUES (?, ?, ?, ?, ?)",
+                     ((name, rng.randint(50, 500), rng.choice((0, 20, 60)), f"600{i:010d}", prices[i])
+                      for i, name in enumerate(names)))
+    conn.executemany("INSERT OR IGNORE INTO price_history (name, effective, price_cents) VALUES (?, ?, ?)",
+                     ((name, dates[0], price) for name, price in zip(names, prices)))
+
+    def rows():
+        delivered = sold = 0
+        for day, sale_date in enumerate(dates):
+            # Spread both kinds of row evenly so every day has some of each.
+            delivered_by = deliveries * (day + 1) // days
+            sold_by = sales * (day + 1) // days
+            while delivered < delivered_by:
+                i = rng.randrange(commodities)
+                yield names[i], 0, prices[i] * 4 // 5, 0, sale_date
+                delivered += 1
+            while sold < sold_by:
+                i = rng.randrange(commodities)
+                qty = rng.randint(1, 5)
+                yield names[i], qty, prices[i], qty * prices[i], sale_date
+                sold += 1
+
+    conn.executemany("INSERT INTO sales (name, quantity_sold, price_cents, total_cents, date) VALUES (?, ?, ?, ?, ?)",
+                     rows())
+    conn.commit()
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a shop database with synthetic data.")
+    parser.add_argument("path", help="database file to create or extend")
+    parser.add_argument("--commodities", type=int, default=200)
+    parser.add_argument("--sales", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--deliveries", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=533)
+    args = parser.parse_args()
+
+    conn = shop_db.connect(args.path)
+    generate(conn, args.commodities, args.sales, args.days, args.deliveries, args.seed)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Report views are redrawn on demand, not after every write. A write marks
+# the views it affects dirty; the first mark starts a short debounce window,
+# and when it closes the dirty views are redrawn once each, in the next idle
+# moment. A burst of writes inside the window costs one redraw per view.
+DEBOUNCE_MS = 50
+
+# Redraws asked for, and redraws actually done.
+requested = 0
+redrawn = 0
+
+_root = None
+_views = {}
+_dirty = set()
+_job = None
+
+
+def attach(root):
+    global _root
+    _root = root
+
+
+# Views redraw in the order they were registered.
+def register(name, redraw):
+    _views[name] = redraw
+
+
+def mark(*names):
+    global requested, _job
+    for name in names:
+        requested += 1
+        _dirty.add(name)
+    if _job is None and _root is not None:
+        _job = _root.after(DEBOUNCE_MS, lambda: _root.after_idle(flush))
+
+
+# Redraws every dirty view now, e.g. before reading their text.
+def flush():
+    global redrawn, _job
+    if _job is not None and _root is not None:
+        _root.after_cancel(_job)
+    _job = None
+    dirty = [name for name in _views if name in _dirty]
+    _dirty.clear()
+    for name in dirty:
+        _views[name]()
+        redrawn += 1
+
+
+def saved():
+    return requested - redrawn